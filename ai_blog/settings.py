@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -104,12 +105,54 @@ DATABASES = {
         "PASSWORD": os.environ.get("DB_PASS"),
         "HOST": os.environ.get("ALT_DB_HOST", "aws-1-us-east-1.pooler.supabase.com"),
         "PORT": os.environ.get("DB_PORT", "5432"),
+        # DB_CONN_MAX_AGE > 0 keeps a connection per thread for that long, only
+        # for WSGI workers: under ASGI the sync code of every request runs on
+        # a new thread and the connections pile up (Django ticket #33497), the
+        # pool below is what saves the handshakes there
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": (
+            os.environ.get("DB_CONN_HEALTH_CHECKS", "true").lower() == "true"
+        ),
         "OPTIONS": {
             "sslmode": "require",  # Add this line
+            "connect_timeout": int(os.environ.get("DB_CONNECT_TIMEOUT", 10)),
         },
     }
 }
 
+# a psycopg 3 connection pool shared by the threads of a worker (Django
+# 5.1+), connections are checked when taken out of it. This is the setup for
+# the ASGI workers of the Procfile, DB_POOL=false goes back to a connection
+# per request (or DB_CONN_MAX_AGE) for WSGI
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:  # psycopg without the pool extra
+    ConnectionPool = None
+
+if ConnectionPool is not None and os.environ.get("DB_POOL", "true").lower() == "true":
+    DATABASES["default"]["CONN_MAX_AGE"] = 0  # required with the pool
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+        # seconds a request waits for a free connection before failing
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        "max_lifetime": float(os.environ.get("DB_POOL_MAX_LIFETIME", 1800)),
+        "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", 300)),
+        "check": ConnectionPool.check_connection,
+    }
+
+# DB_ENGINE=sqlite runs on the local db.sqlite3 file, for offline development
+if os.environ.get("DB_ENGINE", "postgresql") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("DB_SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+            "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 0)),
+            # concurrent writers wait for the lock instead of failing
+            "OPTIONS": {"timeout": 30, "transaction_mode": "IMMEDIATE"},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -158,3 +201,213 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 LOGIN_URL = "/login"
 
 CSRF_TRUSTED_ORIGINS = ["https://aiyoutubesummary-production.up.railway.app"]
+
+# Summary cache (repeat submissions of a video skip transcript + LLM calls)
+SUMMARY_CACHE_TTL_SECONDS = int(
+    os.environ.get("SUMMARY_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60)
+)
+SUMMARY_CACHE_MAX_ENTRIES = int(os.environ.get("SUMMARY_CACHE_MAX_ENTRIES", 5000))
+
+# Background generation jobs
+GENERATION_WORKERS = int(os.environ.get("GENERATION_WORKERS", 4))
+# set to "false" when a separate `manage.py run_generation_worker` drains the queue
+GENERATION_RUN_IN_PROCESS = (
+    os.environ.get("GENERATION_RUN_IN_PROCESS", "true").lower() == "true"
+)
+# the worker running a job touches it every GENERATION_JOB_HEARTBEAT_SECONDS,
+# run_generation_worker queues a job without a heartbeat for longer than
+# GENERATION_JOB_STALE_SECONDS again, its worker most likely died, up to
+# GENERATION_JOB_MAX_ATTEMPTS runs per job
+GENERATION_JOB_HEARTBEAT_SECONDS = float(
+    os.environ.get("GENERATION_JOB_HEARTBEAT_SECONDS", 30)
+)
+GENERATION_JOB_STALE_SECONDS = float(
+    os.environ.get("GENERATION_JOB_STALE_SECONDS", 300)
+)
+GENERATION_JOB_MAX_ATTEMPTS = int(os.environ.get("GENERATION_JOB_MAX_ATTEMPTS", 3))
+
+# SSE mode of generate-blog, the page streams the summary instead of polling
+# a job. A stream holds its request open for the whole generation, only turn
+# it on when served by an ASGI server
+GENERATION_STREAMING = (
+    os.environ.get("GENERATION_STREAMING", "false").lower() == "true"
+)
+
+# Pooled upstream http clients (see blog_generator_app/clients.py)
+LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS", 20))
+LLM_HTTP_MAX_KEEPALIVE = int(os.environ.get("LLM_HTTP_MAX_KEEPALIVE", 10))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_HTTP_KEEPALIVE_EXPIRY", 60))
+LLM_HTTP_TIMEOUT = float(os.environ.get("LLM_HTTP_TIMEOUT", 120))
+TRANSCRIPT_POOL_SIZE = int(os.environ.get("TRANSCRIPT_POOL_SIZE", 10))
+TRANSCRIPT_TIMEOUT = float(os.environ.get("TRANSCRIPT_TIMEOUT", 30))
+# webshare gives a new exit ip per connection, keep-alive pins one ip
+TRANSCRIPT_KEEP_ALIVE = (
+    os.environ.get("TRANSCRIPT_KEEP_ALIVE", "false").lower() == "true"
+)
+
+# Map-reduce summarization of long transcripts
+SUMMARY_CHUNK_TOKENS = int(os.environ.get("SUMMARY_CHUNK_TOKENS", 6000))
+SUMMARY_FAN_OUT = int(os.environ.get("SUMMARY_FAN_OUT", 4))
+
+# Chapters: the transcript is cut where the words of the CHAPTER_WINDOW_SECONDS
+# before and after a point differ most, chapters are at least CHAPTER_MIN_SECONDS
+CHAPTER_WINDOW_SECONDS = float(os.environ.get("CHAPTER_WINDOW_SECONDS", 60))
+CHAPTER_MIN_SECONDS = float(os.environ.get("CHAPTER_MIN_SECONDS", 120))
+
+# Transcripts are cleaned of caption noise and thinned to this many tokens
+# before any LLM call, 0 disables the budget. Tokens are counted with
+# tiktoken, see tokens.py
+TRANSCRIPT_TOKEN_BUDGET = int(os.environ.get("TRANSCRIPT_TOKEN_BUDGET", 60000))
+
+# LLM providers of the generation pipeline. The router sends every call to
+# the fastest healthy one of LLM_PROVIDERS and fails over to the others on
+# errors and timeouts, LLM_HEDGE also sends calls slower than the
+# provider's p95 to the next one
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+CLAUDE_MODEL = os.environ.get("CLAUDE_MODEL", "claude-3-5-sonnet-20241022")
+LLM_MAX_TOKENS = int(os.environ.get("LLM_MAX_TOKENS", 1000))
+LLM_TITLE_MAX_TOKENS = int(os.environ.get("LLM_TITLE_MAX_TOKENS", 60))
+LLM_PROVIDER_TIMEOUT = float(os.environ.get("LLM_PROVIDER_TIMEOUT", 90))
+LLM_PROVIDER_CONFIG = {
+    "openai": {
+        "class": "blog_generator_app.providers.OpenAIProvider",
+        "model": OPENAI_MODEL,
+        "max_tokens": LLM_MAX_TOKENS,
+        "title_max_tokens": LLM_TITLE_MAX_TOKENS,
+        "timeout": LLM_PROVIDER_TIMEOUT,
+    },
+    "claude": {
+        "class": "blog_generator_app.providers.ClaudeProvider",
+        "model": CLAUDE_MODEL,
+        "max_tokens": LLM_MAX_TOKENS,
+        "title_max_tokens": LLM_TITLE_MAX_TOKENS,
+        "timeout": LLM_PROVIDER_TIMEOUT,
+    },
+}
+LLM_PROVIDERS = os.environ.get("LLM_PROVIDERS", "openai").split(",")
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "false").lower() == "true"
+LLM_BREAKER_THRESHOLD = int(os.environ.get("LLM_BREAKER_THRESHOLD", 3))
+LLM_BREAKER_RESET = float(os.environ.get("LLM_BREAKER_RESET", 60))
+
+# Ask for summary and title in one structured call (falls back to two calls)
+COMBINED_GENERATION = os.environ.get("COMBINED_GENERATION", "true").lower() == "true"
+
+# zlib compress the packed transcript segment timings
+TRANSCRIPT_COMPRESS_SEGMENTS = (
+    os.environ.get("TRANSCRIPT_COMPRESS_SEGMENTS", "true").lower() == "true"
+)
+
+# Transcript sources, tried in this order until one has a transcript
+TRANSCRIPT_SOURCES = os.environ.get(
+    "TRANSCRIPT_SOURCES", "youtube_api,yt_dlp,assemblyai"
+).split(",")
+TRANSCRIPT_SOURCE_TIMEOUTS = {"youtube_api": 20, "yt_dlp": 30, "assemblyai": 600}
+# start the next source when the current one is slower than this (seconds)
+TRANSCRIPT_HEDGE_AFTER = (
+    float(os.environ["TRANSCRIPT_HEDGE_AFTER"])
+    if os.environ.get("TRANSCRIPT_HEDGE_AFTER")
+    else None
+)
+TRANSCRIPT_BREAKER_THRESHOLD = int(os.environ.get("TRANSCRIPT_BREAKER_THRESHOLD", 3))
+TRANSCRIPT_BREAKER_RESET = float(os.environ.get("TRANSCRIPT_BREAKER_RESET", 60))
+
+# AssemblyAI fallback: downloaded audio is kept in MEDIA_ROOT/audio up to
+# this many bytes (least recently used files go first), and at most
+# AUDIO_TRANSCRIPTION_WORKERS videos are downloaded and transcribed at once
+AUDIO_CACHE_MAX_BYTES = int(os.environ.get("AUDIO_CACHE_MAX_BYTES", 2 * 1024**3))
+AUDIO_TRANSCRIPTION_WORKERS = int(os.environ.get("AUDIO_TRANSCRIPTION_WORKERS", 2))
+
+# titles, durations and caption languages from yt-dlp are kept this long,
+# videos no transcript source had anything for are not retried for a day
+VIDEO_METADATA_TTL_SECONDS = int(
+    os.environ.get("VIDEO_METADATA_TTL_SECONDS", 7 * 24 * 3600)
+)
+VIDEO_NO_TRANSCRIPT_TTL_SECONDS = int(
+    os.environ.get("VIDEO_NO_TRANSCRIPT_TTL_SECONDS", 24 * 3600)
+)
+# how long a generation waits for the real title before asking the LLM for one
+VIDEO_METADATA_WAIT_SECONDS = float(os.environ.get("VIDEO_METADATA_WAIT_SECONDS", 5))
+# how many yt-dlp metadata lookups run at once, prefetched next to the transcript
+VIDEO_METADATA_WORKERS = int(os.environ.get("VIDEO_METADATA_WORKERS", 4))
+
+# Bulk generation (generate-blog-bulk and `manage.py generate_bulk`)
+BULK_TRANSCRIPT_WORKERS = int(os.environ.get("BULK_TRANSCRIPT_WORKERS", 8))
+# kept lower than the transcript pool to stay under the LLM rate limits
+BULK_LLM_WORKERS = int(os.environ.get("BULK_LLM_WORKERS", 4))
+BULK_MAX_VIDEOS = int(os.environ.get("BULK_MAX_VIDEOS", 50))
+
+# Blog posts per page of the blog list (keyset pagination)
+BLOG_LIST_PAGE_SIZE = int(os.environ.get("BLOG_LIST_PAGE_SIZE", 20))
+
+# Rendered blog-list / blog-details pages, PAGE_CACHE_BACKEND is one of
+# locmem (per process), file (shared by the workers of one machine) or redis
+PAGE_CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+}
+PAGE_CACHE_BACKEND = os.environ.get("PAGE_CACHE_BACKEND", "file")
+PAGE_CACHE_LOCATIONS = {
+    "locmem": "pages",
+    "file": os.path.join(tempfile.gettempdir(), "ai_blog_page_cache"),
+    "redis": "redis://localhost:6379/1",
+}
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "pages": {
+        "BACKEND": PAGE_CACHE_BACKENDS[PAGE_CACHE_BACKEND],
+        "LOCATION": os.environ.get(
+            "PAGE_CACHE_LOCATION", PAGE_CACHE_LOCATIONS[PAGE_CACHE_BACKEND]
+        ),
+        "TIMEOUT": int(os.environ.get("PAGE_CACHE_TIMEOUT", 24 * 60 * 60)),
+    },
+}
+
+# Concurrent generations of the same video are coalesced, across the
+# workers of one machine through lock files in this directory
+GENERATION_LOCK_DIR = os.environ.get(
+    "GENERATION_LOCK_DIR", os.path.join(tempfile.gettempdir(), "ai_blog_locks")
+)
+# seconds a worker waits for another one generating the same video
+GENERATION_LOCK_TIMEOUT = float(os.environ.get("GENERATION_LOCK_TIMEOUT", 600))
+
+# Admission control of generate-blog: token buckets per user and for the
+# whole site plus a cap on generations in flight, answered with 429 +
+# Retry-After. The state is shared by the workers of one machine through
+# files in RATE_LIMIT_DIR (InProcessBackend keeps it per process)
+RATE_LIMIT_BACKEND = os.environ.get(
+    "RATE_LIMIT_BACKEND", "blog_generator_app.ratelimit.FileBackend"
+)
+RATE_LIMIT_DIR = os.environ.get(
+    "RATE_LIMIT_DIR", os.path.join(tempfile.gettempdir(), "ai_blog_ratelimit")
+)
+RATE_LIMIT_USER_PER_MINUTE = float(os.environ.get("RATE_LIMIT_USER_PER_MINUTE", 6))
+RATE_LIMIT_USER_BURST = int(os.environ.get("RATE_LIMIT_USER_BURST", 3))
+RATE_LIMIT_GLOBAL_PER_MINUTE = float(
+    os.environ.get("RATE_LIMIT_GLOBAL_PER_MINUTE", 120)
+)
+RATE_LIMIT_GLOBAL_BURST = int(os.environ.get("RATE_LIMIT_GLOBAL_BURST", 30))
+# generations running at once across workers. generate-blog-async awaits its
+# LLM calls on the event loop, an ASGI deployment serving it can raise this
+# far above its thread count
+GENERATION_MAX_IN_FLIGHT = int(os.environ.get("GENERATION_MAX_IN_FLIGHT", 16))
+# a slot not released by then (crashed worker) is given back
+GENERATION_SLOT_TTL = float(os.environ.get("GENERATION_SLOT_TTL", 900))
+GENERATION_BUSY_RETRY_AFTER = int(os.environ.get("GENERATION_BUSY_RETRY_AFTER", 10))
+# concurrent calls per LLM provider and worker, halved on every burst of 429s
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+
+# Generation stage metrics (/metrics for Prometheus, /latency-stats for staff)
+METRICS_WINDOW_SECONDS = float(os.environ.get("METRICS_WINDOW_SECONDS", 300))
+# lets a Prometheus scraper read /metrics with "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# one json line per generation with its stage timings
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "blog_generator_app.metrics": {"handlers": ["console"], "level": "INFO"},
+    },
+}
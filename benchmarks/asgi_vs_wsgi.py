@@ -0,0 +1,157 @@
+"""
+Load benchmark of generate-blog under WSGI against generate-blog-async
+under ASGI.
+
+The transcript fetch and the LLM are stubbed with fixed latencies, so the
+numbers only show how many generations one process keeps in flight.
+WSGI runs the sync view through the WSGI handler on a fixed number of
+blocking workers (like gunicorn sync workers), each also running the job
+its request enqueued, like the in-process job threads would. ASGI sends
+generate-blog-async requests to a single event loop with many of them in
+flight. Their LLM calls are awaited on the loop (LLMRouter.acall and the
+async stub provider), only the transcript lookup takes a thread.
+
+    python -m benchmarks.asgi_vs_wsgi --requests 200 --wsgi-workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from asgiref.sync import ThreadSensitiveContext
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.test import AsyncClient, Client  # noqa: E402
+
+from benchmarks import stubs  # noqa: E402
+from blog_generator_app import views  # noqa: E402
+from blog_generator_app.jobs import process_job  # noqa: E402
+from blog_generator_app.providers import LLMRouter  # noqa: E402
+
+
+def reset_database():
+    db_path = settings.DATABASES["default"]["NAME"]
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    call_command("migrate", verbosity=0)
+    return User.objects.create_user(username="bench", password="bench")
+
+
+def video_link(run, i):
+    # unique ids so every request misses the summary cache
+    return f"https://www.youtube.com/watch?v={run}{i:010d}"
+
+
+def summarize(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "mode": name,
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+
+def run_wsgi(user, requests, workers):
+    local = threading.local()
+
+    def one_request(i):
+        if not hasattr(local, "client"):
+            local.client = Client()
+            local.client.force_login(user)
+        start = time.perf_counter()
+        response = local.client.post(
+            "/generate-blog",
+            data={"link": video_link("w", i)},
+            content_type="application/json",
+        )
+        assert response.status_code == 202, response.content
+        job_id = response.json()["job_id"]
+        assert process_job(job_id, views.run_blog_generation)
+        response = local.client.get(f"/job-result/{job_id}")
+        assert response.status_code == 200, response.content
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(one_request, range(requests)))
+    return summarize(f"wsgi x{workers} workers", latencies, time.perf_counter() - start)
+
+
+async def run_asgi(user, requests, concurrency):
+    client = AsyncClient()
+    await client.aforce_login(user)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_request(i):
+        # ASGIHandler gives every request its own thread for the sync calls,
+        # the test client doesn't and would run them all on one
+        async with semaphore, ThreadSensitiveContext():
+            start = time.perf_counter()
+            response = await client.post(
+                "/generate-blog-async",
+                data={"link": video_link("a", i)},
+                content_type="application/json",
+            )
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one_request(i) for i in range(requests)))
+    return summarize(
+        f"asgi x{concurrency} in flight", latencies, time.perf_counter() - start
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--wsgi-workers", type=int, default=4)
+    parser.add_argument("--asgi-concurrency", type=int, default=200)
+    parser.add_argument("--transcript-latency", type=float, default=0.2)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=500.0)
+    args = parser.parse_args()
+
+    stubs.TRANSCRIPT_LATENCY = args.transcript_latency
+    stubs.LLM_LATENCY = args.llm_latency
+    stubs.LLM_TOKENS_PER_SECOND = args.llm_tokens_per_second
+    user = reset_database()
+
+    # prefetch_video_metadata would ask yt-dlp for the title of every video
+    with mock.patch.dict(
+        views.TRANSCRIPT_SOURCE_FUNCTIONS, {"stub": stubs.stub_transcript_source}
+    ), mock.patch.object(
+        views, "get_llm_router", return_value=LLMRouter([stubs.StubProvider()])
+    ), mock.patch.object(
+        views, "prefetch_video_metadata", stubs.stub_prefetch_video_metadata
+    ):
+        results = [
+            run_wsgi(user, args.requests, args.wsgi_workers),
+            asyncio.run(run_asgi(user, args.requests, args.asgi_concurrency)),
+        ]
+
+    for result in results:
+        print(
+            f"{result['mode']:<24} {result['throughput_rps']:>8} req/s"
+            f"  p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Benchmark of the blog list on a user with 100k blog posts.
+
+Compares the old list (every post with its full generated_content and
+truncatewords:30 at render time) with a keyset page of excerpts, and a
+deep keyset page with the same page reached through OFFSET.
+
+    python -m benchmarks.blog_list --rows 100000
+"""
+
+import argparse
+import os
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.template import Context, Template  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from blog_generator_app.models import BlogPost, make_excerpt  # noqa: E402
+from blog_generator_app.pagination import encode_cursor, keyset_page  # noqa: E402
+
+OLD_TEMPLATE = Template(
+    "{% for article in blog_articles %}"
+    "{{ article.youtube_title }}{{ article.generated_content|truncatewords:30 }}"
+    "{% endfor %}"
+)
+NEW_TEMPLATE = Template(
+    "{% for article in blog_articles %}"
+    "{{ article.youtube_title }}{{ article.excerpt }}"
+    "{% endfor %}"
+)
+
+
+def seed(rows, content_words):
+    db_path = settings.DATABASES["default"]["NAME"]
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    call_command("migrate", verbosity=0)
+
+    random.seed(0)
+    words = ["so", "today", "we", "are", "going", "to", "talk", "about", "python"]
+    user = User.objects.create_user(username="bench", password="bench")
+    other = User.objects.create_user(username="other", password="other")
+    now = timezone.now()
+
+    batch = []
+    for i in range(rows):
+        content = " ".join(random.choices(words, k=content_words))
+        batch.append(
+            BlogPost(
+                # a few other users so the index has to filter on user
+                user=user if i % 10 else other,
+                youtube_title=f"Video {i}",
+                youtube_link=f"https://www.youtube.com/watch?v={i:011d}",
+                generated_content=content,
+                excerpt=make_excerpt(content),
+            )
+        )
+        if len(batch) == 5000:
+            BlogPost.objects.bulk_create(batch)
+            batch = []
+    BlogPost.objects.bulk_create(batch)
+
+    # auto_now_add gives every row almost the same time, spread them out in
+    # groups of 1000 equal timestamps so the id tie-break is exercised too
+    for first_id in range(1, rows + 1, 1000):
+        BlogPost.objects.filter(id__gte=first_id, id__lt=first_id + 1000).update(
+            created_at=now - timedelta(minutes=first_id)
+        )
+    return user
+
+
+def measure(function, repeat):
+    best = float("inf")
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return best * 1000, peak / 1024 / 1024
+
+
+def old_list(user):
+    blog_articles = BlogPost.objects.filter(user=user).order_by("-created_at")
+    return OLD_TEMPLATE.render(Context({"blog_articles": blog_articles}))
+
+
+def new_page(user, cursor, page_size):
+    queryset = BlogPost.objects.filter(user=user).only(
+        "id", "user_id", "youtube_title", "excerpt", "created_at"
+    )
+    blog_articles, _ = keyset_page(queryset, cursor, page_size)
+    return NEW_TEMPLATE.render(Context({"blog_articles": blog_articles}))
+
+
+def offset_page(user, offset, page_size):
+    queryset = (
+        BlogPost.objects.filter(user=user)
+        .only("id", "user_id", "youtube_title", "excerpt", "created_at")
+        .order_by("-created_at", "-id")
+    )
+    blog_articles = list(queryset[offset : offset + page_size])
+    return NEW_TEMPLATE.render(Context({"blog_articles": blog_articles}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--content-words", type=int, default=400)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    user = seed(args.rows, args.content_words)
+    print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f} s")
+
+    # cursor pointing at the middle of the user's posts
+    ordered = BlogPost.objects.filter(user=user).order_by("-created_at", "-id")
+    deep_offset = ordered.count() // 2
+    deep_cursor = encode_cursor(ordered.only("id", "created_at")[deep_offset - 1])
+
+    results = [
+        ("old full list", measure(lambda: old_list(user), args.repeat)),
+        (
+            "keyset first page",
+            measure(lambda: new_page(user, None, args.page_size), args.repeat),
+        ),
+        (
+            "keyset deep page",
+            measure(lambda: new_page(user, deep_cursor, args.page_size), args.repeat),
+        ),
+        (
+            "offset deep page",
+            measure(
+                lambda: offset_page(user, deep_offset, args.page_size), args.repeat
+            ),
+        ),
+    ]
+
+    print(f"best of {args.repeat}, page size {args.page_size}")
+    for name, (elapsed_ms, peak_mib) in results:
+        print(f"  {name:<20} {elapsed_ms:10.2f} ms  peak {peak_mib:8.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark of chapter segmentation on synthetic transcripts of growing length.
+
+Every transcript switches topic every --topic-minutes (each topic has its
+own vocabulary, mixed with filler words shared by all of them). Times
+segment_transcript, best of --repeat runs, per 1000 snippets to show that
+the cost grows linearly with the length of the video, and counts how many
+of the planted topic changes a chapter starts within 30 seconds of.
+
+    python -m benchmarks.chapters --minutes 10,60,180,600
+"""
+
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from blog_generator_app.chapters import segment_transcript  # noqa: E402
+from blog_generator_app.transcript_sources import Snippet  # noqa: E402
+from blog_generator_app.transcripts import StoredTranscript  # noqa: E402
+
+TOPICS = [
+    "python function variable loop list dictionary class module".split(),
+    "garden tomato soil water seeds plant compost sunlight".split(),
+    "guitar chord string melody rhythm strum tuning song".split(),
+    "bread flour yeast oven dough knead crust bake".split(),
+    "planet orbit galaxy telescope comet gravity nebula star".split(),
+]
+FILLER = "so then we also just need to see how this goes".split()
+# a topic change counts as found when a chapter starts this close to it
+TOLERANCE_SECONDS = 30
+
+
+def make_transcript(minutes, topic_minutes):
+    """Transcript of the given length and the times its topic changes"""
+    snippets, changes = [], []
+    start = 0.0
+    topic = 0
+    while start < minutes * 60:
+        if start >= (len(changes) + 1) * topic_minutes * 60:
+            changes.append(start)
+            topic = (topic + random.randrange(1, len(TOPICS))) % len(TOPICS)
+        text = " ".join(
+            (
+                random.choice(TOPICS[topic])
+                if random.random() < 0.35
+                else random.choice(FILLER)
+            )
+            for _ in range(8)
+        )
+        duration = random.uniform(2, 4)
+        snippets.append(Snippet(text=text, start=start, duration=duration))
+        start += duration + random.uniform(0, 0.3)
+    return StoredTranscript.from_snippets("dQw4w9WgXcQ", "en", snippets), changes
+
+
+def timed(transcript, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chapters = segment_transcript(transcript)
+        best = min(best, time.perf_counter() - started)
+    return best, chapters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--minutes", default="10,60,180,600")
+    parser.add_argument("--topic-minutes", type=float, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f"topic change every {args.topic_minutes:g} min, best of {args.repeat}")
+    for minutes in [int(value) for value in args.minutes.split(",")]:
+        transcript, changes = make_transcript(minutes, args.topic_minutes)
+        snippets = len(transcript.starts)
+        seconds, chapters = timed(transcript, args.repeat)
+        found = sum(
+            any(
+                abs(chapter.start - change) <= TOLERANCE_SECONDS
+                for chapter in chapters[1:]
+            )
+            for change in changes
+        )
+        print(
+            f"  {minutes:>4} min {snippets:>7} snippets"
+            f"   {seconds * 1000:8.1f} ms   {seconds / snippets * 1e6:6.2f} ms/1k snippets"
+            f"   {len(chapters):>4} chapters, {found}/{len(changes)} topic changes found"
+        )
+
+
+if __name__ == "__main__":
+    main()
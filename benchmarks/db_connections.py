@@ -0,0 +1,162 @@
+"""
+Benchmark of the per-request database overhead with and without pooling.
+
+Every simulated request does what Django does around a view (close the
+connection if it's obsolete on request_started and request_finished) and
+runs one small query, --concurrency at a time. Compares:
+
+    closed      CONN_MAX_AGE=0, a new connection per request (the default)
+    persistent  CONN_MAX_AGE with health checks (DB_CONN_MAX_AGE)
+    pool        the psycopg 3 pool of the project settings (DB_POOL),
+                Postgres only
+
+against the benchmark SQLite file or a local Postgres (BENCHMARK_DB=postgres).
+--handshake-ms adds a delay to every new connection, to approximate the
+tcp + tls + auth round-trips to a remote pooler.
+
+By default every request runs on a new thread, like the sync code of a
+request under the ASGI workers of the Procfile. There a persistent
+connection is never reused, and it stays open after its thread is gone
+(Django ticket #33497). --server wsgi reuses --concurrency threads instead,
+like gunicorn sync workers.
+
+    BENCHMARK_DB=postgres python -m benchmarks.db_connections --handshake-ms 40
+"""
+
+import argparse
+import copy
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from django.db.utils import ConnectionHandler  # noqa: E402
+
+MODES = ("closed", "persistent", "pool")
+
+
+def mode_settings(mode, concurrency):
+    database = copy.deepcopy(settings.DATABASES["default"])
+    database["OPTIONS"] = dict(database.get("OPTIONS", {}))
+    if mode == "closed":
+        database["CONN_MAX_AGE"] = 0
+    elif mode == "persistent":
+        database["CONN_MAX_AGE"] = 600
+        database["CONN_HEALTH_CHECKS"] = True
+    else:
+        database["CONN_MAX_AGE"] = 0
+        database["OPTIONS"]["pool"] = settings.PROJECT_POOL
+    return database
+
+
+def pool_available():
+    return bool(settings.PROJECT_POOL) and settings.DATABASES["default"][
+        "ENGINE"
+    ].endswith("postgresql")
+
+
+class Opened:
+    """Counts new connections, optionally slowing each one down"""
+
+    def __init__(self, handshake_ms):
+        self.handshake = handshake_ms / 1000
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, sender, connection, **kwargs):
+        with self._lock:
+            self.count += 1
+        time.sleep(self.handshake)
+
+
+def on_new_thread(function, *args):
+    """Run function on a thread of its own, like ASGIHandler runs sync code"""
+    with ThreadPoolExecutor(max_workers=1) as thread:
+        return thread.submit(function, *args).result()
+
+
+def run_mode(mode, concurrency, requests, opened, server="asgi"):
+    handler = ConnectionHandler({"default": mode_settings(mode, concurrency)})
+
+    def one_request(_):
+        connection = handler["default"]
+        started = time.perf_counter()
+        # what close_old_connections() does on request_started/request_finished
+        connection.close_if_unusable_or_obsolete()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        connection.close_if_unusable_or_obsolete()
+        return time.perf_counter() - started
+
+    opened.count = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        if server == "asgi":
+            latencies = pool.map(
+                lambda i: on_new_thread(one_request, i), range(requests)
+            )
+        else:
+            latencies = pool.map(one_request, range(requests))
+        latencies = sorted(latencies)
+    elapsed = time.perf_counter() - started
+
+    connection = handler["default"]
+    if hasattr(connection, "close_pool"):
+        connection.close_pool()
+    handler.close_all()
+
+    def percentile(percent):
+        index = max(int(len(latencies) * percent / 100 + 0.5) - 1, 0)
+        return latencies[index] * 1000
+
+    return {
+        "mode": mode,
+        "requests_per_s": requests / elapsed,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "connections": opened.count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--handshake-ms", type=float, default=0.0)
+    parser.add_argument("--server", choices=["asgi", "wsgi"], default="asgi")
+    args = parser.parse_args()
+
+    opened = Opened(args.handshake_ms)
+    connection_created.connect(opened)
+
+    database = settings.DATABASES["default"]["ENGINE"].rsplit(".", 1)[-1]
+    print(
+        f"{database} under {args.server}, {args.requests} requests,"
+        f" {args.concurrency} at a time, {args.handshake_ms} ms handshake"
+    )
+    for mode in args.modes.split(","):
+        if mode == "pool" and not pool_available():
+            print(f"  {mode:<11} skipped, needs Postgres and DB_POOL with psycopg_pool")
+            continue
+        result = run_mode(mode, args.concurrency, args.requests, opened, args.server)
+        print(
+            f"  {mode:<11} {result['requests_per_s']:>9.1f} req/s"
+            f"  mean {result['mean_ms']:.3f} ms  p50 {result['p50_ms']:.3f} ms"
+            f"  p95 {result['p95_ms']:.3f} ms"
+            f"  {result['connections']} connections opened"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+End-to-end benchmark of the real views against local fakes.
+
+generate_blog (request + the background job it enqueues), blog_list and
+blog_details are driven through the Django test client at several
+concurrency levels. YouTube, the proxy and the LLM are replaced by the
+fakes in benchmarks/stubs.py, the database is the benchmark SQLite file or
+a local Postgres (BENCHMARK_DB=postgres). Results are printed and written
+as json so runs can be compared over time.
+
+    python -m benchmarks.harness --concurrency 1,4,16 --output results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from unittest import mock
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+
+from benchmarks import stubs  # noqa: E402
+from blog_generator_app import views  # noqa: E402
+from blog_generator_app.jobs import process_job  # noqa: E402
+from blog_generator_app.models import BlogPost, make_excerpt  # noqa: E402
+from blog_generator_app.providers import LLMRouter  # noqa: E402
+
+SCENARIOS = ("generate_blog", "blog_list", "blog_details")
+NO_PAGE_CACHE = {
+    **settings.CACHES,
+    "pages": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+
+
+def reset_database(posts_per_user):
+    if connection.vendor == "sqlite":
+        db_path = settings.DATABASES["default"]["NAME"]
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        call_command("migrate", verbosity=0)
+    else:
+        call_command("migrate", verbosity=0)
+        call_command("flush", interactive=False, verbosity=0)
+
+    user = User.objects.create_user(username="bench", password="bench")
+    content = "Stub summary of a video. " * 80
+    BlogPost.objects.bulk_create(
+        BlogPost(
+            user=user,
+            youtube_title=f"Seeded video {i}",
+            youtube_link=f"https://www.youtube.com/watch?v=seed{i:07d}",
+            generated_content=content,
+            excerpt=make_excerpt(content),
+        )
+        for i in range(posts_per_user)
+    )
+    post_ids = list(BlogPost.objects.filter(user=user).values_list("id", flat=True))
+    return user, post_ids
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Runner:
+    """Sends one kind of request from a pool of logged in clients"""
+
+    def __init__(self, user, post_ids, run_id):
+        self.user = user
+        self.post_ids = post_ids
+        self.run_id = run_id
+        self.local = threading.local()
+        self.counter = 0
+        self.counter_lock = threading.Lock()
+
+    def client(self):
+        if not hasattr(self.local, "client"):
+            self.local.client = Client()
+            self.local.client.force_login(self.user)
+        return self.local.client
+
+    def next_number(self):
+        with self.counter_lock:
+            self.counter += 1
+            return self.counter
+
+    def generate_blog(self):
+        # a new video every time, so each request misses the summary cache
+        link = f"https://www.youtube.com/watch?v={self.run_id}{self.next_number():07d}"
+        response = self.client().post(
+            "/generate-blog",
+            data={"link": link},
+            content_type="application/json",
+        )
+        assert response.status_code == 202, response.content
+        # what an in-process worker thread does with the queued job
+        assert process_job(response.json()["job_id"], views.run_blog_generation)
+
+    def blog_list(self):
+        response = self.client().get("/blog-list")
+        assert response.status_code == 200, response.status_code
+
+    def blog_details(self):
+        post_id = self.post_ids[self.next_number() % len(self.post_ids)]
+        response = self.client().get(f"/blog-details/{post_id}")
+        assert response.status_code == 200, response.status_code
+
+
+def run_level(request, concurrency, requests):
+    """Latencies and throughput of requests sent by concurrency threads"""
+
+    def one_request(_):
+        started = time.perf_counter()
+        try:
+            request()
+        finally:
+            connections.close_all()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    def percentile(percent):
+        index = max(int(len(latencies) * percent / 100 + 0.5) - 1, 0)
+        return round(latencies[index] * 1000, 2)
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(requests / elapsed, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+    }
+
+
+def memory_per_request(request, concurrency):
+    """Peak python heap growth while concurrency requests are in flight, per request"""
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: request(), range(concurrency)))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round((peak - baseline) / concurrency / 1024, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--posts", type=int, default=200, help="seeded posts")
+    parser.add_argument("--transcript-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=500.0)
+    parser.add_argument(
+        "--no-page-cache",
+        action="store_true",
+        help="render blog_list and blog_details on every request",
+    )
+    parser.add_argument("--output", help="write the json results to this file")
+    args = parser.parse_args()
+
+    stubs.TRANSCRIPT_LATENCY = args.transcript_latency
+    stubs.LLM_LATENCY = args.llm_latency
+    stubs.LLM_TOKENS_PER_SECOND = args.llm_tokens_per_second
+
+    user, post_ids = reset_database(args.posts)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = []
+
+    with mock.patch.dict(
+        views.TRANSCRIPT_SOURCE_FUNCTIONS, {"stub": stubs.stub_transcript_source}
+    ), mock.patch.object(
+        views, "get_llm_router", return_value=LLMRouter([stubs.StubProvider()])
+    ), mock.patch.object(
+        views, "prefetch_video_metadata", stubs.stub_prefetch_video_metadata
+    ), override_settings(
+        **({"CACHES": NO_PAGE_CACHE} if args.no_page_cache else {})
+    ):
+        for scenario in args.scenarios.split(","):
+            for concurrency in levels:
+                runner = Runner(user, post_ids, f"{scenario[0]}{concurrency:03d}")
+                request = getattr(runner, scenario)
+                result = run_level(request, concurrency, args.requests)
+                result["scenario"] = scenario
+                result["memory_kib_per_request"] = memory_per_request(
+                    request, concurrency
+                )
+                results.append(result)
+                print(
+                    f"{scenario:<14} x{concurrency:<3} {result['requests_per_s']:>8} req/s"
+                    f"  p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms"
+                    f"  p99 {result['p99_ms']} ms"
+                    f"  {result['memory_kib_per_request']} KiB/request"
+                )
+
+    report = {
+        "benchmark": "harness",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "database": connection.vendor,
+        "page_cache": not args.no_page_cache,
+        "fakes": {
+            "transcript_latency_s": args.transcript_latency,
+            "llm_latency_s": args.llm_latency,
+            "llm_tokens_per_second": args.llm_tokens_per_second,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark of the blog post full-text search as the table grows.
+
+Seeds the posts in steps and times a rare and a common search term at every
+size, the full-text index should keep both roughly flat.
+
+    python -m benchmarks.search --sizes 1000,10000,50000
+"""
+
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+
+from blog_generator_app.models import BlogPost, make_excerpt  # noqa: E402
+from blog_generator_app.search import index_posts, search_posts  # noqa: E402
+
+WORDS = ["so", "today", "we", "are", "going", "to", "talk", "about", "python"]
+
+
+def reset_database():
+    db_path = settings.DATABASES["default"]["NAME"]
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    call_command("migrate", verbosity=0)
+    return User.objects.create_user(username="bench", password="bench")
+
+
+def add_posts(user, start, stop, content_words):
+    posts = []
+    for i in range(start, stop):
+        words = random.choices(WORDS, k=content_words)
+        # one post in a thousand mentions the rare word
+        if i % 1000 == 0:
+            words[random.randrange(content_words)] = "kubernetes"
+        content = " ".join(words)
+        posts.append(
+            BlogPost(
+                user=user,
+                youtube_title=f"Video {i}",
+                youtube_link=f"https://www.youtube.com/watch?v={i:011d}",
+                generated_content=content,
+                excerpt=make_excerpt(content),
+            )
+        )
+    index_posts(BlogPost.objects.bulk_create(posts))
+
+
+def timed(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--content-words", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    user = reset_database()
+    rows = 0
+
+    print(f"best of {args.repeat}, first page of 20 results")
+    for size in [int(size) for size in args.sizes.split(",")]:
+        add_posts(user, rows, size, args.content_words)
+        rows = size
+
+        rare_ms = timed(lambda: search_posts(user, "kubernetes"), args.repeat)
+        common_ms = timed(lambda: search_posts(user, "python"), args.repeat)
+        print(
+            f"  {rows:>8} posts   rare term {rare_ms:8.2f} ms"
+            f"   common term {common_ms:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
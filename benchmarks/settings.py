@@ -0,0 +1,70 @@
+"""
+Settings for the offline benchmarks.
+
+Same as the project settings but with a throwaway SQLite database and
+stubbed upstream clients, so nothing here talks to Supabase or the LLM apis.
+"""
+
+import os
+import tempfile
+
+from ai_blog.settings import *  # noqa: F401,F403
+
+# the DB_POOL options of the project, used by the postgres profile below
+PROJECT_POOL = DATABASES["default"]["OPTIONS"].get("pool")  # noqa: F405
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.path.join(tempfile.gettempdir(), "ai_blog_benchmark.sqlite3"),
+        # concurrent writers wait for the lock instead of failing (Django 5.1+)
+        "OPTIONS": {
+            "timeout": 30,
+            "transaction_mode": "IMMEDIATE",
+            "init_command": "PRAGMA journal_mode=WAL;",
+        },
+    }
+}
+
+# BENCHMARK_DB=postgres runs against a local server instead
+if os.environ.get("BENCHMARK_DB") == "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("BENCHMARK_DB_NAME", "ai_blog_benchmark"),
+            "USER": os.environ.get("BENCHMARK_DB_USER", "postgres"),
+            "PASSWORD": os.environ.get("BENCHMARK_DB_PASS", ""),
+            "HOST": os.environ.get("BENCHMARK_DB_HOST", "localhost"),
+            "PORT": os.environ.get("BENCHMARK_DB_PORT", "5432"),
+            "OPTIONS": {"pool": PROJECT_POOL} if PROJECT_POOL else {},
+        }
+    }
+
+ALLOWED_HOSTS = ["*"]
+DEBUG = False
+
+GENERATION_RUN_IN_PROCESS = False
+TRANSCRIPT_SOURCES = ["stub"]
+TRANSCRIPT_HEDGE_AFTER = None
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "pages": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark-pages",
+    },
+}
+
+# the per-generation trace lines would drown the benchmark output
+LOGGING = {
+    **LOGGING,  # noqa: F405
+    "loggers": {
+        "blog_generator_app.metrics": {"handlers": ["console"], "level": "WARNING"}
+    },
+}
+
+# the benchmarks measure the pipeline, not the admission control
+RATE_LIMIT_BACKEND = "blog_generator_app.ratelimit.InProcessBackend"
+RATE_LIMIT_USER_PER_MINUTE = RATE_LIMIT_GLOBAL_PER_MINUTE = 1e9
+RATE_LIMIT_USER_BURST = RATE_LIMIT_GLOBAL_BURST = 10**9
+GENERATION_MAX_IN_FLIGHT = 10**9
@@ -0,0 +1,88 @@
+"""Fake upstreams with configurable latency used by the benchmarks"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import Future
+
+from blog_generator_app.providers import LLMProvider
+from blog_generator_app.tokens import count_tokens
+from blog_generator_app.transcript_sources import Snippet
+
+# seconds, overridden from the command line of each benchmark
+TRANSCRIPT_LATENCY = 0.2
+LLM_LATENCY = 0.5
+# output speed of the fake LLM, its latency is LLM_LATENCY + tokens / rate
+LLM_TOKENS_PER_SECOND = 100.0
+
+TRANSCRIPT_TEXT = " ".join(["this is a line of a fake youtube transcript"] * 200)
+
+
+def stub_transcript_source(video_id):
+    """Transcript source for TRANSCRIPT_SOURCE_FUNCTIONS, timed snippets"""
+    time.sleep(TRANSCRIPT_LATENCY)
+    words = TRANSCRIPT_TEXT.split()
+    return [
+        Snippet(text=" ".join(words[i : i + 10]), start=i / 3, duration=3.0)
+        for i in range(0, len(words), 10)
+    ]
+
+
+def stub_prefetch_video_metadata(video_id):
+    """prefetch_video_metadata without yt-dlp, the title stays unknown"""
+    future = Future()
+    future.set_result(None)
+    return future
+
+
+STUB_SUMMARY = "Stub summary. " * 40
+STUB_TITLE = "Stub title"
+
+
+def _llm_latency(output):
+    """LLM_LATENCY plus the time the fake LLM takes to produce output"""
+    return LLM_LATENCY + count_tokens(output) / LLM_TOKENS_PER_SECOND
+
+
+def _blog_post_answer(transcript):
+    raw = json.dumps({"title": STUB_TITLE, "summary": STUB_SUMMARY})
+    return raw, count_tokens(transcript), count_tokens(raw)
+
+
+class StubProvider(LLMProvider):
+    """
+    Provider answering with fixed text after a sleep, for the pipeline's
+    LLMRouter. The async operations sleep on the event loop like the async
+    sdk clients wait on their sockets.
+    """
+
+    provider = "stub"
+
+    def __init__(self, model="stub-model", **kwargs):
+        super().__init__(model, **kwargs)
+
+    def blog_post(self, transcript):
+        answer = _blog_post_answer(transcript)
+        time.sleep(_llm_latency(answer[0]))
+        return answer
+
+    def complete(self, prompt, max_tokens):
+        output = STUB_TITLE if max_tokens == self.title_max_tokens else STUB_SUMMARY
+        time.sleep(_llm_latency(output))
+        return output
+
+    def stream(self, prompt, max_tokens):
+        words = ["stub"] * 20
+        for word in words:
+            time.sleep(LLM_LATENCY / len(words))
+            yield word + " "
+
+    async def ablog_post(self, transcript):
+        answer = _blog_post_answer(transcript)
+        await asyncio.sleep(_llm_latency(answer[0]))
+        return answer
+
+    async def acomplete(self, prompt, max_tokens):
+        output = STUB_TITLE if max_tokens == self.title_max_tokens else STUB_SUMMARY
+        await asyncio.sleep(_llm_latency(output))
+        return output
@@ -0,0 +1,106 @@
+"""
+Micro-benchmark of the transcript store on a 50k snippet transcript.
+
+Compares the old `transcript_text += snippet.text + " "` loop with
+building the packed StoredTranscript, and the size of the packed segments
+with a json list of snippets.
+
+    python -m benchmarks.transcript_store --snippets 50000
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from blog_generator_app.transcripts import (  # noqa: E402
+    StoredTranscript,
+    pack_segments,
+    unpack_segments,
+)
+
+
+def fake_snippets(count):
+    random.seed(0)
+    words = ["so", "today", "we", "are", "going", "to", "talk", "about", "python"]
+    snippets = []
+    start = 0.0
+    for _ in range(count):
+        duration = round(random.uniform(1.0, 4.0), 2)
+        text = " ".join(random.choices(words, k=random.randint(4, 12)))
+        snippets.append(SimpleNamespace(text=text, start=start, duration=duration))
+        start += duration
+    return snippets
+
+
+def timed(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def concatenate(snippets):
+    # what extract_yt_transcript used to do
+    transcript_text = ""
+    for snippet in snippets:
+        transcript_text += snippet.text + " "
+    return transcript_text.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--snippets", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    snippets = fake_snippets(args.snippets)
+
+    concat_ms, _ = timed(lambda: concatenate(snippets), args.repeat)
+    build_ms, stored = timed(
+        lambda: StoredTranscript.from_snippets("benchmark01", "en", snippets),
+        args.repeat,
+    )
+    pack_ms, blob = timed(
+        lambda: pack_segments(stored.starts, stored.durations, stored.offsets),
+        args.repeat,
+    )
+    unpack_ms, _ = timed(lambda: unpack_segments(blob), args.repeat)
+    split_ms, _ = timed(stored.snippet_texts, args.repeat)
+    seek_ms, _ = timed(
+        lambda: [stored.segment_at(second) for second in range(0, 10_000, 10)],
+        args.repeat,
+    )
+
+    raw_blob = pack_segments(
+        stored.starts, stored.durations, stored.offsets, compress=False
+    )
+    as_json = json.dumps(
+        [{"text": s.text, "start": s.start, "duration": s.duration} for s in snippets]
+    )
+
+    print(f"{args.snippets} snippets, best of {args.repeat}")
+    print(f"  string += concatenation   {concat_ms:8.2f} ms")
+    print(f"  StoredTranscript build    {build_ms:8.2f} ms")
+    print(f"  pack segments (zlib)      {pack_ms:8.2f} ms")
+    print(f"  unpack segments           {unpack_ms:8.2f} ms")
+    print(f"  snippet texts from buffer {split_ms:8.2f} ms")
+    print(f"  1000 timestamp lookups    {seek_ms:8.2f} ms")
+    print(f"  text buffer               {len(stored.text.encode()) / 1024:8.1f} KiB")
+    print(f"  segments packed           {len(raw_blob) / 1024:8.1f} KiB")
+    print(f"  segments packed + zlib    {len(blob) / 1024:8.1f} KiB")
+    print(f"  json list of snippets     {len(as_json) / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,19 @@
 from django.contrib import admin
-from .models import BlogPost
+from .models import (
+    BlogPost,
+    DerivedOutput,
+    GenerationJob,
+    GenerationUsage,
+    SummaryCacheEntry,
+    Transcript,
+    VideoMetadata,
+)
 
 # Register your models here.
 admin.site.register(BlogPost)
+admin.site.register(SummaryCacheEntry)
+admin.site.register(GenerationJob)
+admin.site.register(GenerationUsage)
+admin.site.register(Transcript)
+admin.site.register(VideoMetadata)
+admin.site.register(DerivedOutput)
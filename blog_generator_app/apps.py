@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class BlogGeneratorAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog_generator_app'
+
+    def ready(self):
+        # registers the signal handlers keeping the search index and the
+        # page cache up to date
+        from . import page_cache, search  # noqa: F401
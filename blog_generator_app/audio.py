@@ -0,0 +1,305 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import assemblyai as aai
+import yt_dlp
+from django.conf import settings
+
+from .video_urls import canonical_url
+
+logger = logging.getLogger(__name__)
+
+# speech recognition is as good at 48-64kbps, and http formats are written
+# to a single growing file that can be uploaded while it downloads
+AUDIO_FORMAT = (
+    "bestaudio[abr<=64][protocol^=http]/worstaudio[protocol^=http]/worstaudio"
+)
+READ_SIZE = 64 * 1024
+INDEX_FILE = "hashes.json"
+
+
+class AudioCache:
+    """
+    Downloaded audio in MEDIA_ROOT/audio, one <video id>.<ext> file per video.
+
+    Files with the same content are hardlinked to a single copy, and the
+    least recently used ones are deleted when the directory grows past
+    max_bytes. Files of videos being worked on are never evicted.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._in_use = {}  # video id -> number of users
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def using(self, video_id):
+        with self._lock:
+            self._in_use[video_id] = self._in_use.get(video_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_use[video_id] -= 1
+                if not self._in_use[video_id]:
+                    del self._in_use[video_id]
+
+    def _audio_files(self):
+        for entry in os.scandir(self.directory):
+            # skip the index and what yt-dlp is still writing
+            if entry.is_file() and entry.name != INDEX_FILE and "." in entry.name:
+                if not entry.name.endswith((".part", ".ytdl", ".tmp")):
+                    yield entry
+
+    def find(self, video_id):
+        """Path of the complete audio file of a video, None when not downloaded"""
+        for entry in self._audio_files():
+            if entry.name.rsplit(".", 1)[0] == video_id:
+                # the mtime is the last use, see evict()
+                os.utime(entry.path)
+                return entry.path
+        return None
+
+    def add(self, path):
+        """Dedupe a finished download and make room for it"""
+        digest = file_sha256(path)
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        with self._lock:
+            try:
+                with open(index_path) as f:
+                    index = json.load(f)
+            except (FileNotFoundError, ValueError):
+                index = {}
+
+            existing = index.get(digest)
+            if (
+                existing
+                and existing != path
+                and os.path.exists(existing)
+                and not os.path.samefile(existing, path)
+            ):
+                # same audio under another video id (a re-upload)
+                os.link(existing, path + ".tmp")
+                os.replace(path + ".tmp", path)
+            else:
+                index[digest] = path
+                with open(index_path + ".tmp", "w") as f:
+                    json.dump(index, f)
+                os.replace(index_path + ".tmp", index_path)
+
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used files until the cache fits in max_bytes"""
+        with self._lock:
+            in_use = set(self._in_use)
+            entries = sorted(self._audio_files(), key=lambda e: e.stat().st_mtime)
+            # hardlinked copies only take the space once
+            sizes = {}
+            for entry in entries:
+                stat = entry.stat()
+                sizes[(stat.st_dev, stat.st_ino)] = stat.st_size
+            total = sum(sizes.values())
+
+            for entry in entries:
+                if total <= self.max_bytes:
+                    break
+                if entry.name.rsplit(".", 1)[0] in in_use:
+                    continue
+                stat = entry.stat()
+                os.remove(entry.path)
+                if stat.st_nlink == 1:
+                    total -= sizes[(stat.st_dev, stat.st_ino)]
+                logger.info("Evicted %s from the audio cache", entry.name)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class AudioDownload:
+    """
+    yt-dlp download of a video's audio, running in its own thread.
+
+    reader() can be consumed while the file is still being written.
+    Interrupted downloads are resumed from their .part file.
+    """
+
+    def __init__(self, video_id, directory):
+        self.url = canonical_url(video_id)
+        self.options = {
+            "format": AUDIO_FORMAT,
+            "outtmpl": os.path.join(directory, "%(id)s.%(ext)s"),
+            "continuedl": True,
+            "quiet": True,
+            "no_warnings": True,
+            "noprogress": True,
+        }
+        self.path = None
+        self.error = None
+        self.started = threading.Event()  # path is known
+        self.done = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name="audio-download", daemon=True).start()
+
+    def _run(self):
+        try:
+            with yt_dlp.YoutubeDL(self.options) as ydl:  # type: ignore
+                info = ydl.extract_info(self.url, download=False)
+                self.path = ydl.prepare_filename(info)
+                self.started.set()
+                ydl.process_info(info)
+        except Exception as e:
+            logger.exception("Error downloading audio of %s", self.url)
+            self.error = e
+        finally:
+            self.started.set()
+            self.done.set()
+
+    def reader(self, poll_interval=0.2):
+        return GrowingFileReader(self, poll_interval)
+
+
+class GrowingFileReader:
+    """
+    Binary stream over a file that is still being downloaded.
+
+    read() waits for more bytes until the download is over. It has no
+    fileno() or seek(), so httpx sends it with chunked transfer encoding.
+    """
+
+    def __init__(self, download, poll_interval):
+        self.download = download
+        self.poll_interval = poll_interval
+        self._file = None
+
+    def _open(self):
+        self.download.started.wait()
+        if self.download.path is None:
+            return
+        # the .part file is renamed once complete, an open file survives that
+        for path in (self.download.path + ".part", self.download.path):
+            try:
+                self._file = open(path, "rb")
+                return
+            except FileNotFoundError:
+                pass
+
+    def read(self, size=-1):
+        while True:
+            finished = self.download.done.is_set()
+            if self.download.error is not None:
+                raise RuntimeError("Could not download the audio of the video")
+            if self._file is None:
+                self._open()
+            if self._file is not None:
+                data = self._file.read(size)
+                if data or finished:
+                    return data
+            elif finished:
+                raise RuntimeError("Could not download the audio of the video")
+            time.sleep(self.poll_interval)
+
+    def __iter__(self):
+        for block in iter(lambda: self.read(READ_SIZE), b""):
+            yield block
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_audio_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AudioCache(
+                os.path.join(settings.MEDIA_ROOT, "audio"),
+                getattr(settings, "AUDIO_CACHE_MAX_BYTES", 2 * 1024**3),
+            )
+    return _cache
+
+
+@contextmanager
+def open_audio(video_id):
+    """
+    Binary stream of a video's audio, from the cache or while downloading it.
+
+    A download that isn't over when the stream is closed still completes,
+    so the file is in the cache the next time.
+    """
+    cache = get_audio_cache()
+    with cache.using(video_id):
+        path = cache.find(video_id)
+        if path is not None:
+            with open(path, "rb") as f:
+                yield f
+            return
+
+        download = AudioDownload(video_id, cache.directory)
+        download.start()
+        reader = download.reader()
+        try:
+            yield reader
+        finally:
+            reader.close()
+            download.done.wait()
+            if download.error is None and download.path is not None:
+                cache.add(download.path)
+
+
+def transcribe_audio(video_id):
+    """AssemblyAI transcript of a video, the upload starts with the download"""
+    aai.settings.api_key = os.environ.get("AAI")
+    with open_audio(video_id) as audio:
+        return aai.Transcriber().transcribe(audio)
+
+
+_executor = None
+_pending = {}  # video id -> future of its transcription
+_pending_lock = threading.Lock()
+
+
+def submit_transcription(video_id):
+    """
+    Transcribe a video's audio on the background pool, returns a future.
+
+    The pool bounds how many downloads and uploads run at once, and a
+    video being transcribed already gets the future of that job.
+    """
+    global _executor
+    with _pending_lock:
+        future = _pending.get(video_id)
+        if future is not None:
+            return future
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "AUDIO_TRANSCRIPTION_WORKERS", 2),
+                thread_name_prefix="transcription",
+            )
+        future = _pending[video_id] = _executor.submit(transcribe_audio, video_id)
+
+    def forget(done):
+        with _pending_lock:
+            if _pending.get(video_id) is done:
+                del _pending[video_id]
+
+    future.add_done_callback(forget)
+    return future
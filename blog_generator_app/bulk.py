@@ -0,0 +1,194 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+from django.conf import settings
+from django.db import connections
+
+from .jobs import GenerationError
+from .models import BlogPost, make_excerpt
+from .page_cache import invalidate_post
+from .search import index_posts
+from .video_urls import canonical_url
+
+logger = logging.getLogger(__name__)
+
+
+class BulkItem:
+    """One video of a bulk request and what happened to it"""
+
+    PENDING = "pending"
+    GENERATED = "generated"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, link, video_id):
+        self.link = link
+        self.video_id = video_id
+        self.status = self.PENDING
+        self.error = ""
+        self.title = None
+        self.content = None
+        self.blog_post = None
+        self.job_id = None
+
+    def as_dict(self):
+        return {
+            "link": self.link,
+            "video_id": self.video_id,
+            "status": self.status,
+            "error": self.error,
+            "blog_post_id": self.blog_post.id if self.blog_post else None,
+            "job_id": str(self.job_id) if self.job_id else None,
+        }
+
+
+def is_playlist_link(link):
+    return "/playlist" in link or ("list=" in link and "v=" not in link)
+
+
+def expand_playlist(link):
+    """Video links of a playlist, without downloading anything"""
+    ydl_opts = {
+        "quiet": True,
+        "no_warnings": True,
+        "extract_flat": "in_playlist",
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore
+        info = ydl.extract_info(link, download=False)
+
+    return [
+        canonical_url(entry["id"])
+        for entry in (info.get("entries") or [])  # type: ignore
+        if entry and entry.get("id")
+    ]
+
+
+def collect_videos(links, extract_id):
+    """
+    Expand playlists and keep the first link of every distinct video.
+
+    Raises ValueError for a link that is neither a playlist nor a video.
+    """
+    items = {}
+    duplicates = []
+
+    for link in links:
+        link = link.strip()
+        if not link:
+            continue
+
+        for video_link in expand_playlist(link) if is_playlist_link(link) else [link]:
+            video_id = extract_id(video_link)
+            if video_id is None:
+                raise ValueError(f"Not a YouTube video link: {video_link}")
+            if video_id in items:
+                duplicates.append(video_link)
+            else:
+                items[video_id] = BulkItem(video_link, video_id)
+
+    return list(items.values()), duplicates
+
+
+def _in_thread(function):
+    """Pool threads must not keep db connections around"""
+
+    def wrapper(item):
+        try:
+            return function(item)
+        finally:
+            connections.close_all()
+
+    return wrapper
+
+
+def _fail(item, error, on_item_done):
+    item.status = BulkItem.FAILED
+    item.error = error
+    if on_item_done is not None:
+        on_item_done(item)
+
+
+def run_bulk_generation(
+    user,
+    items,
+    load_transcript,
+    generate_content,
+    transcript_workers=None,
+    llm_workers=None,
+    on_item_done=None,
+):
+    """
+    Generate blog posts for many videos at once.
+
+    Transcripts are fetched first with transcript_workers threads, which
+    fills the transcript store. The LLM work then runs on its own, usually
+    smaller, pool so we stay under the provider rate limits. All blog
+    posts are written with a single bulk_create at the end.
+    """
+    if transcript_workers is None:
+        transcript_workers = getattr(settings, "BULK_TRANSCRIPT_WORKERS", 8)
+    if llm_workers is None:
+        llm_workers = getattr(settings, "BULK_LLM_WORKERS", 4)
+
+    started = time.perf_counter()
+
+    @_in_thread
+    def fetch(item):
+        try:
+            if load_transcript(item.video_id) is None:
+                _fail(item, "No transcription available for this video", on_item_done)
+        except Exception:
+            logger.exception("Error fetching transcript of %s", item.video_id)
+            _fail(item, "Could not fetch the transcript", on_item_done)
+
+    @_in_thread
+    def generate(item):
+        try:
+            item.title, item.content = generate_content(item.video_id)
+            item.status = BulkItem.GENERATED
+        except GenerationError as e:
+            _fail(item, str(e), on_item_done)
+        except Exception:
+            logger.exception("Error generating blog post for %s", item.video_id)
+            _fail(item, "Unexpected error while generating the blog post", on_item_done)
+
+    with ThreadPoolExecutor(max_workers=transcript_workers) as pool:
+        list(pool.map(fetch, items))
+
+    pending = [item for item in items if item.status == BulkItem.PENDING]
+    with ThreadPoolExecutor(max_workers=llm_workers) as pool:
+        list(pool.map(generate, pending))
+
+    generated = [item for item in items if item.status == BulkItem.GENERATED]
+    posts = BlogPost.objects.bulk_create(
+        [
+            BlogPost(
+                user=user,
+                youtube_title=item.title,
+                youtube_link=item.link,
+                generated_content=item.content,
+                excerpt=make_excerpt(item.content),
+            )
+            for item in generated
+        ]
+    )
+    # bulk_create sends no post_save, do what its receivers would
+    index_posts(posts)
+    for post in posts:
+        invalidate_post(post)
+    for item, post in zip(generated, posts):
+        item.blog_post = post
+        item.status = BulkItem.DONE
+        if on_item_done is not None:
+            on_item_done(item)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "items": [item.as_dict() for item in items],
+        "created": len(generated),
+        "failed": len(items) - len(generated),
+        "elapsed_s": round(elapsed, 2),
+        "videos_per_minute": round(len(items) / elapsed * 60, 2) if elapsed else None,
+    }
@@ -0,0 +1,246 @@
+import math
+import re
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .compaction import clean_snippet, trim_to_budget
+from .llm import CHAPTER_PROMPT
+from .summarization import DEFAULT_FAN_OUT, chunk_budget
+
+Chapter = namedtuple("Chapter", ["start", "end", "first", "stop"])
+ChapterSummary = namedtuple("ChapterSummary", ["chapter", "title", "summary"])
+
+WORD_RE = re.compile(r"[^\W\d_]{3,}")
+# "## Title", "**Title:** Title" and the like on the first line of an answer
+TITLE_MARKUP_RE = re.compile(r"^(?:[#*_\s]+|title\s*:)+", re.IGNORECASE)
+# words of three letters or more that say nothing about the topic
+STOPWORDS = frozenset("""
+    the and for are but not you all any can had her was one our out has him his
+    how its may new now old see two way who did get let put say she too use
+    that this with have from they know want been good much some time very when
+    come here just like long make many more only over such take than them well
+    were what will your about there their would these think going really
+    right yeah okay actually because something thing things people which
+    para los las que por con una del como pero más este esta muy
+    """.split())
+
+# defaults of the CHAPTER_* settings
+WINDOW_SECONDS = 60.0
+MIN_CHAPTER_SECONDS = 120.0
+PAUSE_SECONDS = 3.0  # a silence this long counts as much as a full topic change
+PAUSE_WEIGHT = 0.5
+THRESHOLD_STD = 0.5  # boundaries score this many std devs over the mean
+# and at least this much, or a video on a single topic is cut on noise
+MIN_SHIFT_SCORE = 0.4
+
+
+def snippet_terms(text):
+    return Counter(
+        word for word in WORD_RE.findall(text.lower()) if word not in STOPWORDS
+    )
+
+
+class _Window:
+    """Term counts of consecutive snippets and their squared norm"""
+
+    def __init__(self):
+        self.counts = {}
+        self.norm = 0
+
+    def add(self, terms, other, sign):
+        """
+        Add (sign 1) or remove (sign -1) the terms of a snippet, returns
+        the change of the dot product with the other window.
+        """
+        counts = self.counts
+        other_counts = other.counts
+        dot = 0
+        for word, count in terms.items():
+            count *= sign
+            before = counts.get(word, 0)
+            after = before + count
+            self.norm += after * after - before * before
+            dot += count * other_counts.get(word, 0)
+            if after:
+                counts[word] = after
+            else:
+                del counts[word]
+        return dot
+
+
+def shift_scores(starts, durations, terms, window_seconds, pause_seconds, weight):
+    """
+    Topic shift score of every gap, scores[i] is the gap before snippet i.
+
+    The term counts of window_seconds of speech on each side of the gap are
+    compared (1 - cosine similarity) and a pause before the snippet adds up
+    to weight. Both windows slide along the snippets and are updated with
+    the snippets entering and leaving them, so the whole pass is linear in
+    the number of words.
+    """
+    count = len(starts)
+    scores = [0.0] * count
+    left, right = _Window(), _Window()
+    dot = 0
+    first = 0  # left window is snippets [first, i), right one [i, stop)
+    stop = 0
+
+    for i in range(count):
+        if i:
+            dot += right.add(terms[i - 1], left, -1)
+            dot += left.add(terms[i - 1], right, 1)
+        while first < i and starts[first] < starts[i] - window_seconds:
+            dot += left.add(terms[first], right, -1)
+            first += 1
+        while stop < count and (stop <= i or starts[stop] < starts[i] + window_seconds):
+            dot += right.add(terms[stop], left, 1)
+            stop += 1
+        if not i:
+            continue
+
+        if left.norm and right.norm:
+            similarity = dot / math.sqrt(left.norm * right.norm)
+        else:
+            similarity = 1.0
+        pause = starts[i] - starts[i - 1] - durations[i - 1]
+        scores[i] = (
+            1.0 - similarity + weight * min(max(pause, 0.0) / pause_seconds, 1.0)
+        )
+    return scores
+
+
+def pick_boundaries(starts, end, scores, min_seconds, threshold_std, min_score):
+    """
+    Snippets starting a new chapter: local maxima of the smoothed scores
+    above mean + threshold_std * std and min_score, at least min_seconds
+    apart and from both ends of the video. Of two candidates too close
+    together the higher scoring one is kept. Linear in the number of gaps.
+    """
+    count = len(scores)
+    candidates = [
+        i
+        for i in range(1, count)
+        if starts[i] - starts[0] >= min_seconds and end - starts[i] >= min_seconds
+    ]
+    if not candidates:
+        return []
+
+    # 3 point moving average, a single odd snippet isn't a topic change
+    smoothed = [
+        (scores[max(i - 1, 1)] + scores[i] + scores[min(i + 1, count - 1)]) / 3
+        for i in range(count)
+    ]
+    values = [smoothed[i] for i in candidates]
+    mean = sum(values) / len(values)
+    std = math.sqrt(sum((value - mean) ** 2 for value in values) / len(values))
+    threshold = max(mean + threshold_std * std, min_score)
+
+    boundaries = []
+    last = starts[0]
+    pending = None
+    for i in candidates:
+        if smoothed[i] < threshold or starts[i] - last < min_seconds:
+            continue
+        if smoothed[i] < smoothed[i - 1] or (
+            i + 1 < count and smoothed[i] < smoothed[i + 1]
+        ):
+            continue
+        if pending is None:
+            pending = i
+        elif starts[i] - starts[pending] < min_seconds:
+            if smoothed[i] > smoothed[pending]:
+                pending = i
+        else:
+            boundaries.append(pending)
+            last = starts[pending]
+            pending = i if starts[i] - last >= min_seconds else None
+    if pending is not None:
+        boundaries.append(pending)
+    return boundaries
+
+
+def segment_transcript(stored_transcript, texts=None):
+    """Split a stored transcript into topical chapters, see shift_scores()"""
+    starts, durations = stored_transcript.starts, stored_transcript.durations
+    if texts is None:
+        texts = stored_transcript.snippet_texts()
+    if not texts:
+        return []
+    end = starts[-1] + durations[-1]
+
+    scores = shift_scores(
+        starts,
+        durations,
+        [snippet_terms(text) for text in texts],
+        getattr(settings, "CHAPTER_WINDOW_SECONDS", WINDOW_SECONDS),
+        PAUSE_SECONDS,
+        PAUSE_WEIGHT,
+    )
+    boundaries = pick_boundaries(
+        starts,
+        end,
+        scores,
+        getattr(settings, "CHAPTER_MIN_SECONDS", MIN_CHAPTER_SECONDS),
+        THRESHOLD_STD,
+        MIN_SHIFT_SCORE,
+    )
+
+    chapters = []
+    for first, stop in zip([0] + boundaries, boundaries + [len(texts)]):
+        chapter_end = starts[stop] if stop < len(texts) else end
+        chapters.append(Chapter(starts[first], chapter_end, first, stop))
+    return chapters
+
+
+def format_timestamp(seconds):
+    """mm:ss, or h:mm:ss past the hour"""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def parse_chapter(raw):
+    """(title, summary) from a chapter answer, the title is its first line"""
+    lines = [line.strip() for line in (raw or "").strip().splitlines()]
+    lines = [line for line in lines if line]
+    if not lines:
+        raise ValueError("Empty chapter summary")
+    title = TITLE_MARKUP_RE.sub("", lines[0]).strip("*_ ")
+    return title, " ".join(lines[1:])
+
+
+def render_chapters(stored_transcript, chapter_summaries):
+    """Chapter list with markdown links that open the video at each chapter"""
+    return "\n\n".join(
+        f"[{format_timestamp(item.chapter.start)}]"
+        f"({stored_transcript.timestamp_url(item.chapter.start)}) "
+        f"**{item.title}**\n{item.summary}".rstrip()
+        for item in chapter_summaries
+    )
+
+
+def summarize_chapters(stored_transcript, complete, fan_out=None):
+    """
+    Chapter summaries of a transcript, each chapter on its own in parallel.
+
+    complete(prompt) returns the answer of the LLM. Returns the
+    ChapterSummary list, in video order.
+    """
+    if fan_out is None:
+        fan_out = getattr(settings, "SUMMARY_FAN_OUT", DEFAULT_FAN_OUT)
+    texts = stored_transcript.snippet_texts()
+    chapters = segment_transcript(stored_transcript, texts)
+
+    def summarize(chapter):
+        cleaned = [clean_snippet(text) for text in texts[chapter.first : chapter.stop]]
+        # a very long chapter is sampled over its whole length like compaction does
+        text = " ".join(trim_to_budget([t for t in cleaned if t], chunk_budget()))
+        title, summary = parse_chapter(complete(CHAPTER_PROMPT.format(transcript=text)))
+        return ChapterSummary(chapter, title, summary)
+
+    with ThreadPoolExecutor(max_workers=max(min(fan_out, len(chapters)), 1)) as pool:
+        return list(pool.map(summarize, chapters))
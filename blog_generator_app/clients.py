@@ -0,0 +1,307 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import anthropic
+import httpx
+import openai
+from django.conf import settings
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api.proxies import WebshareProxyConfig
+
+from .ratelimit import upstream_limiter
+
+
+class ConnectionStats:
+    """Counts requests and newly opened connections for one client"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def as_dict(self):
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reuse_rate": round(reused / self.requests, 3) if self.requests else None,
+        }
+
+
+class ClientRegistry:
+    """
+    Process-wide cache of long-lived http clients.
+
+    Clients are created lazily on first use and dropped after a fork, so
+    gunicorn workers never share sockets inherited from the master process.
+    Async clients are bound to the event loop that created them.
+    """
+
+    def __init__(self):
+        # reentrant: client factories register their stats while we hold it
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._local = threading.local()
+        self.stats = {}
+
+    def reset(self):
+        with self._lock:
+            self._pid = os.getpid()
+            self._clients = {}
+            self._async_clients = weakref.WeakKeyDictionary()
+            self._local = threading.local()
+            self.stats = {}
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self.reset()
+
+    def stats_for(self, name):
+        with self._lock:
+            return self.stats.setdefault(name, ConnectionStats())
+
+    def get(self, name, factory):
+        self._check_pid()
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = factory()
+                    self._clients[name] = client
+        return client
+
+    def get_async(self, name, factory):
+        self._check_pid()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+        if name not in clients:
+            clients[name] = factory()
+        return clients[name]
+
+    def get_thread_local(self, name, factory):
+        self._check_pid()
+        client = getattr(self._local, name, None)
+        if client is None:
+            client = factory()
+            setattr(self._local, name, client)
+        return client
+
+
+registry = ClientRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=registry.reset)
+
+
+def _timeout():
+    return getattr(settings, "LLM_HTTP_TIMEOUT", 120.0)
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=getattr(settings, "LLM_HTTP_MAX_CONNECTIONS", 20),
+        max_keepalive_connections=getattr(settings, "LLM_HTTP_MAX_KEEPALIVE", 10),
+        keepalive_expiry=getattr(settings, "LLM_HTTP_KEEPALIVE_EXPIRY", 60.0),
+    )
+
+
+def _sync_hooks(name, provider):
+    stats = registry.stats_for(name)
+
+    def trace(event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            stats.record_connection()
+
+    def on_request(request):
+        stats.record_request()
+        request.extensions["trace"] = trace
+
+    def on_response(response):
+        # seen on every attempt, including the ones the sdk retries itself
+        if response.status_code == 429:
+            upstream_limiter(provider).throttled()
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def _async_hooks(name, provider):
+    stats = registry.stats_for(name)
+
+    async def trace(event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            stats.record_connection()
+
+    async def on_request(request):
+        stats.record_request()
+        request.extensions["trace"] = trace
+
+    async def on_response(response):
+        if response.status_code == 429:
+            upstream_limiter(provider).throttled()
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def get_openai_client():
+    """Shared OpenAI client with a pooled http connection"""
+    return registry.get(
+        "openai",
+        lambda: openai.OpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            http_client=openai.DefaultHttpxClient(
+                timeout=_timeout(),
+                limits=_limits(),
+                event_hooks=_sync_hooks("openai", "openai"),
+            ),
+        ),
+    )
+
+
+def get_claude_client():
+    """Shared Anthropic client with a pooled http connection"""
+    return registry.get(
+        "claude",
+        lambda: anthropic.Anthropic(
+            api_key=os.environ.get("CLAUDE_API_KEY"),
+            http_client=anthropic.DefaultHttpxClient(
+                timeout=_timeout(),
+                limits=_limits(),
+                event_hooks=_sync_hooks("claude", "claude"),
+            ),
+        ),
+    )
+
+
+def get_async_openai_client():
+    """AsyncOpenAI client shared by everything running on the current event loop"""
+    return registry.get_async(
+        "openai",
+        lambda: openai.AsyncOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            http_client=openai.DefaultAsyncHttpxClient(
+                timeout=_timeout(),
+                limits=_limits(),
+                event_hooks=_async_hooks("async_openai", "openai"),
+            ),
+        ),
+    )
+
+
+def get_async_claude_client():
+    """AsyncAnthropic client shared by everything running on the current event loop"""
+    return registry.get_async(
+        "claude",
+        lambda: anthropic.AsyncAnthropic(
+            api_key=os.environ.get("CLAUDE_API_KEY"),
+            http_client=anthropic.DefaultAsyncHttpxClient(
+                timeout=_timeout(),
+                limits=_limits(),
+                event_hooks=_async_hooks("async_claude", "claude"),
+            ),
+        ),
+    )
+
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """requests has no session-wide timeout, so the adapter supplies one"""
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout or self.timeout, **kwargs)
+
+
+def _transcript_proxy_config():
+    return WebshareProxyConfig(
+        proxy_username=os.environ.get("WEBSHARE_PROXY_USERNAME"),  # type: ignore
+        proxy_password=os.environ.get("WEBSHARE_PROXY_PASSWORD"),  # type: ignore
+    )
+
+
+def _transcript_adapter():
+    """One urllib3 pool for all transcript fetches in this process"""
+    pool_size = getattr(settings, "TRANSCRIPT_POOL_SIZE", 10)
+    return _TimeoutHTTPAdapter(
+        timeout=getattr(settings, "TRANSCRIPT_TIMEOUT", 30.0),
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        # same retry policy the library mounts for proxied sessions
+        max_retries=Retry(
+            total=_transcript_proxy_config().retries_when_blocked,
+            status_forcelist=[429],
+        ),
+    )
+
+
+def _transcript_api():
+    adapter = registry.get("transcript_adapter", _transcript_adapter)
+    session = Session()
+    api = YouTubeTranscriptApi(
+        proxy_config=_transcript_proxy_config(), http_client=session
+    )
+
+    # replace the adapters mounted by the library with the shared pool
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    # webshare rotates the exit ip per connection, so the library sends
+    # "Connection: close". Keeping connections alive is opt-in.
+    if getattr(settings, "TRANSCRIPT_KEEP_ALIVE", False):
+        session.headers.pop("Connection", None)
+    return api
+
+
+def get_transcript_api():
+    """
+    YouTubeTranscriptApi for the current thread.
+
+    The library keeps per-instance state and isn't thread safe, so every
+    thread gets its own instance, but they all share one connection pool.
+    """
+    return registry.get_thread_local("transcript_api", _transcript_api)
+
+
+def _transcript_stats():
+    adapter = registry._clients.get("transcript_adapter")
+    stats = {"requests": 0, "connections_opened": 0}
+    if adapter is None:
+        return stats
+
+    managers = [adapter.poolmanager, *adapter.proxy_manager.values()]
+    for manager in managers:
+        for key in list(manager.pools.keys()):
+            pool = manager.pools[key]
+            stats["requests"] += pool.num_requests
+            stats["connections_opened"] += pool.num_connections
+    return stats
+
+
+def connection_stats():
+    """Requests, opened connections and reuse rate for every pooled client"""
+    result = {name: stats.as_dict() for name, stats in list(registry.stats.items())}
+
+    transcript = ConnectionStats()
+    counts = _transcript_stats()
+    transcript.requests = counts["requests"]
+    transcript.connections_opened = counts["connections_opened"]
+    result["transcript"] = transcript.as_dict()
+    return result
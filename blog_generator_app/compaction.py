@@ -0,0 +1,105 @@
+import re
+from collections import namedtuple
+
+from django.conf import settings
+
+from .tokens import count_tokens
+
+CompactTranscript = namedtuple(
+    "CompactTranscript", ["snippets", "text", "tokens_before", "tokens_after"]
+)
+
+# [Music], [Applause], [inaudible]... and the music notes of auto-captions
+ANNOTATION_RE = re.compile(r"\[[^\]]{0,40}\]|[♪♫]+|>>")
+# the same markers in parentheses, only the usual ones since (text) is speech too
+PAREN_ANNOTATION_RE = re.compile(
+    r"\((?:music|applause|laughter|laughs|inaudible|silence|cheering)\)", re.I
+)
+FILLER_RE = re.compile(r"\b(?:u+m+|u+h+|e+r+m+|h+m+)\b[,.]?", re.I)
+WHITESPACE_RE = re.compile(r"\s+")
+# rolling auto-captions repeat at most a line of the previous caption, a
+# single repeated word is more likely speech ("no, no") than an overlap
+MAX_OVERLAP_WORDS = 20
+MIN_OVERLAP_WORDS = 2
+
+
+def clean_snippet(text):
+    """Drop non-speech annotations and fillers and normalize whitespace"""
+    text = ANNOTATION_RE.sub(" ", text)
+    text = PAREN_ANNOTATION_RE.sub(" ", text)
+    text = FILLER_RE.sub(" ", text)
+    return WHITESPACE_RE.sub(" ", text).strip()
+
+
+def _overlap(previous, words):
+    """Number of leading words that repeat the end of the previous output"""
+    lowered = [word.lower() for word in words[:MAX_OVERLAP_WORDS]]
+    for size in range(min(len(previous), len(lowered)), MIN_OVERLAP_WORDS - 1, -1):
+        if previous[-size:] == lowered[:size]:
+            return size
+    return 0
+
+
+def dedupe_snippets(snippets):
+    """
+    Remove the words auto-captions repeat from one line to the next.
+
+    Rolling captions show "so today we are" then "we are going to talk",
+    only the part that is new is kept. Exact repeats disappear entirely.
+    """
+    result = []
+    previous = []  # lowered tail of what we kept so far
+    for text in snippets:
+        words = text.split()
+        words = words[_overlap(previous, words) :]
+        if not words:
+            continue
+        result.append(" ".join(words))
+        previous = (previous + [word.lower() for word in words])[-MAX_OVERLAP_WORDS:]
+    return result
+
+
+def trim_to_budget(snippets, budget):
+    """
+    Keep at most budget tokens of snippets, spread over the whole video.
+
+    Snippets are dropped evenly rather than cutting the end, so the summary
+    still covers everything that was said. Tokens are counted with
+    count_tokens(), an estimate of 4 characters per token without tiktoken.
+    """
+    counts = [count_tokens(snippet) + 1 for snippet in snippets]
+    total = sum(counts)
+    if not budget or total <= budget:
+        return snippets
+
+    ratio = budget / total
+    kept = []
+    seen = used = 0
+    for snippet, count in zip(snippets, counts):
+        seen += count
+        if used + count <= seen * ratio:
+            kept.append(snippet)
+            used += count
+    return kept
+
+
+def compact_transcript(snippets, budget=None, rolling=False):
+    """
+    Prompt-ready transcript from raw snippet texts, with token counts.
+
+    rolling is for youtube auto-captions, whose lines repeat the end of the
+    previous one. Other transcripts are not deduped, a speaker repeating
+    themselves there is real speech.
+    """
+    if budget is None:
+        budget = getattr(settings, "TRANSCRIPT_TOKEN_BUDGET", None)
+
+    raw_text = " ".join(snippets)
+    cleaned = [text for text in (clean_snippet(s) for s in snippets) if text]
+    if rolling:
+        cleaned = dedupe_snippets(cleaned)
+    compacted = trim_to_budget(cleaned, budget)
+    text = " ".join(compacted)
+    return CompactTranscript(
+        compacted, text, count_tokens(raw_text), count_tokens(text)
+    )
@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.utils import timezone
+
+from .chapters import render_chapters, summarize_chapters
+from .jobs import GenerationError
+from .llm import NOTES_PROMPT, TLDR_PROMPT
+from .metrics import span
+from .models import DerivedOutput
+from .providers import ProviderError
+from .usage import record_derived_usage
+
+logger = logging.getLogger(__name__)
+
+# a chapter title and two or three sentences
+CHAPTER_MAX_TOKENS = 200
+# a call made to derive a format, for the usage records
+DerivedCall = namedtuple("DerivedCall", ["prompt", "output", "provider", "latency_ms"])
+
+
+def complete(router, prompt, max_tokens, calls):
+    """router.call("complete"), the call is appended to calls"""
+    started = time.perf_counter()
+    output, provider = router.call("complete", prompt, max_tokens)
+    calls.append(
+        DerivedCall(
+            prompt, output, provider, round((time.perf_counter() - started) * 1000)
+        )
+    )
+    return output
+
+
+def from_prompt(prompt, max_tokens):
+    """Format generated by a single prompt filled with its source"""
+
+    def generate(source, router, calls):
+        return complete(router, prompt.format(source=source), max_tokens, calls)
+
+    return generate
+
+
+def chapter_summaries(stored_transcript, router, calls):
+    """Chapters found in the transcript, summarized in parallel, with timestamps"""
+    chapters = summarize_chapters(
+        stored_transcript,
+        lambda prompt: complete(router, prompt, CHAPTER_MAX_TOKENS, calls),
+    )
+    return render_chapters(stored_transcript, chapters)
+
+
+# source is what a format is generated from, "summary" (the cached summary
+# of the video, a fraction of the tokens) or "transcript" (the stored
+# transcript) for what the summary can't tell, like when things are said.
+# generate(source, router, calls) returns the output. Bump the version of a
+# format when the way it's generated changes, only that format is redone
+DerivedFormat = namedtuple("DerivedFormat", ["name", "source", "version", "generate"])
+
+FORMATS = {
+    derived_format.name: derived_format
+    for derived_format in [
+        DerivedFormat("tldr", "summary", 1, from_prompt(TLDR_PROMPT, 200)),
+        DerivedFormat("notes", "summary", 1, from_prompt(NOTES_PROMPT, 800)),
+        DerivedFormat("chapters", "transcript", 2, chapter_summaries),
+    ]
+}
+# the summary cache entry already holds these
+BASE_FORMATS = ("title", "blog_post")
+
+
+def source_hash(source):
+    text = source if isinstance(source, str) else source.text
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def is_fresh(output, derived_format, digest):
+    """False when the format or what the output was derived from changed"""
+    return (
+        output.prompt_version == str(derived_format.version)
+        and output.source_hash == digest
+    )
+
+
+def derive_formats(video_id, names, get_summary, load_transcript, router):
+    """
+    Outputs of a video in the given formats, returns ({name: content},
+    names of the formats that had to be generated).
+
+    get_summary(video_id) -> (title, summary) is the usual generation,
+    served from the summary cache once the video was generated.
+    load_transcript(video_id) returns the stored transcript. Outputs are
+    stored per video and format, only the missing and stale ones are
+    generated, in parallel. Raises GenerationError like the generation.
+    """
+    unknown = [
+        name for name in names if name not in FORMATS and name not in BASE_FORMATS
+    ]
+    if unknown:
+        raise ValueError(f"Unknown formats: {', '.join(unknown)}")
+
+    title, summary = get_summary(video_id)
+    contents = {}
+    if "title" in names:
+        contents["title"] = title
+    if "blog_post" in names:
+        contents["blog_post"] = summary
+
+    derived = [FORMATS[name] for name in dict.fromkeys(names) if name in FORMATS]
+    if not derived:
+        return contents, []
+
+    sources = {"summary": summary}
+    if any(derived_format.source == "transcript" for derived_format in derived):
+        sources["transcript"] = load_transcript(video_id)
+        if sources["transcript"] is None:
+            raise GenerationError("No transcription available for this video")
+
+    stored = {
+        output.format: output
+        for output in DerivedOutput.objects.filter(
+            video_id=video_id, format__in=[f.name for f in derived]
+        )
+    }
+    missing = []
+    for derived_format in derived:
+        digest = source_hash(sources[derived_format.source])
+        output = stored.get(derived_format.name)
+        if output is not None and is_fresh(output, derived_format, digest):
+            contents[derived_format.name] = output.content
+        else:
+            missing.append((derived_format, digest))
+
+    def generate(item):
+        derived_format, _ = item
+        calls = []
+        with span("derive", format=derived_format.name):
+            content = derived_format.generate(
+                sources[derived_format.source], router, calls
+            )
+        return content, calls
+
+    # the calls run on the pool, the db writes stay on this thread
+    with ThreadPoolExecutor(max_workers=max(len(missing), 1)) as pool:
+        try:
+            results = list(pool.map(generate, missing))
+        except (ProviderError, ValueError):
+            logger.exception("Error deriving formats")
+            raise GenerationError("Failed to generate blog content from LLM api")
+
+    for (derived_format, digest), (content, calls) in zip(missing, results):
+        if not content:
+            raise GenerationError("Failed to generate blog content from LLM api")
+        provider = calls[-1].provider
+        DerivedOutput.objects.update_or_create(
+            video_id=video_id,
+            format=derived_format.name,
+            defaults={
+                "prompt_version": str(derived_format.version),
+                "source_hash": digest,
+                "provider": provider.provider,
+                "model": provider.model,
+                "content": content,
+                "created_at": timezone.now(),
+            },
+        )
+        for call in calls:
+            record_derived_usage(
+                video_id,
+                call.provider.provider,
+                call.provider.model,
+                call.prompt,
+                call.output,
+                call.latency_ms,
+            )
+        contents[derived_format.name] = content
+
+    return contents, [derived_format.name for derived_format, _ in missing]
@@ -0,0 +1,241 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import GenerationJob
+from .ratelimit import release_generation
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationError(Exception):
+    """Raised by the pipeline when a video can't be turned into a blog post"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Lazily create the process-wide worker pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "GENERATION_WORKERS", 4),
+                thread_name_prefix="generation",
+            )
+    return _executor
+
+
+def enqueue_generation(user, yt_link, runner, job_id=None):
+    """Create a queued job and hand it to the in-process workers"""
+    job = GenerationJob(user=user, youtube_link=yt_link)
+    if job_id is not None:
+        job.id = job_id
+    job.save(force_insert=True)
+
+    # when disabled the jobs are picked up by `manage.py run_generation_worker`
+    if getattr(settings, "GENERATION_RUN_IN_PROCESS", True):
+        transaction.on_commit(
+            lambda: _get_executor().submit(run_job_in_thread, job.pk, runner)
+        )
+    return job
+
+
+def enqueue_bulk_generation(user, items, runner, slot=None):
+    """
+    Create a job per bulk item and run all of them as one background task.
+
+    The rows start as running so `run_generation_worker` leaves them alone,
+    the bulk runner reports every item through on_item_done. The admission
+    slot, if any, is released once the whole task is over.
+    """
+    started_at = timezone.now()
+    jobs = GenerationJob.objects.bulk_create(
+        [
+            GenerationJob(
+                user=user,
+                youtube_link=item.link,
+                status=GenerationJob.RUNNING,
+                stage="bulk",
+                started_at=started_at,
+            )
+            for item in items
+        ]
+    )
+    for item, job in zip(items, jobs):
+        item.job_id = job.pk
+
+    transaction.on_commit(
+        lambda: _get_executor().submit(run_bulk_in_thread, user, items, runner, slot)
+    )
+    return jobs
+
+
+def claim_job(job_id):
+    """Atomically move a job from queued to running, False if someone else has it"""
+    now = timezone.now()
+    claimed = GenerationJob.objects.filter(
+        pk=job_id, status=GenerationJob.QUEUED
+    ).update(
+        status=GenerationJob.RUNNING,
+        stage="starting",
+        started_at=now,
+        heartbeat_at=now,
+        attempts=F("attempts") + 1,
+    )
+    return claimed == 1
+
+
+@contextmanager
+def heartbeat(job_id, interval=None):
+    """
+    Touch the job's heartbeat_at every interval seconds while the block
+    runs, so reclaim_stale_jobs() tells a slow job from a dead worker.
+    """
+    if interval is None:
+        interval = getattr(settings, "GENERATION_JOB_HEARTBEAT_SECONDS", 30)
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                GenerationJob.objects.filter(
+                    pk=job_id, status=GenerationJob.RUNNING
+                ).update(heartbeat_at=timezone.now())
+        except Exception:
+            logger.exception("Heartbeat of generation job %s failed", job_id)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name="generation-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def reclaim_stale_jobs(stale_after=None, max_attempts=None):
+    """
+    Queue again the jobs left running by a worker that died.
+
+    A running job whose heartbeat stopped for more than stale_after
+    seconds goes back to queued, or fails once it was tried max_attempts
+    times, so a video that kills its worker isn't retried forever. Bulk
+    items are left alone, their task reports them and a second run would
+    create their posts twice. Returns (requeued, failed).
+    """
+    if stale_after is None:
+        stale_after = getattr(settings, "GENERATION_JOB_STALE_SECONDS", 300)
+    if max_attempts is None:
+        max_attempts = getattr(settings, "GENERATION_JOB_MAX_ATTEMPTS", 3)
+
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = GenerationJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff)
+        # claimed before jobs had a heartbeat
+        | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status=GenerationJob.RUNNING,
+    ).exclude(stage="bulk")
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=GenerationJob.FAILED,
+        stage=GenerationJob.FAILED,
+        error="The generation was interrupted, please try again",
+        finished_at=timezone.now(),
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(
+        status=GenerationJob.QUEUED, stage=GenerationJob.QUEUED, started_at=None
+    )
+    return requeued, failed
+
+
+def process_job(job_id, runner):
+    """Claim and run a single job, storing the outcome on the job row"""
+    if not claim_job(job_id):
+        return False
+
+    job = GenerationJob.objects.select_related("user").get(pk=job_id)
+
+    def progress(stage):
+        GenerationJob.objects.filter(pk=job_id).update(
+            stage=stage, heartbeat_at=timezone.now()
+        )
+
+    try:
+        with heartbeat(job_id):
+            blog_post = runner(job.user, job.youtube_link, progress)
+
+    except GenerationError as e:
+        _finish(job_id, GenerationJob.FAILED, error=str(e))
+
+    except Exception:
+        logger.exception("Error running generation job %s", job_id)
+        _finish(
+            job_id,
+            GenerationJob.FAILED,
+            error="Unexpected error while generating the blog post",
+        )
+
+    else:
+        _finish(job_id, GenerationJob.DONE, blog_post=blog_post)
+
+    finally:
+        # the in-flight slot the job was admitted with, see ratelimit.py
+        release_generation(job_id)
+
+    return True
+
+
+def run_job_in_thread(job_id, runner):
+    """Entry point for pool threads, they must not keep db connections around"""
+    try:
+        return process_job(job_id, runner)
+    finally:
+        connections.close_all()
+
+
+def run_bulk_in_thread(user, items, runner, slot=None):
+    """Entry point for a bulk task, stores the outcome of every item on its job"""
+
+    def on_item_done(item):
+        if item.blog_post is not None:
+            _finish(item.job_id, GenerationJob.DONE, blog_post=item.blog_post)
+        else:
+            _finish(item.job_id, GenerationJob.FAILED, error=item.error)
+
+    try:
+        runner(user, items, on_item_done)
+    except Exception:
+        logger.exception("Error running bulk generation")
+        GenerationJob.objects.filter(
+            pk__in=[item.job_id for item in items], status=GenerationJob.RUNNING
+        ).update(
+            status=GenerationJob.FAILED,
+            stage=GenerationJob.FAILED,
+            error="Unexpected error while generating the blog post",
+            finished_at=timezone.now(),
+        )
+    finally:
+        if slot is not None:
+            release_generation(slot)
+        connections.close_all()
+
+
+def _finish(job_id, status, error="", blog_post=None):
+    GenerationJob.objects.filter(pk=job_id).update(
+        status=status,
+        stage=status,
+        error=error,
+        blog_post=blog_post,
+        finished_at=timezone.now(),
+    )
@@ -0,0 +1,77 @@
+import json
+
+from django.conf import settings
+
+# models of OpenAIProvider / ClaudeProvider when LLM_PROVIDER_CONFIG names none
+OPENAI_MODEL = getattr(settings, "OPENAI_MODEL", "gpt-4o-mini")
+CLAUDE_MODEL = getattr(settings, "CLAUDE_MODEL", "claude-3-5-sonnet-20241022")
+MAX_TOKENS = getattr(settings, "LLM_MAX_TOKENS", 1000)
+
+SUMMARY_PROMPT = """
+        Based on the following transcript from a YouTube video, generate a summary.
+        Make sure the summary is well-structured, engaging, and informative:
+        \n\n{transcript}\n\n
+    """
+MERGE_PROMPT = """
+        The following are summaries of consecutive parts of the same YouTube video.
+        Merge them into a single summary, keep it well-structured, engaging, and informative:
+        \n\n{summaries}\n\n
+    """
+COMBINED_PROMPT = """
+        Based on the following transcript from a YouTube video, generate a summary
+        and a clear, concise video title (max 10 words) for it.
+        Make sure the summary is well-structured, engaging, and informative:
+        \n\n{transcript}\n\n
+    """
+TITLE_PROMPT = """
+        Based on this summary, create a clear, concise video title (max 10 words):
+        \n\n{summary}\n\n
+    """
+
+# derived formats, see derivations.py, the source is the summary unless noted
+TLDR_PROMPT = """
+        Based on this summary of a YouTube video, write a TL;DR of at most
+        three sentences:
+        \n\n{source}\n\n
+    """
+NOTES_PROMPT = """
+        Turn this summary of a YouTube video into concise bullet point notes,
+        one idea per bullet, grouped under short headings where it helps:
+        \n\n{source}\n\n
+    """
+# one chapter of the transcript, see chapters.py
+CHAPTER_PROMPT = """
+        The following is one chapter of a YouTube video transcript. Answer with
+        a short chapter title (max 8 words) on the first line, then summarize
+        the chapter in two or three sentences:
+        \n\n{transcript}\n\n
+    """
+
+# a title is at most 10 words, no need to reserve 1000 tokens for it
+TITLE_MAX_TOKENS = getattr(settings, "LLM_TITLE_MAX_TOKENS", 60)
+
+# structured output of the combined summary + title call
+BLOG_POST_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "summary": {"type": "string"},
+    },
+    "required": ["title", "summary"],
+    "additionalProperties": False,
+}
+
+
+def parse_blog_post(raw):
+    """Validate the combined call output, returns (title, summary) or raises ValueError"""
+    data = json.loads(raw) if isinstance(raw, str) else raw
+    if not isinstance(data, dict):
+        raise ValueError("Structured output is not an object")
+
+    title = data.get("title")
+    summary = data.get("summary")
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError("Structured output has no title")
+    if not isinstance(summary, str) or not summary.strip():
+        raise ValueError("Structured output has no summary")
+    return title.strip(), summary.strip()
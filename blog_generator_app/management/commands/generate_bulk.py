@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from blog_generator_app.bulk import collect_videos
+from blog_generator_app.video_urls import extract_video_id
+from blog_generator_app.views import run_bulk_blog_generation
+
+
+class Command(BaseCommand):
+    help = "Generate blog posts for a list of videos and/or playlists"
+
+    def add_arguments(self, parser):
+        parser.add_argument("links", nargs="*", help="Video or playlist links")
+        parser.add_argument(
+            "--file",
+            help="Read links from this file, one per line",
+        )
+        parser.add_argument(
+            "--user",
+            required=True,
+            help="Username the blog posts are saved for",
+        )
+        parser.add_argument(
+            "--transcript-workers",
+            type=int,
+            default=getattr(settings, "BULK_TRANSCRIPT_WORKERS", 8),
+            help="Number of transcripts fetched concurrently",
+        )
+        parser.add_argument(
+            "--llm-workers",
+            type=int,
+            default=getattr(settings, "BULK_LLM_WORKERS", 4),
+            help="Number of concurrent LLM generations",
+        )
+
+    def handle(self, *args, **options):
+        links = list(options["links"])
+        if options["file"]:
+            with open(options["file"]) as f:
+                links.extend(line.strip() for line in f if line.strip())
+        if not links:
+            raise CommandError("No links given")
+
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user {options['user']}")
+
+        try:
+            items, duplicates = collect_videos(links, extract_video_id)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if duplicates:
+            self.stdout.write(f"Skipping {len(duplicates)} duplicate link(s)")
+        self.stdout.write(f"Generating {len(items)} video(s)")
+
+        report = run_bulk_blog_generation(
+            user,
+            items,
+            transcript_workers=options["transcript_workers"],
+            llm_workers=options["llm_workers"],
+        )
+
+        for item in report["items"]:
+            line = f"{item['video_id']:<12} {item['status']:<8}"
+            if item["blog_post_id"]:
+                line += f" post {item['blog_post_id']}"
+            if item["error"]:
+                line += f" {item['error']}"
+            self.stdout.write(line)
+
+        self.stdout.write(
+            f"{report['created']} created, {report['failed']} failed "
+            f"in {report['elapsed_s']}s ({report['videos_per_minute']} videos/minute)"
+        )
@@ -0,0 +1,69 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog_generator_app.jobs import reclaim_stale_jobs, run_job_in_thread
+from blog_generator_app.models import GenerationJob
+from blog_generator_app.views import run_blog_generation
+
+
+class Command(BaseCommand):
+    help = "Run a pool of workers that drains queued blog generation jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=getattr(settings, "GENERATION_WORKERS", 4),
+            help="Number of jobs processed concurrently",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the current queue and exit",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        self.stdout.write(f"Generation worker started with {workers} threads")
+
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="generation"
+        ) as pool:
+            while True:
+                # jobs whose worker died while running them are queued again
+                requeued, failed = reclaim_stale_jobs()
+                if requeued or failed:
+                    self.stdout.write(
+                        f"Reclaimed {requeued} stale job(s), {failed} gave up"
+                    )
+
+                # only take as many jobs as we have threads, others stay queued
+                job_ids = list(
+                    GenerationJob.objects.filter(status=GenerationJob.QUEUED)
+                    .order_by("created_at")
+                    .values_list("id", flat=True)[:workers]
+                )
+
+                if job_ids:
+                    # jobs already claimed by another worker are skipped inside
+                    futures = [
+                        pool.submit(run_job_in_thread, job_id, run_blog_generation)
+                        for job_id in job_ids
+                    ]
+                    processed = sum(1 for f in futures if f.result())
+                    if processed:
+                        self.stdout.write(f"Processed {processed} job(s)")
+                    continue
+
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
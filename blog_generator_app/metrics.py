@@ -0,0 +1,214 @@
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# histogram buckets in seconds, from a cache lookup up to a long map-reduce
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# span attributes that are also exported as counters
+COUNTED_ATTRIBUTES = (
+    "input_tokens",
+    "output_tokens",
+    "input_chars",
+    "tokens_before",
+    "tokens_after",
+)
+
+
+class Span:
+    """Timing of one pipeline stage plus whatever we learned while in it"""
+
+    def __init__(self, stage, attributes):
+        self.stage = stage
+        self.attributes = dict(attributes)
+        self.outcome = "ok"
+        self.seconds = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def as_dict(self):
+        return {
+            "stage": self.stage,
+            "ms": round(self.seconds * 1000, 1),
+            "outcome": self.outcome,
+            **self.attributes,
+        }
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        if index < len(BUCKETS):
+            self.counts[index] += 1
+        self.total += 1
+        self.sum += seconds
+
+
+class MetricsRegistry:
+    """
+    In-process stage histograms, counters and a rolling window of durations.
+
+    Every gunicorn worker has its own registry, the metrics endpoint shows
+    the worker that answered it.
+    """
+
+    def __init__(self, window_seconds=300.0, window_size=10_000):
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._histograms = defaultdict(Histogram)  # (stage, outcome) -> histogram
+        self._counters = defaultdict(float)  # (name, stage, label) -> value
+        self._recent = defaultdict(lambda: deque(maxlen=window_size))
+
+    def record(self, span):
+        now = time.monotonic()
+        with self._lock:
+            self._histograms[(span.stage, span.outcome)].observe(span.seconds)
+            self._recent[span.stage].append((now, span.seconds))
+
+            for name in COUNTED_ATTRIBUTES:
+                if isinstance(span.attributes.get(name), (int, float)):
+                    self._counters[(name, span.stage, "")] += span.attributes[name]
+            if "cache_hit" in span.attributes:
+                result = "hit" if span.attributes["cache_hit"] else "miss"
+                self._counters[("cache_lookups", span.stage, result)] += 1
+
+    def percentiles(self):
+        """p50/p95/p99 in ms per stage over the rolling window"""
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            windows = {
+                stage: sorted(seconds for at, seconds in recent if at >= cutoff)
+                for stage, recent in self._recent.items()
+            }
+
+        def nearest_rank(values, percent):
+            index = max(int(len(values) * percent / 100 + 0.5) - 1, 0)
+            return round(values[min(index, len(values) - 1)] * 1000, 1)
+
+        return {
+            stage: {
+                "count": len(values),
+                "p50_ms": nearest_rank(values, 50),
+                "p95_ms": nearest_rank(values, 95),
+                "p99_ms": nearest_rank(values, 99),
+            }
+            for stage, values in windows.items()
+            if values
+        }
+
+    def prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP blog_generation_stage_seconds Duration of blog generation stages",
+            "# TYPE blog_generation_stage_seconds histogram",
+        ]
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        for (stage, outcome), histogram in histograms:
+            labels = f'stage="{stage}",outcome="{outcome}"'
+            cumulative = 0
+            for bucket, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(
+                    f'blog_generation_stage_seconds_bucket{{{labels},le="{bucket}"}}'
+                    f" {cumulative}"
+                )
+            lines.append(
+                f'blog_generation_stage_seconds_bucket{{{labels},le="+Inf"}}'
+                f" {histogram.total}"
+            )
+            lines.append(
+                f"blog_generation_stage_seconds_sum{{{labels}}} {histogram.sum}"
+            )
+            lines.append(
+                f"blog_generation_stage_seconds_count{{{labels}}} {histogram.total}"
+            )
+
+        declared = set()
+        for (name, stage, label), value in counters:
+            metric = f"blog_generation_{name}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            labels = f'stage="{stage}"' + (f',result="{label}"' if label else "")
+            lines.append(f"{metric}{{{labels}}} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry(
+    window_seconds=getattr(settings, "METRICS_WINDOW_SECONDS", 300.0)
+)
+
+# spans finished in the current request or job, see trace()
+_current_spans = contextvars.ContextVar("current_spans", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(stage, **attributes):
+    """Time a pipeline stage, the span can be given more attributes while open"""
+    current = Span(stage, attributes)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.outcome = "error"
+        raise
+    finally:
+        current.seconds = time.perf_counter() - started
+        _current_span.reset(token)
+        registry.record(current)
+        spans = _current_spans.get()
+        if spans is not None:
+            spans.append(current)
+
+
+def current_span():
+    """The innermost open span, or a detached one when nothing is being traced"""
+    return _current_span.get() or Span("detached", {})
+
+
+@contextmanager
+def trace(name, **attributes):
+    """
+    Collect the spans of one generation and log them as a single json line.
+
+    The whole trace is also recorded as a span named after it.
+    """
+    spans = []
+    token = _current_spans.set(spans)
+    try:
+        with span(name, **attributes) as total:
+            yield total
+    finally:
+        _current_spans.reset(token)
+        logger.info(
+            json.dumps(
+                {
+                    "trace": name,
+                    "total_ms": round(total.seconds * 1000, 1),
+                    "outcome": total.outcome,
+                    **total.attributes,
+                    "spans": [s.as_dict() for s in spans if s is not total],
+                },
+                default=str,
+            )
+        )
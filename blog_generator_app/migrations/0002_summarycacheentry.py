@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('video_id', models.CharField(db_index=True, max_length=64)),
+                ('language', models.CharField(max_length=32)),
+                ('provider', models.CharField(max_length=32)),
+                ('model', models.CharField(max_length=100)),
+                ('prompt_version', models.CharField(max_length=32)),
+                ('transcript', models.TextField()),
+                ('summary', models.TextField()),
+                ('title', models.CharField(max_length=300)),
+                ('created_at', models.DateTimeField()),
+                ('last_accessed', models.DateTimeField(db_index=True)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
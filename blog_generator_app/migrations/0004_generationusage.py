@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog_generator_app", "0003_generationjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GenerationUsage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("video_id", models.CharField(max_length=64)),
+                ("provider", models.CharField(max_length=32)),
+                ("model", models.CharField(max_length=100)),
+                (
+                    "mode",
+                    models.CharField(
+                        choices=[
+                            ("combined", "Combined"),
+                            ("two_call", "Two calls"),
+                            ("fallback", "Fallback to two calls"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                ("input_tokens", models.PositiveIntegerField(default=0)),
+                ("output_tokens", models.PositiveIntegerField(default=0)),
+                ("latency_ms", models.PositiveIntegerField(default=0)),
+                (
+                    "title_latency_ms",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                ("saved_tokens", models.PositiveIntegerField(default=0)),
+                ("saved_ms", models.PositiveIntegerField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
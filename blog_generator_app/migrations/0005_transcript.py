@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog_generator_app", "0004_generationusage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Transcript",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("video_id", models.CharField(max_length=64)),
+                ("language", models.CharField(max_length=16)),
+                ("is_generated", models.BooleanField(default=False)),
+                ("text", models.TextField()),
+                ("segments", models.BinaryField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("video_id", "language"), name="unique_video_transcript"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:51
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def fill_excerpts(apps, schema_editor):
+    BlogPost = apps.get_model("blog_generator_app", "BlogPost")
+    batch = []
+    for post in BlogPost.objects.only("id", "generated_content").iterator(2000):
+        post.excerpt = Truncator(post.generated_content).words(30)
+        batch.append(post)
+        if len(batch) >= 2000:
+            BlogPost.objects.bulk_update(batch, ["excerpt"])
+            batch = []
+    BlogPost.objects.bulk_update(batch, ["excerpt"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog_generator_app", "0005_transcript"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="blogpost",
+            name="excerpt",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="blogpost",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="blogpost_user_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:01
+
+from django.db import migrations
+
+# existing posts are indexed on title and content, their transcripts are
+# added the next time the post is saved
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "ALTER TABLE blog_generator_app_blogpost ADD COLUMN search_vector tsvector"
+        )
+        schema_editor.execute(
+            "CREATE INDEX blogpost_search_vector_idx "
+            "ON blog_generator_app_blogpost USING gin (search_vector)"
+        )
+        schema_editor.execute("""
+            UPDATE blog_generator_app_blogpost SET search_vector =
+                setweight(to_tsvector('english', youtube_title), 'A')
+                || setweight(to_tsvector('english', generated_content), 'B')
+            """)
+    elif vendor == "sqlite":
+        schema_editor.execute("""
+            CREATE VIRTUAL TABLE blog_generator_app_blogpost_fts USING fts5(
+                youtube_title, generated_content, transcript,
+                tokenize = 'porter unicode61'
+            )
+            """)
+        schema_editor.execute("""
+            INSERT INTO blog_generator_app_blogpost_fts
+                (rowid, youtube_title, generated_content, transcript)
+            SELECT id, youtube_title, generated_content, ''
+            FROM blog_generator_app_blogpost
+            """)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "ALTER TABLE blog_generator_app_blogpost DROP COLUMN search_vector"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute("DROP TABLE blog_generator_app_blogpost_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog_generator_app", "0006_blogpost_excerpt"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog_generator_app", "0007_blogpost_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VideoMetadata",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("video_id", models.CharField(max_length=64, unique=True)),
+                ("title", models.CharField(blank=True, max_length=300)),
+                (
+                    "duration_seconds",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                ("available", models.BooleanField(default=True)),
+                ("caption_languages", models.JSONField(default=list)),
+                ("automatic_caption_languages", models.JSONField(default=list)),
+                ("no_transcript_until", models.DateTimeField(blank=True, null=True)),
+                ("checked_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="generationusage",
+            name="mode",
+            field=models.CharField(
+                choices=[
+                    ("combined", "Combined"),
+                    ("two_call", "Two calls"),
+                    ("fallback", "Fallback to two calls"),
+                    ("known_title", "Summary only, video title"),
+                ],
+                max_length=16,
+            ),
+        ),
+    ]
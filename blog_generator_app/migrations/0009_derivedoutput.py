@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog_generator_app", "0008_videometadata"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="generationusage",
+            name="mode",
+            field=models.CharField(
+                choices=[
+                    ("combined", "Combined"),
+                    ("two_call", "Two calls"),
+                    ("fallback", "Fallback to two calls"),
+                    ("known_title", "Summary only, video title"),
+                    ("derived", "Derived format"),
+                ],
+                max_length=16,
+            ),
+        ),
+        migrations.CreateModel(
+            name="DerivedOutput",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("video_id", models.CharField(max_length=64)),
+                ("format", models.CharField(max_length=32)),
+                ("prompt_version", models.CharField(max_length=32)),
+                ("source_hash", models.CharField(max_length=64)),
+                ("provider", models.CharField(max_length=32)),
+                ("model", models.CharField(max_length=100)),
+                ("content", models.TextField()),
+                ("created_at", models.DateTimeField()),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("video_id", "format"), name="unique_video_format"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog_generator_app", "0009_derivedoutput"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="generationjob",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
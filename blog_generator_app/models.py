@@ -1,5 +1,15 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils.text import Truncator
+
+# words kept in BlogPost.excerpt, same as the old truncatewords:30 in the list
+EXCERPT_WORDS = 30
+
+
+def make_excerpt(content):
+    return Truncator(content).words(EXCERPT_WORDS)
 
 
 # Create your models here.
@@ -10,7 +20,172 @@ class BlogPost(models.Model):
     youtube_title = models.CharField(max_length=300)
     youtube_link = models.URLField()
     generated_content = models.TextField()  # -> textfield for large text
+    # precomputed so the blog list never has to read generated_content
+    excerpt = models.TextField(blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # the blog list pages through a user's posts newest first
+            models.Index(
+                fields=["user", "-created_at", "-id"], name="blogpost_user_created_idx"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # bulk_create skips save(), callers there fill excerpt themselves
+        self.excerpt = make_excerpt(self.generated_content)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.user.username + " - " + self.youtube_title
+
+
+class SummaryCacheEntry(models.Model):
+    # sha256 of video id, language, provider, model and prompt version
+    key = models.CharField(max_length=64, unique=True)
+    video_id = models.CharField(max_length=64, db_index=True)
+    language = models.CharField(max_length=32)
+    provider = models.CharField(max_length=32)
+    model = models.CharField(max_length=100)
+    prompt_version = models.CharField(max_length=32)
+    transcript = models.TextField()
+    summary = models.TextField()
+    title = models.CharField(max_length=300)
+    created_at = models.DateTimeField()
+    last_accessed = models.DateTimeField(db_index=True)
+    hit_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.video_id + " - " + self.provider + "/" + self.model
+
+
+class GenerationJob(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    # uuid so other users can't guess job ids
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    youtube_link = models.URLField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    stage = models.CharField(max_length=32, default=QUEUED)  # finer grained progress
+    error = models.TextField(blank=True)
+    blog_post = models.ForeignKey(
+        BlogPost, null=True, blank=True, on_delete=models.SET_NULL
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # times the job was claimed, a job whose worker died is retried a few times
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # touched by the worker while it runs the job, see reclaim_stale_jobs()
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # workers poll for the oldest queued jobs
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return self.user.username + " - " + self.youtube_link + " (" + self.status + ")"
+
+
+class GenerationUsage(models.Model):
+    # one row per LLM generation, used to compare the combined and two-call modes
+    COMBINED = "combined"
+    TWO_CALL = "two_call"
+    FALLBACK = "fallback"  # combined call failed validation, two-call was used
+    KNOWN_TITLE = "known_title"  # the video title was known, only a summary call
+    DERIVED = "derived"  # a format derived from the summary, see derivations.py
+    MODE_CHOICES = [
+        (COMBINED, "Combined"),
+        (TWO_CALL, "Two calls"),
+        (FALLBACK, "Fallback to two calls"),
+        (KNOWN_TITLE, "Summary only, video title"),
+        (DERIVED, "Derived format"),
+    ]
+
+    video_id = models.CharField(max_length=64)
+    provider = models.CharField(max_length=32)
+    model = models.CharField(max_length=100)
+    mode = models.CharField(max_length=16, choices=MODE_CHOICES)
+    input_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    title_latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    # estimated savings of the combined call compared to the two-call path
+    saved_tokens = models.PositiveIntegerField(default=0)
+    saved_ms = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.video_id + " - " + self.mode
+
+
+class Transcript(models.Model):
+    # written once per video and language, reused by every later generation
+    video_id = models.CharField(max_length=64)
+    language = models.CharField(max_length=16)
+    is_generated = models.BooleanField(default=False)  # youtube auto-captions
+    # all snippets joined by a space, segments point into it by offset
+    text = models.TextField()
+    # packed (start, duration, offset) arrays, see transcripts.py
+    segments = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["video_id", "language"], name="unique_video_transcript"
+            )
+        ]
+
+    def __str__(self):
+        return self.video_id + " (" + self.language + ")"
+
+
+class VideoMetadata(models.Model):
+    # what yt-dlp knows about a video, refreshed lazily (see video_metadata.py)
+    video_id = models.CharField(max_length=64, unique=True)
+    title = models.CharField(max_length=300, blank=True)
+    duration_seconds = models.PositiveIntegerField(null=True, blank=True)
+    available = models.BooleanField(default=True)  # private, removed...
+    caption_languages = models.JSONField(default=list)
+    automatic_caption_languages = models.JSONField(default=list)
+    # no source had a transcript, don't try again before then
+    no_transcript_until = models.DateTimeField(null=True, blank=True)
+    checked_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.video_id + " - " + self.title
+
+
+class DerivedOutput(models.Model):
+    # tl;dr, notes... of a video, generated from its summary or transcript
+    video_id = models.CharField(max_length=64)
+    format = models.CharField(max_length=32)
+    prompt_version = models.CharField(max_length=32)
+    # sha256 of the text it was generated from, a new summary makes it stale
+    source_hash = models.CharField(max_length=64)
+    provider = models.CharField(max_length=32)
+    model = models.CharField(max_length=100)
+    content = models.TextField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["video_id", "format"], name="unique_video_format"
+            )
+        ]
+
+    def __str__(self):
+        return self.video_id + " (" + self.format + ")"
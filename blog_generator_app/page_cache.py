@@ -0,0 +1,100 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import BlogPost
+
+
+def get_page_cache():
+    """Cache holding rendered pages, see PAGE_CACHE_BACKEND in settings"""
+    return caches[getattr(settings, "PAGE_CACHE_ALIAS", "pages")]
+
+
+def list_version(user_id):
+    """
+    Generation number of a user's blog list pages.
+
+    Cache backends can't delete keys by prefix, so every write bumps the
+    number instead and the old pages are never read again.
+    """
+    return get_page_cache().get_or_set(
+        f"blog-list-version:{user_id}", _new_version, None
+    )
+
+
+def _new_version():
+    # a version key lost to eviction must not come back as an old number
+    return int(time.time() * 1000)
+
+
+def list_page_key(user_id, cursor):
+    return f"blog-list:{user_id}:{list_version(user_id)}:{cursor or 'first'}"
+
+
+def detail_page_key(user_id, post_id):
+    return f"blog-detail:{user_id}:{post_id}"
+
+
+def cached_page(request, key, build):
+    """
+    Serve a rendered page from the page cache, answering 304 when it can.
+
+    build() renders the html on a miss. It can return an HttpResponse
+    instead (redirect, not found...), which is sent as is and not cached.
+    """
+    cache = get_page_cache()
+    entry = cache.get(key)
+
+    if entry is None:
+        html = build()
+        if isinstance(html, HttpResponse):
+            return html
+        entry = {
+            "html": html,
+            "etag": quote_etag(hashlib.md5(html.encode()).hexdigest()),
+            "last_modified": int(time.time()),
+        }
+        cache.set(key, entry)
+
+    response = HttpResponse(entry["html"])
+    response["ETag"] = entry["etag"]
+    response["Last-Modified"] = http_date(entry["last_modified"])
+    # pages are per user, browsers may keep them but must revalidate
+    response["Cache-Control"] = "private, no-cache"
+    patch_vary_headers(response, ["Cookie"])
+
+    return get_conditional_response(
+        request,
+        etag=entry["etag"],
+        last_modified=entry["last_modified"],
+        response=response,
+    )
+
+
+def invalidate_post(post):
+    """Drop the cached detail page of a post and the list pages of its owner"""
+    cache = get_page_cache()
+    cache.delete(detail_page_key(post.user_id, post.id))
+
+    version_key = f"blog-list-version:{post.user_id}"
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, _new_version(), None)
+
+
+@receiver(post_save, sender=BlogPost)
+def _invalidate_saved_post(sender, instance, **kwargs):
+    invalidate_post(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def _invalidate_deleted_post(sender, instance, **kwargs):
+    invalidate_post(instance)
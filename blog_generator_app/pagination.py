@@ -0,0 +1,46 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(post):
+    """Opaque cursor pointing just after a post in newest first order"""
+    raw = f"{post.created_at.isoformat()}|{post.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor, None when it's missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, post_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(post_id)
+    except ValueError:
+        return None
+
+
+def keyset_page(queryset, cursor, page_size):
+    """
+    One page of posts, newest first, and the cursor of the next page.
+
+    Seeks on (created_at, id) instead of using OFFSET, so every page is a
+    range scan of the (user, -created_at, -id) index however deep it is.
+    """
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, post_id = position
+        # the plain range on created_at lets the planner seek the index, the
+        # OR on its own makes SQLite scan from the newest post
+        queryset = queryset.filter(created_at__lte=created_at).filter(
+            Q(created_at__lt=created_at) | Q(id__lt=post_id)
+        )
+
+    # one extra row tells us whether there is a next page
+    posts = list(queryset.order_by("-created_at", "-id")[: page_size + 1])
+    if len(posts) > page_size:
+        posts = posts[:page_size]
+        return posts, encode_cursor(posts[-1])
+    return posts, None
@@ -0,0 +1,619 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .clients import (
+    get_async_claude_client,
+    get_async_openai_client,
+    get_claude_client,
+    get_openai_client,
+)
+from .llm import (
+    BLOG_POST_SCHEMA,
+    CLAUDE_MODEL,
+    COMBINED_PROMPT,
+    MAX_TOKENS,
+    MERGE_PROMPT,
+    OPENAI_MODEL,
+    SUMMARY_PROMPT,
+    TITLE_MAX_TOKENS,
+    TITLE_PROMPT,
+)
+from .metrics import current_span
+from .ratelimit import HeldSlots, upstream_limiter
+from .transcript_sources import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderError(Exception):
+    """Raised when no provider could answer a call"""
+
+
+def format_partial_summaries(partial_summaries):
+    """Number the partial summaries so the merge keeps the video order"""
+    return "\n\n".join(
+        f"Part {i}:\n{summary}" for i, summary in enumerate(partial_summaries, 1)
+    )
+
+
+class LLMProvider:
+    """
+    One provider/model the pipeline can send its prompts to.
+
+    Subclasses implement complete() and blog_post(), and their async
+    versions acomplete() and ablog_post(), the prompts are the same
+    whatever the provider.
+    """
+
+    provider = None
+
+    def __init__(
+        self,
+        model,
+        max_tokens=MAX_TOKENS,
+        title_max_tokens=TITLE_MAX_TOKENS,
+        timeout=60.0,
+    ):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.title_max_tokens = title_max_tokens
+        self.timeout = timeout
+        self.name = f"{self.provider}:{model}"
+
+    def complete(self, prompt, max_tokens):
+        raise NotImplementedError
+
+    def blog_post(self, transcript):
+        """Combined summary + title call, returns (raw, input_tokens, output_tokens)"""
+        raise NotImplementedError
+
+    def summary(self, transcript):
+        return self.complete(
+            SUMMARY_PROMPT.format(transcript=transcript), self.max_tokens
+        )
+
+    def merge(self, partial_summaries):
+        prompt = MERGE_PROMPT.format(
+            summaries=format_partial_summaries(partial_summaries)
+        )
+        return self.complete(prompt, self.max_tokens)
+
+    def title(self, summary):
+        return self.complete(
+            TITLE_PROMPT.format(summary=summary), self.title_max_tokens
+        )
+
+    # streaming versions of the text operations, see LLMRouter.stream()
+
+    def stream(self, prompt, max_tokens):
+        """Yield the completion text as it is generated"""
+        raise NotImplementedError
+
+    def summary_stream(self, transcript):
+        return self.stream(
+            SUMMARY_PROMPT.format(transcript=transcript), self.max_tokens
+        )
+
+    def merge_stream(self, partial_summaries):
+        prompt = MERGE_PROMPT.format(
+            summaries=format_partial_summaries(partial_summaries)
+        )
+        return self.stream(prompt, self.max_tokens)
+
+    def title_stream(self, summary):
+        return self.stream(TITLE_PROMPT.format(summary=summary), self.title_max_tokens)
+
+    # async versions of the operations, see LLMRouter.acall()
+
+    async def acomplete(self, prompt, max_tokens):
+        raise NotImplementedError
+
+    async def ablog_post(self, transcript):
+        raise NotImplementedError
+
+    async def asummary(self, transcript):
+        return await self.acomplete(
+            SUMMARY_PROMPT.format(transcript=transcript), self.max_tokens
+        )
+
+    async def amerge(self, partial_summaries):
+        prompt = MERGE_PROMPT.format(
+            summaries=format_partial_summaries(partial_summaries)
+        )
+        return await self.acomplete(prompt, self.max_tokens)
+
+    async def atitle(self, summary):
+        return await self.acomplete(
+            TITLE_PROMPT.format(summary=summary), self.title_max_tokens
+        )
+
+
+class OpenAIProvider(LLMProvider):
+    provider = "openai"
+
+    def __init__(self, model=OPENAI_MODEL, **kwargs):
+        super().__init__(model, **kwargs)
+
+    def _completion(self, prompt, max_tokens):
+        """Arguments of a plain completion, for the sync and the async client"""
+        return {
+            "model": self.model,
+            "timeout": self.timeout,
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+
+    def _blog_post(self, transcript):
+        return {
+            **self._completion(
+                COMBINED_PROMPT.format(transcript=transcript),
+                self.max_tokens + self.title_max_tokens,
+            ),
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "blog_post",
+                    "strict": True,
+                    "schema": BLOG_POST_SCHEMA,
+                },
+            },
+        }
+
+    @staticmethod
+    def _blog_post_result(response):
+        return (
+            response.choices[0].message.content,
+            response.usage.prompt_tokens,
+            response.usage.completion_tokens,
+        )
+
+    def complete(self, prompt, max_tokens):
+        with upstream_limiter(self.provider).slot():
+            response = get_openai_client().chat.completions.create(
+                **self._completion(prompt, max_tokens)
+            )
+        return response.choices[0].message.content
+
+    def stream(self, prompt, max_tokens):
+        with upstream_limiter(self.provider).slot():
+            response = get_openai_client().chat.completions.create(
+                **self._completion(prompt, max_tokens), stream=True
+            )
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    def blog_post(self, transcript):
+        with upstream_limiter(self.provider).slot():
+            response = get_openai_client().chat.completions.create(
+                **self._blog_post(transcript)
+            )
+        return self._blog_post_result(response)
+
+    async def acomplete(self, prompt, max_tokens):
+        async with upstream_limiter(self.provider).aslot():
+            response = await get_async_openai_client().chat.completions.create(
+                **self._completion(prompt, max_tokens)
+            )
+        return response.choices[0].message.content
+
+    async def ablog_post(self, transcript):
+        async with upstream_limiter(self.provider).aslot():
+            response = await get_async_openai_client().chat.completions.create(
+                **self._blog_post(transcript)
+            )
+        return self._blog_post_result(response)
+
+
+class ClaudeProvider(LLMProvider):
+    provider = "claude"
+
+    def __init__(self, model=CLAUDE_MODEL, **kwargs):
+        super().__init__(model, **kwargs)
+
+    def _message(self, prompt, max_tokens):
+        """Arguments of a plain message, for the sync and the async client"""
+        return {
+            "model": self.model,
+            "timeout": self.timeout,
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+
+    def _blog_post(self, transcript):
+        # forcing the tool call makes claude answer with json matching the schema
+        return {
+            **self._message(
+                COMBINED_PROMPT.format(transcript=transcript),
+                self.max_tokens + self.title_max_tokens,
+            ),
+            "tools": [
+                {
+                    "name": "save_blog_post",
+                    "description": "Save the summary and title of the video",
+                    "input_schema": BLOG_POST_SCHEMA,
+                }
+            ],
+            "tool_choice": {"type": "tool", "name": "save_blog_post"},
+        }
+
+    @staticmethod
+    def _blog_post_result(response):
+        tool_input = next(
+            block.input for block in response.content if block.type == "tool_use"
+        )
+        return (
+            tool_input,
+            response.usage.input_tokens,
+            response.usage.output_tokens,
+        )
+
+    def complete(self, prompt, max_tokens):
+        with upstream_limiter(self.provider).slot():
+            response = get_claude_client().messages.create(
+                **self._message(prompt, max_tokens)
+            )
+        return response.content[0].text  # type: ignore
+
+    def stream(self, prompt, max_tokens):
+        with upstream_limiter(
+            self.provider
+        ).slot(), get_claude_client().messages.stream(
+            **self._message(prompt, max_tokens)
+        ) as stream:
+            yield from stream.text_stream
+
+    def blog_post(self, transcript):
+        with upstream_limiter(self.provider).slot():
+            response = get_claude_client().messages.create(
+                **self._blog_post(transcript)
+            )
+        return self._blog_post_result(response)
+
+    async def acomplete(self, prompt, max_tokens):
+        async with upstream_limiter(self.provider).aslot():
+            response = await get_async_claude_client().messages.create(
+                **self._message(prompt, max_tokens)
+            )
+        return response.content[0].text  # type: ignore
+
+    async def ablog_post(self, transcript):
+        async with upstream_limiter(self.provider).aslot():
+            response = await get_async_claude_client().messages.create(
+                **self._blog_post(transcript)
+            )
+        return self._blog_post_result(response)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class ProviderHealth:
+    """Rolling latencies per operation, error rate and breaker of a provider"""
+
+    def __init__(self, breaker=None, window_seconds=300.0, window_size=200):
+        self.breaker = breaker or CircuitBreaker()
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(lambda: deque(maxlen=window_size))
+        self._outcomes = deque(maxlen=window_size)  # (at, succeeded)
+
+    def record_success(self, operation, seconds):
+        now = time.monotonic()
+        with self._lock:
+            self._latencies[operation].append((now, seconds))
+            self._outcomes.append((now, True))
+        self.breaker.record_success()
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append((time.monotonic(), False))
+        self.breaker.record_failure()
+
+    def percentile(self, operation, percent):
+        """Latency percentile in seconds over the window, None without samples"""
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            recent = self._latencies.get(operation, ())
+            values = sorted(s for at, s in recent if at >= cutoff)
+        if not values:
+            return None
+        index = max(int(len(values) * percent / 100 + 0.5) - 1, 0)
+        return values[min(index, len(values) - 1)]
+
+    def as_dict(self):
+        with self._lock:
+            operations = list(self._latencies)
+        return {
+            "breaker": self.breaker.state,
+            "error_rate": round(self.error_rate(), 3),
+            "operations": {
+                operation: {
+                    "p50_ms": _ms(self.percentile(operation, 50)),
+                    "p95_ms": _ms(self.percentile(operation, 95)),
+                }
+                for operation in operations
+            },
+        }
+
+    def error_rate(self):
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            outcomes = [ok for at, ok in self._outcomes if at >= cutoff]
+        if not outcomes:
+            return 0.0
+        return outcomes.count(False) / len(outcomes)
+
+
+class LLMRouter:
+    """
+    Sends each call to the fastest healthy provider and fails over.
+
+    Providers are ranked by their recent p50 latency for the operation
+    (one without samples yet is tried first so it gets some), the ones
+    with an open breaker or an error rate over max_error_rate go last.
+    Errors and timeouts move the call to the next provider. With hedge
+    set, a call still running after the provider's p95 is also sent to
+    the next provider and the first answer wins, like TranscriptResolver
+    does for transcripts.
+    """
+
+    def __init__(self, providers, hedge=False, max_error_rate=0.5, max_workers=32):
+        self.providers = providers
+        self.hedge = hedge
+        self.max_error_rate = max_error_rate
+        self.health = {
+            provider.name: ProviderHealth(
+                CircuitBreaker(
+                    failure_threshold=getattr(settings, "LLM_BREAKER_THRESHOLD", 3),
+                    reset_timeout=getattr(settings, "LLM_BREAKER_RESET", 60.0),
+                )
+            )
+            for provider in providers
+        }
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="llm"
+        )
+
+    @property
+    def key(self):
+        """Identifies the configured providers, for summary cache keys"""
+        return "+".join(provider.name for provider in self.providers)
+
+    def ranked(self, operation):
+        def rank(indexed):
+            index, provider = indexed
+            health = self.health[provider.name]
+            unhealthy = (
+                health.breaker.state == CircuitBreaker.OPEN
+                or health.error_rate() > self.max_error_rate
+            )
+            return (unhealthy, health.percentile(operation, 50) or 0.0, index)
+
+        return [provider for _, provider in sorted(enumerate(self.providers), key=rank)]
+
+    def _next_deadline(self, operation, pending, queue):
+        """
+        Seconds until a pending call times out or is due to be hedged, and
+        when the hedge is due (None without one). pending maps each call
+        to its (provider, started_at).
+        """
+        deadlines = [
+            started + provider.timeout for provider, started in pending.values()
+        ]
+        hedge_at = None
+        if self.hedge and queue and len(pending) == 1:
+            provider, started = next(iter(pending.values()))
+            p95 = self.health[provider.name].percentile(operation, 95)
+            if p95 is not None:
+                hedge_at = started + p95
+                deadlines.append(hedge_at)
+        return max(min(deadlines) - time.monotonic(), 0), hedge_at
+
+    def call(self, operation, *args):
+        """provider.<operation>(*args) on the best provider, returns (result, provider)"""
+        queue = self.ranked(operation)
+        pending = {}  # future -> (provider, started_at)
+        held = {}  # future -> the upstream slots of the call, see HeldSlots
+        error = None
+
+        def start_next():
+            # providers with an open breaker are skipped without being called
+            while queue:
+                provider = queue.pop(0)
+                if self.health[provider.name].breaker.allow():
+                    slots = HeldSlots()
+                    future = self._executor.submit(
+                        slots.run, getattr(provider, operation), *args
+                    )
+                    pending[future] = (provider, time.monotonic())
+                    held[future] = slots
+                    return True
+            return False
+
+        def give_up(future):
+            # the call goes on in its thread until the sdk times it out, its
+            # slot goes back now so the calls we still wait for get it
+            del pending[future]
+            future.cancel()
+            held.pop(future).abandon()
+
+        if not start_next():
+            raise ProviderError("No LLM provider is available")
+
+        while pending:
+            timeout, hedge_at = self._next_deadline(operation, pending, queue)
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                provider, started = pending.pop(future)
+                del held[future]
+                health = self.health[provider.name]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.exception("LLM provider %s failed", provider.name)
+                    health.record_failure()
+                    error = e
+                    continue
+                health.record_success(operation, time.monotonic() - started)
+                # a losing hedged call finishes in the background, ignored
+                for other in list(pending):
+                    give_up(other)
+                current_span().set(provider=provider.name)
+                return result, provider
+
+            now = time.monotonic()
+            for future, (provider, started) in list(pending.items()):
+                if now - started >= provider.timeout:
+                    logger.warning("LLM provider %s timed out", provider.name)
+                    self.health[provider.name].record_failure()
+                    give_up(future)
+
+            if not pending:
+                start_next()
+            elif hedge_at is not None and now >= hedge_at:
+                current_span().set(hedged=True)
+                start_next()
+
+        raise ProviderError("Every LLM provider failed") from error
+
+    async def acall(self, operation, *args):
+        """
+        call() for the async pipeline, awaits provider.a<operation>(*args).
+
+        The calls run as tasks on the event loop rather than on the
+        router's threads. A call given up on (timeout, losing hedged call)
+        is cancelled, which frees its upstream slot and http connection.
+        """
+        queue = self.ranked(operation)
+        pending = {}  # task -> (provider, started_at)
+        error = None
+
+        def start_next():
+            # providers with an open breaker are skipped without being called
+            while queue:
+                provider = queue.pop(0)
+                if self.health[provider.name].breaker.allow():
+                    task = asyncio.ensure_future(
+                        getattr(provider, f"a{operation}")(*args)
+                    )
+                    pending[task] = (provider, time.monotonic())
+                    return True
+            return False
+
+        if not start_next():
+            raise ProviderError("No LLM provider is available")
+
+        try:
+            while pending:
+                timeout, hedge_at = self._next_deadline(operation, pending, queue)
+                done, _ = await asyncio.wait(
+                    list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    provider, started = pending.pop(task)
+                    health = self.health[provider.name]
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.exception("LLM provider %s failed", provider.name)
+                        health.record_failure()
+                        error = e
+                        continue
+                    health.record_success(operation, time.monotonic() - started)
+                    current_span().set(provider=provider.name)
+                    return result, provider
+
+                now = time.monotonic()
+                for task, (provider, started) in list(pending.items()):
+                    if now - started >= provider.timeout:
+                        logger.warning("LLM provider %s timed out", provider.name)
+                        self.health[provider.name].record_failure()
+                        del pending[task]
+                        task.cancel()
+
+                if not pending:
+                    start_next()
+                elif hedge_at is not None and now >= hedge_at:
+                    current_span().set(hedged=True)
+                    start_next()
+        finally:
+            # a losing hedged call, or every call when we are cancelled
+            for task in pending:
+                task.cancel()
+
+        raise ProviderError("Every LLM provider failed") from error
+
+    def stream(self, operation, on_text, *args):
+        """
+        provider.<operation>_stream(*args) on the best provider, on_text(text)
+        gets every piece of the answer as it arrives. Returns (result,
+        provider) like call().
+
+        A provider failing before it sent anything fails over to the next
+        one. Once text went out the error is raised, the caller can't take
+        it back. Streams are never hedged.
+        """
+        error = None
+        for provider in self.ranked(operation):
+            health = self.health[provider.name]
+            if not health.breaker.allow():
+                continue
+
+            started = time.monotonic()
+            parts = []
+            try:
+                for text in getattr(provider, f"{operation}_stream")(*args):
+                    parts.append(text)
+                    on_text(text)
+            except Exception as e:
+                logger.exception("LLM provider %s failed", provider.name)
+                health.record_failure()
+                if parts:
+                    raise ProviderError("LLM stream broke off") from e
+                error = e
+                continue
+
+            health.record_success(operation, time.monotonic() - started)
+            current_span().set(provider=provider.name)
+            return "".join(parts), provider
+
+        if error is None:
+            raise ProviderError("No LLM provider is available")
+        raise ProviderError("Every LLM provider failed") from error
+
+    def stats(self):
+        """Breaker, error rate and latency of every provider, for latency-stats"""
+        return {
+            provider.name: self.health[provider.name].as_dict()
+            for provider in self.providers
+        }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_llm_router():
+    """Process-wide router over the providers named in settings.LLM_PROVIDERS"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            configs = getattr(settings, "LLM_PROVIDER_CONFIG", {})
+            providers = []
+            for name in getattr(settings, "LLM_PROVIDERS", ["openai"]):
+                config = dict(configs[name])
+                provider_class = import_string(config.pop("class"))
+                providers.append(provider_class(**config))
+            _router = LLMRouter(providers, hedge=getattr(settings, "LLM_HEDGE", False))
+    return _router
@@ -0,0 +1,423 @@
+import asyncio
+import contextvars
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    import fcntl
+except ImportError:  # windows, the state stays within the process
+    fcntl = None
+
+
+class Rejected(Exception):
+    """Raised when a generation can't be admitted right now"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+#! State backends: update(key, change) runs change(state) -> (state, result)
+#! atomically, state is None the first time and must be json serializable
+
+
+class InProcessBackend:
+    """Limiter state of this process only, for tests and single worker setups"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def update(self, key, change):
+        with self._lock:
+            self._state[key], result = change(self._state.get(key))
+        return result
+
+
+class FileBackend:
+    """
+    Limiter state in small json files, shared by the workers of one machine.
+
+    Every update holds an flock on the key's file, like the generation
+    leases in singleflight.py.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or getattr(
+            settings,
+            "RATE_LIMIT_DIR",
+            os.path.join(tempfile.gettempdir(), "ai_blog_ratelimit"),
+        )
+        self._lock = threading.Lock()  # only used without fcntl
+        os.makedirs(self.directory, exist_ok=True)
+
+    def update(self, key, change):
+        name = re.sub(r"[^\w.-]", "_", key)
+        fd = os.open(
+            os.path.join(self.directory, f"{name}.json"), os.O_RDWR | os.O_CREAT
+        )
+        with open(fd, "r+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                self._lock.acquire()
+            try:
+                raw = f.read()
+                state, result = change(json.loads(raw) if raw else None)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    self._lock.release()
+        return result
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Process-wide backend configured in settings.RATE_LIMIT_BACKEND"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(
+                getattr(
+                    settings,
+                    "RATE_LIMIT_BACKEND",
+                    "blog_generator_app.ratelimit.FileBackend",
+                )
+            )()
+    return _backend
+
+
+def take_tokens(backend, key, per_minute, burst, count=1, peek=False):
+    """
+    Take count tokens from a bucket holding up to burst tokens, refilled at
+    per_minute. Returns 0 when they were taken, else the seconds until they
+    can be. With peek nothing is taken.
+
+    A count over burst is let through with a full bucket and leaves it in
+    debt, the next tokens come once the debt is paid off.
+    """
+    rate = per_minute / 60
+    # wall clock, the state is shared between processes
+    now = time.time()
+    needed = min(count, burst)
+
+    def change(state):
+        tokens, updated = state or (burst, now)
+        tokens = min(burst, tokens + max(now - updated, 0) * rate)
+        if tokens >= needed:
+            return [tokens if peek else tokens - count, now], 0
+        return [tokens, now], (needed - tokens) / rate
+
+    return backend.update(key, change)
+
+
+def refund_tokens(backend, key, burst, count=1):
+    """Put back tokens taken by take_tokens()"""
+
+    def change(state):
+        tokens, updated = state or (burst, time.time())
+        return [min(burst, tokens + count), updated], None
+
+    backend.update(key, change)
+
+
+def acquire_slot(backend, key, slot, limit, ttl):
+    """
+    Hold one of limit slots until release_slot(), False when all are taken.
+
+    A slot whose holder died without releasing it expires after ttl seconds.
+    """
+    now = time.time()
+
+    def change(state):
+        held = {s: expires for s, expires in (state or {}).items() if expires > now}
+        if len(held) >= limit:
+            return held, False
+        held[slot] = now + ttl
+        return held, True
+
+    return backend.update(key, change)
+
+
+def release_slot(backend, key, slot):
+    def change(state):
+        held = dict(state or {})
+        held.pop(slot, None)
+        return held, None
+
+    backend.update(key, change)
+
+
+#! Admission control of generate-blog and friends
+
+IN_FLIGHT_KEY = "generations-in-flight"
+
+
+def _rate_limits(user):
+    """(key, per_minute, burst) of every bucket a generation of user is charged to"""
+    return [
+        (
+            f"user-{user.pk}",
+            getattr(settings, "RATE_LIMIT_USER_PER_MINUTE", 6),
+            getattr(settings, "RATE_LIMIT_USER_BURST", 3),
+        ),
+        (
+            "global",
+            getattr(settings, "RATE_LIMIT_GLOBAL_PER_MINUTE", 120),
+            getattr(settings, "RATE_LIMIT_GLOBAL_BURST", 30),
+        ),
+    ]
+
+
+def _check_tokens(backend, limits, count):
+    for key, per_minute, burst in limits:
+        wait = take_tokens(backend, key, per_minute, burst, count, peek=True)
+        if wait:
+            raise Rejected("Too many requests, please slow down", wait)
+
+
+def _take_tokens(backend, limits, count):
+    """Take count tokens from every bucket or from none of them"""
+    taken = []
+    for key, per_minute, burst in limits:
+        wait = take_tokens(backend, key, per_minute, burst, count)
+        if wait:
+            # another request got them since they were checked
+            for taken_key, _, taken_burst in taken:
+                refund_tokens(backend, taken_key, taken_burst, count)
+            raise Rejected("Too many requests, please slow down", wait)
+        taken.append((key, per_minute, burst))
+
+
+def admit_generation(user, slot=None, count=1):
+    """
+    Check the user's and the global rate limits and take an in-flight slot.
+
+    Every limit is checked before anything is taken, a rejected request
+    costs no tokens. count is the number of generations charged.
+
+    Returns the slot to pass to release_generation() once the generation
+    is over, raises Rejected when it has to wait.
+    """
+    backend = get_backend()
+    limits = _rate_limits(user)
+    _check_tokens(backend, limits, count)
+
+    slot = str(slot or uuid.uuid4())
+    if not acquire_slot(
+        backend,
+        IN_FLIGHT_KEY,
+        slot,
+        getattr(settings, "GENERATION_MAX_IN_FLIGHT", 16),
+        getattr(settings, "GENERATION_SLOT_TTL", 900),
+    ):
+        raise Rejected(
+            "The server is busy, please try again shortly",
+            getattr(settings, "GENERATION_BUSY_RETRY_AFTER", 10),
+        )
+
+    try:
+        _take_tokens(backend, limits, count)
+    except Rejected:
+        release_slot(backend, IN_FLIGHT_KEY, slot)
+        raise
+    return slot
+
+
+def charge_generations(user, count):
+    """
+    Charge count more generations to an admitted request, for the videos
+    of a playlist only known once it was expanded. Raises Rejected.
+    """
+    if count > 0:
+        backend = get_backend()
+        limits = _rate_limits(user)
+        _check_tokens(backend, limits, count)
+        _take_tokens(backend, limits, count)
+
+
+def release_generation(slot):
+    """Give back an in-flight slot, unknown slots are ignored"""
+    release_slot(get_backend(), IN_FLIGHT_KEY, str(slot))
+
+
+#! Adaptive concurrency towards the LLM apis
+
+# upstream slots of the call running in this context, see HeldSlots.run()
+_held_slots = contextvars.ContextVar("held_slots", default=None)
+
+
+class CallAbandoned(Exception):
+    """Raised in a call its caller gave up on before it got an upstream slot"""
+
+
+class HeldSlots:
+    """
+    Upstream slots taken by one call that may be abandoned.
+
+    A caller that stops waiting for the call (LLMRouter on a timeout)
+    calls abandon(), which gives the slots back right away rather than
+    when the call eventually returns, so the calls that are still wanted
+    don't queue behind it. A call abandoned before it got its slot never
+    goes out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = []
+        self.abandoned = False
+
+    def run(self, function, *args):
+        """function(*args) with the slots it takes held by this"""
+        token = _held_slots.set(self)
+        try:
+            return function(*args)
+        finally:
+            _held_slots.reset(token)
+
+    def add(self, slot):
+        """Track a slot, False when the call was abandoned already"""
+        with self._lock:
+            if not self.abandoned:
+                self._slots.append(slot)
+            return not self.abandoned
+
+    def abandon(self):
+        with self._lock:
+            self.abandoned = True
+            slots, self._slots = self._slots, []
+        for slot in slots:
+            slot.release(False)
+
+
+class _Slot:
+    """One taken slot of an AdaptiveLimiter, released at most once"""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self._lock = threading.Lock()
+        self._released = False
+
+    def release(self, succeeded):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.limiter.release(succeeded)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that backs off when the upstream api throttles us.
+
+    Each 429 burst halves the limit, every successful call grows it by
+    1/limit (so by one per limit calls) up to max_limit. The limit is per
+    process, every gunicorn worker finds its own share of the quota.
+    """
+
+    def __init__(self, max_limit, min_limit=1, cooldown=1.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.cooldown = cooldown
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.throttles = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def try_acquire(self):
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, succeeded):
+        with self._cond:
+            self.in_flight -= 1
+            if succeeded:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def throttled(self):
+        """Called for every 429 response, see the http hooks in clients.py"""
+        with self._cond:
+            self.throttles += 1
+            now = time.monotonic()
+            # the calls already in flight will 429 too, count them as one
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._last_decrease = now
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        slot = _Slot(self)
+        held = _held_slots.get()
+        if held is not None and not held.add(slot):
+            slot.release(False)
+            raise CallAbandoned("The call was abandoned while waiting for a slot")
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            slot.release(succeeded)
+
+    @asynccontextmanager
+    async def aslot(self, poll_interval=0.05):
+        # a cancelled task (the router gave up on it) releases in the finally
+        while not self.try_acquire():
+            await asyncio.sleep(poll_interval)
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            self.release(succeeded)
+
+    def as_dict(self):
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "throttles": self.throttles,
+        }
+
+
+_upstream_limiters = {}
+_upstream_limiters_lock = threading.Lock()
+
+
+def upstream_limiter(provider):
+    """Process-wide AdaptiveLimiter of an LLM provider ("openai" or "claude")"""
+    with _upstream_limiters_lock:
+        limiter = _upstream_limiters.get(provider)
+        if limiter is None:
+            limiter = _upstream_limiters[provider] = AdaptiveLimiter(
+                getattr(settings, "LLM_MAX_CONCURRENCY", 8)
+            )
+    return limiter
@@ -0,0 +1,187 @@
+import html
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import BlogPost, Transcript
+from .video_urls import extract_video_id
+
+POSTS_TABLE = "blog_generator_app_blogpost"
+# FTS5 table used when running on SQLite, rowid is the blog post id
+FTS_TABLE = "blog_generator_app_blogpost_fts"
+# a tsvector is capped at 1MB, only the start of very long transcripts is indexed
+TRANSCRIPT_INDEX_CHARS = 200_000
+# marks the matches, swapped for <mark> once the text is html escaped
+MATCH_START = "\x02"
+MATCH_STOP = "\x03"
+
+
+def _transcript_text(post):
+    transcript = (
+        Transcript.objects.filter(video_id=extract_video_id(post.youtube_link))
+        .values_list("text", flat=True)
+        .first()
+    )
+    return (transcript or "")[:TRANSCRIPT_INDEX_CHARS]
+
+
+def index_post(post):
+    """Add or refresh a blog post in the full-text index"""
+    transcript = _transcript_text(post)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"""
+                UPDATE {POSTS_TABLE} SET search_vector =
+                    setweight(to_tsvector('english', %s), 'A')
+                    || setweight(to_tsvector('english', %s), 'B')
+                    || setweight(to_tsvector('english', %s), 'C')
+                WHERE id = %s
+                """,
+                [post.youtube_title, post.generated_content, transcript, post.id],
+            )
+        elif connection.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.id])
+            cursor.execute(
+                f"""
+                INSERT INTO {FTS_TABLE}
+                    (rowid, youtube_title, generated_content, transcript)
+                VALUES (%s, %s, %s, %s)
+                """,
+                [post.id, post.youtube_title, post.generated_content, transcript],
+            )
+
+
+def index_posts(posts):
+    """index_post for posts created with bulk_create, which sends no signals"""
+    for post in posts:
+        index_post(post)
+
+
+@receiver(post_save, sender=BlogPost)
+def _index_saved_post(sender, instance, **kwargs):
+    index_post(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def _unindex_deleted_post(sender, instance, **kwargs):
+    # the postgres tsvector goes away with the row itself
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [instance.id])
+
+
+def _highlight(text):
+    """Html escape a headline and turn the match markers into <mark> tags"""
+    escaped = html.escape(text or "")
+    return escaped.replace(MATCH_START, "<mark>").replace(MATCH_STOP, "</mark>")
+
+
+def _fts5_query(query):
+    """Quote every word so user input can't use the FTS5 query syntax"""
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    # prefix match on the last word, it's often still being typed
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+def _search_postgresql(user, query, limit):
+    markers = f'StartSel="{MATCH_START}", StopSel="{MATCH_STOP}"'
+    title_options = f"{markers}, HighlightAll=true"
+    content_options = f"{markers}, MaxFragments=2, MaxWords=30, MinWords=10"
+    # headlines are expensive, only build them for the page of results
+    sql = f"""
+        SELECT id, youtube_title, rank,
+            ts_headline('english', youtube_title, query, %s),
+            ts_headline('english', generated_content, query, %s)
+        FROM (
+            SELECT p.id, p.youtube_title, p.generated_content,
+                ts_rank_cd(p.search_vector, query) AS rank, query
+            FROM {POSTS_TABLE} p, websearch_to_tsquery('english', %s) query
+            WHERE p.user_id = %s AND p.search_vector @@ query
+            ORDER BY rank DESC, p.id DESC
+            LIMIT %s
+        ) hits
+        ORDER BY rank DESC, id DESC
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [title_options, content_options, query, user.id, limit])
+        return cursor.fetchall()
+
+
+def _search_sqlite(user, query, limit):
+    fts_query = _fts5_query(query)
+    if fts_query is None:
+        return []
+
+    # bm25 is lower for better matches, title weighs more than the transcript.
+    # Highlights are only built for the page of results, sqlite would
+    # otherwise compute them for every match before sorting
+    sql = f"""
+        SELECT p.id, p.youtube_title, -hits.score,
+            highlight({FTS_TABLE}, 0, %s, %s),
+            snippet({FTS_TABLE}, -1, %s, %s, '…', 30)
+        FROM (
+            SELECT {FTS_TABLE}.rowid AS post_id,
+                bm25({FTS_TABLE}, 10.0, 4.0, 1.0) AS score
+            FROM {FTS_TABLE}
+            JOIN {POSTS_TABLE} p ON p.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH %s AND p.user_id = %s
+            ORDER BY score, p.id DESC
+            LIMIT %s
+        ) hits
+        JOIN {FTS_TABLE} ON {FTS_TABLE}.rowid = hits.post_id
+        JOIN {POSTS_TABLE} p ON p.id = hits.post_id
+        WHERE {FTS_TABLE} MATCH %s
+        ORDER BY hits.score, p.id DESC
+    """
+    markers = [MATCH_START, MATCH_STOP]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, markers + markers + [fts_query, user.id, limit, fts_query])
+        return cursor.fetchall()
+
+
+def _search_fallback(user, query, limit):
+    # other databases: unranked substring match, no highlighting
+    posts = (
+        BlogPost.objects.filter(user=user)
+        .filter(Q(youtube_title__icontains=query) | Q(excerpt__icontains=query))
+        .only("id", "youtube_title", "excerpt")
+        .order_by("-created_at", "-id")[:limit]
+    )
+    return [
+        (post.id, post.youtube_title, None, post.youtube_title, post.excerpt)
+        for post in posts
+    ]
+
+
+def search_posts(user, query, limit=20):
+    """
+    Ranked full-text search over a user's blog posts.
+
+    Matches the title, the generated content and the stored transcript of
+    the video. Titles and snippets come back as html with the matched
+    words wrapped in <mark>.
+    """
+    if connection.vendor == "postgresql":
+        rows = _search_postgresql(user, query, limit)
+    elif connection.vendor == "sqlite":
+        rows = _search_sqlite(user, query, limit)
+    else:
+        rows = _search_fallback(user, query, limit)
+
+    return [
+        {
+            "id": post_id,
+            "title": title,
+            "rank": round(rank, 4) if rank is not None else None,
+            "title_highlight": _highlight(title_headline),
+            "snippet": _highlight(snippet),
+        }
+        for post_id, title, rank, title_headline, snippet in rows
+    ]
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # windows, coalescing stays within the process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """One in-progress computation and the threads waiting for it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _try_lock(lock_file):
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+@contextmanager
+def file_lease(path, timeout, poll_interval=0.1):
+    """
+    Hold an exclusive lock on path, shared by every process of the machine.
+
+    Yields True when another holder had to be waited for. The lock goes
+    away with the process, so a crashed worker never leaves it behind.
+    After timeout seconds we stop waiting and go ahead without it.
+    """
+    if fcntl is None:
+        yield False
+        return
+
+    with open(path, "a") as lock_file:
+        waited = False
+        deadline = time.monotonic() + timeout
+        locked = False
+        while not _try_lock(lock_file):
+            waited = True
+            if time.monotonic() >= deadline:
+                logger.warning("Gave up waiting for the lease %s", path)
+                break
+            time.sleep(poll_interval)
+        else:
+            locked = True
+
+        try:
+            yield waited
+        finally:
+            if locked:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@asynccontextmanager
+async def afile_lease(path, timeout, poll_interval=0.1):
+    """file_lease() waiting with asyncio.sleep, the event loop keeps running"""
+    if fcntl is None:
+        yield False
+        return
+
+    with open(path, "a") as lock_file:
+        waited = False
+        deadline = time.monotonic() + timeout
+        locked = False
+        while not _try_lock(lock_file):
+            waited = True
+            if time.monotonic() >= deadline:
+                logger.warning("Gave up waiting for the lease %s", path)
+                break
+            await asyncio.sleep(poll_interval)
+        else:
+            locked = True
+
+        try:
+            yield waited
+        finally:
+            if locked:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key and shares its outcome.
+
+    Threads asking for a key that is already being computed in this process
+    wait for it and get the same result or exception. Across processes a
+    file lease per key elects the leader; the others wait for the lease and
+    then call check(), which should find what the leader stored (the
+    summary cache for blog generation). check() returning None means the
+    leader failed, and the waiter computes the value itself.
+    """
+
+    def __init__(self, lock_dir, timeout=600.0, poll_interval=0.1):
+        self.lock_dir = lock_dir
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = weakref.WeakKeyDictionary()  # event loop -> {key: task}
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def do(self, key, compute, check=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_with_lease(key, compute, check)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _run_with_lease(self, key, compute, check):
+        path = os.path.join(self.lock_dir, f"{key}.lock")
+        with file_lease(path, self.timeout, self.poll_interval) as waited:
+            if waited and check is not None:
+                # another worker had the key, it probably stored the result
+                result = check()
+                if result is not None:
+                    return result
+            return compute()
+
+    async def ado(self, key, compute, check=None):
+        """
+        do() for coroutine functions. Callers on the same event loop await
+        one task, which goes on when one of them is cancelled, the threads
+        and other processes wait on the same file lease.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tasks = self._tasks.setdefault(loop, {})
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = loop.create_task(
+                self._arun_with_lease(key, compute, check)
+            )
+            task.add_done_callback(lambda done: tasks.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _arun_with_lease(self, key, compute, check):
+        path = os.path.join(self.lock_dir, f"{key}.lock")
+        async with afile_lease(path, self.timeout, self.poll_interval) as waited:
+            if waited and check is not None:
+                result = await check()
+                if result is not None:
+                    return result
+            return await compute()
+
+
+_generation_flight = None
+_generation_flight_lock = threading.Lock()
+
+
+def get_generation_flight():
+    """Process-wide SingleFlight for blog generations"""
+    global _generation_flight
+    with _generation_flight_lock:
+        if _generation_flight is None:
+            _generation_flight = SingleFlight(
+                lock_dir=getattr(
+                    settings,
+                    "GENERATION_LOCK_DIR",
+                    os.path.join(tempfile.gettempdir(), "ai_blog_locks"),
+                ),
+                timeout=getattr(settings, "GENERATION_LOCK_TIMEOUT", 600.0),
+            )
+    return _generation_flight
@@ -0,0 +1,145 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .tokens import count_tokens
+
+DEFAULT_CHUNK_TOKENS = 6000
+DEFAULT_FAN_OUT = 4
+
+
+def chunk_budget():
+    """Maximum number of transcript tokens sent in a single summary prompt"""
+    return getattr(settings, "SUMMARY_CHUNK_TOKENS", DEFAULT_CHUNK_TOKENS)
+
+
+def chunk_snippets(snippets, max_tokens):
+    """
+    Group consecutive transcript snippets into chunks of at most max_tokens.
+
+    Chunks always end on a snippet boundary. A single snippet bigger than
+    the budget becomes a chunk on its own instead of being cut in half.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for snippet in snippets:
+        # +1 for the space the snippets are joined with
+        snippet_tokens = count_tokens(snippet) + 1
+        if current and current_tokens + snippet_tokens > max_tokens:
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append(snippet)
+        current_tokens += snippet_tokens
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def map_reduce_summary(
+    snippets,
+    summarize,
+    merge,
+    chunk_tokens=None,
+    fan_out=None,
+    final_summarize=None,
+    final_merge=None,
+):
+    """
+    Summarize a transcript that may not fit into a single prompt.
+
+    summarize(text) turns a piece of transcript into a summary and
+    merge(partials) combines an ordered list of summaries into one. Short
+    transcripts take a single summarize call. Long ones are split into
+    chunks that are summarized in parallel (at most fan_out at a time),
+    then merged, again in groups when the partial summaries themselves
+    are over the budget. Partials are always merged in transcript order,
+    so the same upstream answers give the same result.
+
+    final_summarize and final_merge, when given, replace summarize or
+    merge for the one call whose answer is the final summary, so it can
+    be streamed.
+    """
+    if chunk_tokens is None:
+        chunk_tokens = chunk_budget()
+    if fan_out is None:
+        fan_out = getattr(settings, "SUMMARY_FAN_OUT", DEFAULT_FAN_OUT)
+    final_summarize = final_summarize or summarize
+    final_merge = final_merge or merge
+
+    chunks = chunk_snippets(snippets, chunk_tokens)
+    if len(chunks) <= 1:
+        return final_summarize(" ".join(snippets))
+
+    with ThreadPoolExecutor(max_workers=fan_out) as pool:
+        # map() returns results in submission order whatever finishes first
+        partials = list(pool.map(lambda chunk: summarize(" ".join(chunk)), chunks))
+
+        while len(partials) > 1:
+            groups = merge_groups(partials, chunk_tokens)
+            if groups is None:
+                break
+            partials = list(pool.map(merge, groups))
+
+    return final_merge(partials) if len(partials) > 1 else partials[0]
+
+
+def merge_groups(partials, chunk_tokens):
+    """
+    Groups of partial summaries for the next merge round, None when they
+    fit into a single (final) merge.
+    """
+    groups = chunk_snippets(partials, chunk_tokens)
+    if len(groups) == 1:
+        return None
+    if len(groups) == len(partials):
+        # every partial is over the budget on its own, grouping
+        # wouldn't make progress, merge them pairwise instead
+        groups = [partials[i : i + 2] for i in range(0, len(partials), 2)]
+    return groups
+
+
+async def amap_reduce_summary(
+    snippets, summarize, merge, chunk_tokens=None, fan_out=None
+):
+    """
+    map_reduce_summary() for the async pipeline, summarize and merge are
+    coroutine functions. The chunks are summarized as concurrent tasks, at
+    most fan_out at a time, and merged in transcript order the same way.
+    """
+    if chunk_tokens is None:
+        chunk_tokens = chunk_budget()
+    if fan_out is None:
+        fan_out = getattr(settings, "SUMMARY_FAN_OUT", DEFAULT_FAN_OUT)
+
+    chunks = chunk_snippets(snippets, chunk_tokens)
+    if len(chunks) <= 1:
+        return await summarize(" ".join(snippets))
+
+    semaphore = asyncio.Semaphore(fan_out)
+
+    async def limited(function, argument):
+        async with semaphore:
+            return await function(argument)
+
+    async def run_all(function, arguments):
+        # results in submission order, one failing call cancels the others
+        tasks = [asyncio.ensure_future(limited(function, a)) for a in arguments]
+        try:
+            return await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    partials = await run_all(summarize, [" ".join(chunk) for chunk in chunks])
+    while len(partials) > 1:
+        groups = merge_groups(partials, chunk_tokens)
+        if groups is None:
+            break
+        partials = await run_all(merge, groups)
+
+    return await merge(partials) if len(partials) > 1 else partials[0]
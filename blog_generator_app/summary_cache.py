@@ -0,0 +1,157 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import SummaryCacheEntry
+
+# default cache policy, can be overridden from settings.py
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def make_cache_key(video_id, language, provider, model, prompt_version):
+    """Build a content-addressed key for a summary generation"""
+    raw = "|".join([video_id.strip(), language, provider, model, str(prompt_version)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _ttl():
+    return timedelta(
+        seconds=getattr(settings, "SUMMARY_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)
+    )
+
+
+def _max_entries():
+    return getattr(settings, "SUMMARY_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+
+
+def get_cached_summary(cache_key):
+    """Return a fresh cache entry for the key or None on a miss"""
+    entry = SummaryCacheEntry.objects.filter(key=cache_key).first()
+    if entry is None:
+        return None
+
+    now = timezone.now()
+    if entry.created_at < now - _ttl():
+        # expired entries are dropped on read so the next store starts clean
+        entry.delete()
+        return None
+
+    # bump recency for LRU eviction with a single UPDATE
+    SummaryCacheEntry.objects.filter(pk=entry.pk).update(
+        last_accessed=now, hit_count=F("hit_count") + 1
+    )
+    return entry
+
+
+async def aget_cached_summary(cache_key):
+    """Async version of get_cached_summary for the ASGI pipeline"""
+    entry = await SummaryCacheEntry.objects.filter(key=cache_key).afirst()
+    if entry is None:
+        return None
+
+    now = timezone.now()
+    if entry.created_at < now - _ttl():
+        await entry.adelete()
+        return None
+
+    await SummaryCacheEntry.objects.filter(pk=entry.pk).aupdate(
+        last_accessed=now, hit_count=F("hit_count") + 1
+    )
+    return entry
+
+
+def store_summary(
+    cache_key,
+    video_id,
+    language,
+    provider,
+    model,
+    prompt_version,
+    transcript,
+    summary,
+    title,
+):
+    """Save a generated summary in the cache and evict old entries"""
+    now = timezone.now()
+    entry, _ = SummaryCacheEntry.objects.update_or_create(
+        key=cache_key,
+        defaults={
+            "video_id": video_id,
+            "language": language,
+            "provider": provider,
+            "model": model,
+            "prompt_version": str(prompt_version),
+            "transcript": transcript,
+            "summary": summary,
+            "title": title,
+            "created_at": now,
+            "last_accessed": now,
+        },
+    )
+    evict_summary_cache()
+    return entry
+
+
+def evict_summary_cache():
+    """Remove expired entries and the least recently used ones over the limit"""
+    SummaryCacheEntry.objects.filter(created_at__lt=timezone.now() - _ttl()).delete()
+
+    stale_ids = list(
+        SummaryCacheEntry.objects.order_by("-last_accessed").values_list(
+            "pk", flat=True
+        )[_max_entries() :]
+    )
+    if stale_ids:
+        SummaryCacheEntry.objects.filter(pk__in=stale_ids).delete()
+
+
+async def astore_summary(
+    cache_key,
+    video_id,
+    language,
+    provider,
+    model,
+    prompt_version,
+    transcript,
+    summary,
+    title,
+):
+    """Async version of store_summary for the ASGI pipeline"""
+    now = timezone.now()
+    entry, _ = await SummaryCacheEntry.objects.aupdate_or_create(
+        key=cache_key,
+        defaults={
+            "video_id": video_id,
+            "language": language,
+            "provider": provider,
+            "model": model,
+            "prompt_version": str(prompt_version),
+            "transcript": transcript,
+            "summary": summary,
+            "title": title,
+            "created_at": now,
+            "last_accessed": now,
+        },
+    )
+    await aevict_summary_cache()
+    return entry
+
+
+async def aevict_summary_cache():
+    """Async version of evict_summary_cache"""
+    await SummaryCacheEntry.objects.filter(
+        created_at__lt=timezone.now() - _ttl()
+    ).adelete()
+
+    stale_ids = [
+        pk
+        async for pk in SummaryCacheEntry.objects.order_by(
+            "-last_accessed"
+        ).values_list("pk", flat=True)[_max_entries() :]
+    ]
+    if stale_ids:
+        await SummaryCacheEntry.objects.filter(pk__in=stale_ids).adelete()
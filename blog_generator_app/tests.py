@@ -1,3 +1,2198 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from . import bulk, clients, derivations, metrics, ratelimit, views
+from .audio import AudioCache, GrowingFileReader
+from .chapters import (
+    format_timestamp,
+    parse_chapter,
+    render_chapters,
+    segment_transcript,
+    summarize_chapters,
+)
+from .clients import ClientRegistry
+from .compaction import (
+    clean_snippet,
+    compact_transcript,
+    dedupe_snippets,
+    trim_to_budget,
+)
+from .derivations import derive_formats
+from .jobs import GenerationError, process_job, reclaim_stale_jobs
+from .llm import parse_blog_post
+from .metrics import MetricsRegistry
+from .models import (
+    BlogPost,
+    GenerationJob,
+    GenerationUsage,
+    SummaryCacheEntry,
+    VideoMetadata,
+)
+from .pagination import decode_cursor, encode_cursor, keyset_page
+from .providers import LLMProvider, LLMRouter, ProviderError
+from .ratelimit import AdaptiveLimiter, InProcessBackend
+from .search import search_posts
+from .singleflight import SingleFlight
+from .summarization import amap_reduce_summary, chunk_snippets, map_reduce_summary
+from .summary_cache import get_cached_summary, make_cache_key, store_summary
+from .tokens import count_tokens
+from .transcript_sources import (
+    CircuitBreaker,
+    Snippet,
+    TranscriptResolver,
+    TranscriptResult,
+    TranscriptSource,
+)
+from .transcripts import (
+    StoredTranscript,
+    get_stored_transcript,
+    pack_segments,
+    save_transcript,
+    unpack_segments,
+)
+from .video_urls import canonical_url, extract_video_id, normalize_url
 
 # Create your tests here.
+
+
+def done_future(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def fake_stream(prompts):
+    """stream() of a FakeProvider, answers in pieces and records the prompts"""
+
+    def stream(prompt, max_tokens):
+        prompts.append(prompt)
+        if "video title" in prompt:
+            yield from ["A ", "short ", "title"]
+        else:
+            yield from ["First ", "part. ", "Second part."]
+
+    return stream
+
+
+async def read_stream(response):
+    return b"".join([chunk async for chunk in response.streaming_content])
+
+
+def parse_sse(body):
+    """Turn a text/event-stream body into a list of (event, payload)"""
+    events = []
+    for raw_event in body.decode("utf-8").strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in raw_event.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+# the stream runs on its own thread and db connection, it must see the test data
+@override_settings(GENERATION_STREAMING=True, COMBINED_GENERATION=True)
+class StreamingGenerationTests(TransactionTestCase):
+    def setUp(self):
+        self.prompts = []
+        self.user = User.objects.create_user(username="tester", password="secret")
+        self.client.force_login(self.user)
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir)
+        mock.patch.object(
+            ratelimit, "get_backend", return_value=InProcessBackend()
+        ).start()
+        self.metadata = mock.patch.object(
+            views, "prefetch_video_metadata", return_value=done_future(None)
+        ).start()
+        self.load_transcript = mock.patch.object(
+            views,
+            "load_video_transcript",
+            return_value=StoredTranscript.from_snippets(
+                "dQw4w9WgXcQ", "en", snippets("the transcript")
+            ),
+        ).start()
+        mock.patch.object(
+            views,
+            "get_llm_router",
+            return_value=LLMRouter(
+                [FakeProvider("fake", stream=fake_stream(self.prompts))]
+            ),
+        ).start()
+        mock.patch.object(
+            views, "get_generation_flight", return_value=SingleFlight(lock_dir)
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def post(self, stream=True):
+        return self.client.post(
+            "/generate-blog",
+            data=json.dumps(
+                {
+                    "link": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                    "stream": stream,
+                }
+            ),
+            content_type="application/json",
+        )
+
+    def post_stream(self):
+        response = self.post()
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return parse_sse(async_to_sync(read_stream)(response))
+
+    def test_streams_summary_then_title_and_saves_post(self):
+        events = self.post_stream()
+
+        names = [name for name, _ in events]
+        self.assertEqual(names, ["summary"] * 3 + ["title"] * 3 + ["done"])
+        self.assertEqual(
+            "".join(data["text"] for name, data in events if name == "summary"),
+            "First part. Second part.",
+        )
+
+        done = events[-1][1]
+        post = BlogPost.objects.get(id=done["id"])
+        self.assertEqual(post.user, self.user)
+        self.assertEqual(post.youtube_title, "A short title")
+        self.assertEqual(post.generated_content, "First part. Second part.")
+        self.assertIn("the transcript", self.prompts[0])
+        # same bookkeeping as the job path, the combined call can't be streamed
+        usage = GenerationUsage.objects.get()
+        self.assertEqual((usage.mode, usage.provider), ("two_call", "fake"))
+
+    async def test_events_are_sent_while_the_summary_is_generated(self):
+        released = threading.Event()
+
+        def slow_stream(prompt, max_tokens):
+            yield "First "
+            released.wait(5)
+            yield "part."
+
+        await self.async_client.aforce_login(self.user)
+        with mock.patch.object(
+            views,
+            "get_llm_router",
+            return_value=LLMRouter([FakeProvider("fake", stream=slow_stream)]),
+        ):
+            response = await self.async_client.post(
+                "/generate-blog",
+                data={
+                    "link": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                    "stream": True,
+                },
+                content_type="application/json",
+            )
+            chunks = aiter(response.streaming_content)
+            first = await asyncio.wait_for(anext(chunks), 2)
+            generated = await BlogPost.objects.aexists()
+            released.set()
+            rest = b"".join([chunk async for chunk in chunks])
+
+        self.assertEqual(parse_sse(first), [("summary", {"text": "First "})])
+        self.assertFalse(generated)
+        self.assertEqual(parse_sse(rest)[-1][0], "done")
+
+    def test_cached_video_is_answered_before_admission(self):
+        self.post_stream()
+        with mock.patch.object(views, "admit_generation") as admit:
+            response = self.post()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {"title": "A short title", "content": "First part. Second part."},
+        )
+        admit.assert_not_called()
+        self.assertEqual(self.load_transcript.call_count, 1)
+        self.assertEqual(len(self.prompts), 2)
+        self.assertEqual(BlogPost.objects.count(), 2)
+        self.assertEqual(SummaryCacheEntry.objects.get().hit_count, 1)
+
+    def test_missing_transcript_sends_error_event(self):
+        self.load_transcript.return_value = None
+
+        events = self.post_stream()
+
+        self.assertEqual(
+            events, [("error", {"error": "No transcription available for this video"})]
+        )
+        self.assertFalse(BlogPost.objects.exists())
+
+    def test_known_video_title_replaces_the_title_call(self):
+        self.metadata.return_value = done_future(
+            VideoMetadata(video_id="dQw4w9WgXcQ", title="Real title")
+        )
+
+        events = self.post_stream()
+
+        self.assertEqual(events[-2], ("title", {"text": "Real title"}))
+        self.assertEqual(len(self.prompts), 1)
+        self.assertEqual(BlogPost.objects.get().youtube_title, "Real title")
+
+    @override_settings(GENERATION_STREAMING=False, GENERATION_RUN_IN_PROCESS=False)
+    def test_stream_requests_get_a_job_unless_streaming_is_on(self):
+        response = self.post()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(GenerationJob.objects.filter(id=response.json()["job_id"]))
+
+
+class FakeSummarizer:
+    """Counting fake LLM for the map and reduce steps of the summarizer"""
+
+    def __init__(self, jitter=0.0):
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        self.summarized = []
+        self.merged = []
+
+    def summarize(self, text):
+        # random delays make the parallel map steps finish out of order
+        time.sleep(random.random() * self.jitter)
+        with self.lock:
+            self.summarized.append(text)
+        snippet_ids = re.findall(r"\bs\d+\b", text)
+        return f"<{snippet_ids[0]}..{snippet_ids[-1]}>"
+
+    def merge(self, partials):
+        with self.lock:
+            self.merged.append(list(partials))
+        return "+".join(partials)
+
+
+class MapReduceSummaryTests(SimpleTestCase):
+    def setUp(self):
+        self.snippets = [f"s{i} " + "word " * (i % 7) for i in range(200)]
+        self.snippets = [snippet.strip() for snippet in self.snippets]
+
+    def test_chunks_end_on_snippet_boundaries(self):
+        chunks = chunk_snippets(self.snippets, 50)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual([s for chunk in chunks for s in chunk], self.snippets)
+        for chunk in chunks:
+            tokens = sum(count_tokens(snippet) + 1 for snippet in chunk)
+            self.assertTrue(tokens <= 50 or len(chunk) == 1)
+
+    def test_oversized_snippet_gets_its_own_chunk(self):
+        big = "huge " * 500
+        chunks = chunk_snippets(["a", big, "b"], 20)
+
+        self.assertEqual(chunks, [["a"], [big], ["b"]])
+
+    def test_short_transcript_is_a_single_call(self):
+        fake = FakeSummarizer()
+        result = map_reduce_summary(
+            self.snippets[:5], fake.summarize, fake.merge, chunk_tokens=10_000
+        )
+
+        self.assertEqual(fake.summarized, [" ".join(self.snippets[:5])])
+        self.assertEqual(fake.merged, [])
+        self.assertEqual(result, "<s0..s4>")
+
+    def test_map_inputs_are_contiguous_snippet_runs(self):
+        fake = FakeSummarizer()
+        map_reduce_summary(
+            self.snippets, fake.summarize, fake.merge, chunk_tokens=60, fan_out=4
+        )
+
+        expected = [" ".join(chunk) for chunk in chunk_snippets(self.snippets, 60)]
+        self.assertEqual(sorted(fake.summarized), sorted(expected))
+
+    def test_reduce_output_is_deterministic(self):
+        results = []
+        for _ in range(3):
+            fake = FakeSummarizer(jitter=0.005)
+            results.append(
+                map_reduce_summary(
+                    self.snippets,
+                    fake.summarize,
+                    fake.merge,
+                    chunk_tokens=60,
+                    fan_out=8,
+                )
+            )
+
+        self.assertEqual(len(set(results)), 1)
+        # partial summaries are merged in transcript order
+        self.assertTrue(results[0].startswith("<s0.."))
+        self.assertTrue(results[0].endswith("..s199>"))
+
+    def test_async_version_gives_the_same_summary(self):
+        fake = FakeSummarizer()
+        expected = map_reduce_summary(
+            self.snippets, fake.summarize, fake.merge, chunk_tokens=60
+        )
+
+        async def summarize(text):
+            # the map tasks finish out of order
+            await asyncio.sleep(random.random() * 0.005)
+            return fake.summarize(text)
+
+        async def merge(partials):
+            return fake.merge(partials)
+
+        result = async_to_sync(amap_reduce_summary)(
+            self.snippets, summarize, merge, chunk_tokens=60, fan_out=8
+        )
+
+        self.assertEqual(result, expected)
+
+
+class FakeSource:
+    """Counting transcript source with a fixed delay and outcome"""
+
+    def __init__(self, result=None, delay=0.0, error=None):
+        self.result = result
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, video_id):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def snippets(label):
+    return [Snippet(text=f"{label} says hi", start=0.0, duration=1.0)]
+
+
+class TranscriptResolverTests(SimpleTestCase):
+    def test_chain_moves_past_empty_and_failing_sources(self):
+        empty = FakeSource(result=None)
+        broken = FakeSource(error=RuntimeError("proxy down"))
+        working = FakeSource(result=snippets("third"))
+        resolver = TranscriptResolver(
+            [
+                TranscriptSource("empty", empty, timeout=1),
+                TranscriptSource("broken", broken, timeout=1),
+                TranscriptSource("working", working, timeout=1),
+            ]
+        )
+
+        result = resolver.resolve("abcdefghijk")
+
+        self.assertEqual(result.source, "working")
+        self.assertEqual(result.snippets[0].text, "third says hi")
+        self.assertEqual((empty.calls, broken.calls, working.calls), (1, 1, 1))
+
+    def test_only_answers_from_every_source_count_as_missing(self):
+        empty = TranscriptSource("empty", FakeSource(result=None), timeout=1)
+        broken = TranscriptSource(
+            "broken", FakeSource(error=RuntimeError("proxy down")), timeout=1
+        )
+
+        resolver = TranscriptResolver([empty, broken])
+        self.assertEqual(resolver.resolve_with_outcome("abcdefghijk"), (None, False))
+        resolver = TranscriptResolver([empty, broken])
+        self.assertEqual(
+            resolver.resolve_with_outcome("abcdefghijk", skip=("broken",)),
+            (None, True),
+        )
+
+    def test_no_source_has_a_transcript(self):
+        resolver = TranscriptResolver(
+            [TranscriptSource("empty", FakeSource(result=None), timeout=1)]
+        )
+
+        self.assertIsNone(resolver.resolve("abcdefghijk"))
+
+    def test_slow_source_times_out(self):
+        slow = TranscriptSource(
+            "slow", FakeSource(result=snippets("slow"), delay=0.5), timeout=0.05
+        )
+        fast = TranscriptSource("fast", FakeSource(result=snippets("fast")), timeout=1)
+
+        started = time.monotonic()
+        result = TranscriptResolver([slow, fast]).resolve("abcdefghijk")
+
+        self.assertEqual(result.source, "fast")
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(slow.breaker._failures, 1)
+
+    def test_open_breaker_skips_the_source(self):
+        broken = FakeSource(error=RuntimeError("proxy down"))
+        backup = FakeSource(result=snippets("backup"))
+        clock = FakeClock()
+        resolver = TranscriptResolver(
+            [
+                TranscriptSource(
+                    "broken",
+                    broken,
+                    timeout=1,
+                    breaker=CircuitBreaker(
+                        failure_threshold=2, reset_timeout=30, clock=clock
+                    ),
+                ),
+                TranscriptSource("backup", backup, timeout=1),
+            ]
+        )
+
+        for _ in range(4):
+            self.assertEqual(resolver.resolve("abcdefghijk").source, "backup")
+        self.assertEqual(broken.calls, 2)
+
+        # after the reset timeout one trial call goes through and closes it
+        clock.now = 31
+        broken.error = None
+        broken.result = snippets("recovered")
+        self.assertEqual(resolver.resolve("abcdefghijk").source, "broken")
+        self.assertEqual(resolver.sources[0].breaker.state, CircuitBreaker.CLOSED)
+
+    def test_hedged_request_takes_the_first_answer(self):
+        slow = FakeSource(result=snippets("slow"), delay=0.5)
+        fast = FakeSource(result=snippets("fast"), delay=0.01)
+        resolver = TranscriptResolver(
+            [
+                TranscriptSource("slow", slow, timeout=5),
+                TranscriptSource("fast", fast, timeout=5),
+            ],
+            hedge_after=0.05,
+        )
+
+        started = time.monotonic()
+        result = resolver.resolve("abcdefghijk")
+
+        self.assertEqual(result.source, "fast")
+        self.assertLess(time.monotonic() - started, 0.4)
+
+    def test_without_hedging_the_chain_waits(self):
+        slow = FakeSource(result=snippets("slow"), delay=0.1)
+        fast = FakeSource(result=snippets("fast"))
+        resolver = TranscriptResolver(
+            [
+                TranscriptSource("slow", slow, timeout=5),
+                TranscriptSource("fast", fast, timeout=5),
+            ]
+        )
+
+        self.assertEqual(resolver.resolve("abcdefghijk").source, "slow")
+        self.assertEqual(fast.calls, 0)
+
+
+class CountingFakeLLM:
+    """Combined summary + title call that counts how often it is hit"""
+
+    def __init__(self, delay=0.2, error=None):
+        self.delay = delay
+        self.error = error
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def __call__(self, transcript):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return json.dumps({"title": "Shared title", "summary": "Shared summary"}), 10, 5
+
+
+class FakeProvider(LLMProvider):
+    """
+    Provider whose operations are given as callables, a sync one also
+    answers the async call (title -> atitle) unless that is given too
+    """
+
+    provider = "fake"
+
+    def __init__(self, model, timeout=5.0, **operations):
+        super().__init__(model, timeout=timeout)
+        for name, operation in operations.items():
+            setattr(self, name, operation)
+            if f"a{name}" not in operations and not asyncio.iscoroutinefunction(
+                operation
+            ):
+                setattr(
+                    self, f"a{name}", sync_to_async(operation, thread_sensitive=False)
+                )
+
+
+def slow_answer(seconds, answer):
+    def operation(*args):
+        time.sleep(seconds)
+        return answer
+
+    return operation
+
+
+def run_concurrently(function, count):
+    """Call function from count threads released at the same moment"""
+    barrier = threading.Barrier(count)
+
+    def call():
+        barrier.wait()
+        try:
+            return function()
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        futures = [pool.submit(call) for _ in range(count)]
+    return [future.result() for future in futures]
+
+
+class SummaryCacheTests(TestCase):
+    def store(self, video_id, prompt_version=1):
+        key = make_cache_key(video_id, "en", "openai", "gpt-4o-mini", prompt_version)
+        store_summary(
+            key,
+            video_id,
+            "en",
+            "openai",
+            "gpt-4o-mini",
+            prompt_version,
+            "transcript",
+            f"summary of {video_id}",
+            f"title of {video_id}",
+        )
+        return key
+
+    def age(self, key, created=None, accessed=None):
+        now = timezone.now()
+        SummaryCacheEntry.objects.filter(key=key).update(
+            created_at=now - (created or timedelta(0)),
+            last_accessed=now - (accessed or timedelta(0)),
+        )
+
+    def test_keys_change_with_the_prompt_version(self):
+        first = self.store("dQw4w9WgXcQ")
+        self.assertNotEqual(self.store("dQw4w9WgXcQ", prompt_version=2), first)
+        self.assertEqual(self.store("dQw4w9WgXcQ"), first)
+        self.assertEqual(SummaryCacheEntry.objects.count(), 2)
+
+    @override_settings(SUMMARY_CACHE_TTL_SECONDS=3600)
+    def test_expired_entries_are_dropped_on_read(self):
+        fresh = self.store("dQw4w9WgXcQ")
+        expired = self.store("9bZkp7q5g8E")
+        self.age(fresh, created=timedelta(minutes=59))
+        self.age(expired, created=timedelta(minutes=61))
+
+        self.assertIsNone(get_cached_summary(expired))
+        self.assertFalse(SummaryCacheEntry.objects.filter(key=expired).exists())
+
+        entry = get_cached_summary(fresh)
+        self.assertEqual(entry.summary, "summary of dQw4w9WgXcQ")
+        self.assertEqual(SummaryCacheEntry.objects.get(key=fresh).hit_count, 1)
+
+    @override_settings(SUMMARY_CACHE_TTL_SECONDS=3600)
+    def test_stores_evict_expired_entries(self):
+        expired = self.store("dQw4w9WgXcQ")
+        self.age(expired, created=timedelta(hours=2))
+
+        self.store("9bZkp7q5g8E")
+
+        self.assertFalse(SummaryCacheEntry.objects.filter(key=expired).exists())
+
+    @override_settings(SUMMARY_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_entry_is_evicted(self):
+        first = self.store("dQw4w9WgXcQ")
+        second = self.store("9bZkp7q5g8E")
+        self.age(first, accessed=timedelta(minutes=3))
+        self.age(second, accessed=timedelta(minutes=2))
+        # the oldest entry is read again, the second one is now the least recent
+        get_cached_summary(first)
+
+        third = self.store("kJQP7kiw5Fk")
+
+        self.assertEqual(
+            set(SummaryCacheEntry.objects.values_list("key", flat=True)),
+            {first, third},
+        )
+
+
+class TranscriptStoreTests(TestCase):
+    def test_segments_round_trip(self):
+        starts = array("f", [0.0, 1.5, 3.25])
+        durations = array("f", [1.5, 1.75, 0.5])
+        offsets = array("I", [0, 12, 40])
+
+        for compress in (True, False):
+            with self.subTest(compress=compress):
+                blob = pack_segments(starts, durations, offsets, compress=compress)
+                self.assertEqual(unpack_segments(blob), (starts, durations, offsets))
+
+    def test_unknown_format_is_rejected(self):
+        blob = pack_segments(array("f"), array("f"), array("I"))
+        with self.assertRaises(ValueError):
+            unpack_segments(b"XXXX" + blob[4:])
+
+    def test_offsets_count_characters_not_bytes(self):
+        texts = ["Ça va très bien", "日本語の字幕", "emoji 🎸🎶 time", "done"]
+        snippets = [
+            Snippet(text=text, start=i * 2.0, duration=2.0)
+            for i, text in enumerate(texts)
+        ]
+
+        save_transcript("dQw4w9WgXcQ", "fr", False, snippets)
+        stored = get_stored_transcript("dQw4w9WgXcQ", ["fr"])
+
+        self.assertEqual(stored.snippet_texts(), texts)
+        self.assertEqual(stored.text, " ".join(texts))
+        self.assertEqual(list(stored.starts), [0.0, 2.0, 4.0, 6.0])
+        self.assertEqual(stored.segment_at(5), 2)
+
+    def test_empty_transcript(self):
+        save_transcript("dQw4w9WgXcQ", "en", True, [])
+        stored = get_stored_transcript("dQw4w9WgXcQ", ["en"])
+
+        self.assertTrue(stored.is_generated)
+        self.assertEqual(len(stored), 0)
+        self.assertEqual(stored.text, "")
+        self.assertEqual(stored.snippet_texts(), [])
+        self.assertEqual(stored.segment_at(10), 0)
+
+    def test_first_preferred_language_is_returned(self):
+        save_transcript("dQw4w9WgXcQ", "en", False, snippets("english"))
+        save_transcript("dQw4w9WgXcQ", "de", False, snippets("deutsch"))
+        # a second copy of a video and language keeps the first one
+        save_transcript("dQw4w9WgXcQ", "de", False, snippets("other"))
+
+        stored = get_stored_transcript("dQw4w9WgXcQ", ["fr", "de", "en"])
+
+        self.assertEqual(stored.language, "de")
+        self.assertEqual(stored.text, "deutsch says hi")
+        self.assertFalse(stored.is_generated)
+        self.assertIsNone(get_stored_transcript("dQw4w9WgXcQ", ["fr"]))
+
+
+class CompactionTests(SimpleTestCase):
+    def test_annotations_and_fillers_are_removed(self):
+        self.assertEqual(
+            clean_snippet("[Music] um so ♪♪ (Applause) we >> uh, begin  now"),
+            "so we begin now",
+        )
+        # only the usual markers, other text in parentheses is speech
+        self.assertEqual(clean_snippet("(quietly) hello"), "(quietly) hello")
+
+    def test_rolling_caption_overlap_is_removed(self):
+        rolled = [
+            "so today we are",
+            "today we are going to talk",
+            "going to talk about caching",
+            "going to talk about caching",
+        ]
+
+        self.assertEqual(
+            dedupe_snippets(rolled),
+            ["so today we are", "going to talk", "about caching"],
+        )
+
+    def test_a_single_repeated_word_is_not_an_overlap(self):
+        self.assertEqual(dedupe_snippets(["no", "no way"]), ["no", "no way"])
+
+    def test_repeated_speech_of_manual_captions_is_kept(self):
+        for snippets in [
+            ["I said thank you", "thank you very much"],
+            ["no no", "no no no"],
+        ]:
+            with self.subTest(snippets=snippets):
+                compacted = compact_transcript(snippets)
+                self.assertEqual(compacted.snippets, snippets)
+                self.assertEqual(compacted.text, " ".join(snippets))
+
+    def test_auto_captions_are_deduped(self):
+        compacted = compact_transcript(
+            ["I said thank you", "thank you very much"], rolling=True
+        )
+
+        self.assertEqual(compacted.snippets, ["I said thank you", "very much"])
+        self.assertLess(compacted.tokens_after, compacted.tokens_before)
+
+    def test_trimming_keeps_snippets_from_the_whole_video(self):
+        snippets = [f"line {i}" for i in range(100)]
+
+        kept = trim_to_budget(snippets, 60)
+
+        self.assertLessEqual(sum(count_tokens(text) + 1 for text in kept), 60)
+        self.assertEqual(kept[:2], ["line 4", "line 9"])
+        self.assertEqual(kept[-1], "line 99")
+        self.assertEqual(trim_to_budget(snippets, None), snippets)
+
+    def test_video_transcripts_are_deduped_only_when_auto_generated(self):
+        rolled = [
+            Snippet(text=text, start=i, duration=1.0)
+            for i, text in enumerate(["I said thank you", "thank you very much"])
+        ]
+
+        for is_generated, expected in [
+            (False, "I said thank you thank you very much"),
+            (True, "I said thank you very much"),
+        ]:
+            with self.subTest(is_generated=is_generated):
+                transcript = StoredTranscript.from_snippets(
+                    "dQw4w9WgXcQ", "en", rolled, is_generated
+                )
+                self.assertEqual(
+                    views.compact_video_transcript(transcript).text, expected
+                )
+
+
+class ParseBlogPostTests(SimpleTestCase):
+    def test_title_and_summary_are_stripped(self):
+        raw = json.dumps({"title": " A title \n", "summary": "\nThe summary. "})
+        self.assertEqual(parse_blog_post(raw), ("A title", "The summary."))
+        # tool calls hand over the arguments already decoded
+        self.assertEqual(
+            parse_blog_post({"title": "A title", "summary": "The summary."}),
+            ("A title", "The summary."),
+        )
+
+    def test_malformed_or_partial_output_is_rejected(self):
+        for raw in (
+            "",
+            "Here is your blog post: A title",
+            '{"title": "A title", "summary": "The summ',  # cut at max_tokens
+            '["A title", "The summary."]',
+            '{"title": "A title"}',
+            '{"summary": "The summary."}',
+            '{"title": "  ", "summary": "The summary."}',
+            '{"title": "A title", "summary": 42}',
+            None,
+        ):
+            with self.subTest(raw=raw):
+                with self.assertRaises(ValueError):
+                    parse_blog_post(raw)
+
+
+@override_settings(COMBINED_GENERATION=True)
+class CombinedGenerationTests(TestCase):
+    def setUp(self):
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir)
+        mock.patch.multiple(
+            views,
+            get_generation_flight=mock.Mock(return_value=SingleFlight(lock_dir)),
+            load_video_transcript=mock.Mock(
+                return_value=StoredTranscript.from_snippets(
+                    "dQw4w9WgXcQ", "en", snippets("the video")
+                )
+            ),
+            prefetch_video_metadata=mock.Mock(return_value=done_future(None)),
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def generate(self, blog_post):
+        provider = FakeProvider(
+            "fake",
+            blog_post=blog_post,
+            summary=slow_answer(0, "Two call summary"),
+            title=slow_answer(0, "Two call title"),
+        )
+        with mock.patch.object(
+            views, "get_llm_router", return_value=LLMRouter([provider])
+        ):
+            return views.generate_blog_content("dQw4w9WgXcQ")
+
+    def test_one_call_gives_title_and_summary(self):
+        result = self.generate(CountingFakeLLM(delay=0))
+
+        self.assertEqual(result, ("Shared title", "Shared summary"))
+        usage = GenerationUsage.objects.get()
+        self.assertEqual((usage.mode, usage.output_tokens), ("combined", 5))
+
+    def test_unusable_output_falls_back_to_two_calls(self):
+        for name, blog_post in (
+            ("partial", slow_answer(0, ('{"title": "A title", "summ', 10, 5))),
+            ("no title", slow_answer(0, ('{"summary": "The summary."}', 10, 5))),
+            ("api error", mock.Mock(side_effect=RuntimeError("invalid schema"))),
+        ):
+            with self.subTest(name):
+                SummaryCacheEntry.objects.all().delete()
+                GenerationUsage.objects.all().delete()
+
+                result = self.generate(blog_post)
+
+                self.assertEqual(result, ("Two call title", "Two call summary"))
+                self.assertEqual(GenerationUsage.objects.get().mode, "fallback")
+                self.assertEqual(
+                    SummaryCacheEntry.objects.get().summary, "Two call summary"
+                )
+
+
+@override_settings(COMBINED_GENERATION=True, METRICS_TOKEN="scrape-token")
+class MetricsTests(TestCase):
+    def setUp(self):
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir)
+        self.registry = MetricsRegistry()
+        mock.patch.object(metrics, "registry", self.registry).start()
+        mock.patch.object(views, "metrics_registry", self.registry).start()
+        self.load_transcript = mock.patch.object(
+            views,
+            "load_video_transcript",
+            return_value=StoredTranscript.from_snippets(
+                "dQw4w9WgXcQ", "en", snippets("the video")
+            ),
+        ).start()
+        mock.patch.multiple(
+            views,
+            get_generation_flight=mock.Mock(return_value=SingleFlight(lock_dir)),
+            prefetch_video_metadata=mock.Mock(return_value=done_future(None)),
+            get_llm_router=mock.Mock(
+                return_value=LLMRouter(
+                    [FakeProvider("fake", blog_post=CountingFakeLLM(delay=0))]
+                )
+            ),
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+        self.user = User.objects.create_user(username="alice")
+
+    def generate(self, video_id="dQw4w9WgXcQ"):
+        with self.assertLogs("blog_generator_app.metrics", "INFO") as logs:
+            try:
+                views.run_blog_generation(self.user, canonical_url(video_id))
+            except GenerationError:
+                pass
+        return json.loads(logs.records[-1].getMessage())
+
+    def scrape(self, **headers):
+        return self.client.get("/metrics", headers=headers)
+
+    def test_generation_records_its_spans(self):
+        logged = self.generate()
+
+        self.assertEqual(logged["trace"], "generate_blog")
+        self.assertEqual(logged["outcome"], "ok")
+        spans = {span["stage"]: span for span in logged["spans"]}
+        self.assertEqual(
+            list(spans),
+            [
+                "extract_id",
+                "cache_lookup",
+                "transcript",
+                "compaction",
+                "metadata",
+                "summary",
+                "db_write",
+            ],
+        )
+        self.assertEqual(spans["cache_lookup"]["cache_hit"], False)
+        self.assertEqual(spans["summary"]["mode"], "combined")
+        self.assertEqual(spans["summary"]["provider"], "fake:fake")
+        self.assertEqual(spans["summary"]["output_tokens"], 5)
+        self.assertEqual(
+            set(self.registry.percentiles()), set(spans) | {"generate_blog"}
+        )
+
+    def test_prometheus_endpoint_renders_the_spans(self):
+        self.generate()
+        self.load_transcript.return_value = None
+        self.assertEqual(self.generate("9bZkp7q5g8E")["outcome"], "error")
+
+        response = self.scrape(authorization="Bearer scrape-token")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        lines = response.content.decode().splitlines()
+        for line in (
+            "# TYPE blog_generation_stage_seconds histogram",
+            'blog_generation_stage_seconds_count{stage="generate_blog",outcome="ok"} 1',
+            'blog_generation_stage_seconds_count{stage="generate_blog",outcome="error"} 1',
+            'blog_generation_stage_seconds_bucket{stage="summary",outcome="ok",le="+Inf"} 1',
+            'blog_generation_stage_seconds_count{stage="transcript",outcome="error"} 1',
+            "# TYPE blog_generation_cache_lookups_total counter",
+            'blog_generation_cache_lookups_total{stage="cache_lookup",result="miss"} 2',
+            'blog_generation_output_tokens_total{stage="summary"} 5',
+        ):
+            self.assertIn(line, lines)
+
+    def test_prometheus_endpoint_needs_staff_or_the_token(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(authorization="Bearer wrong").status_code, 403)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.scrape().status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.scrape().status_code, 200)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.lock_dir)
+        self.flight = SingleFlight(self.lock_dir, poll_interval=0.01)
+
+    def generate_concurrently(self, llm, count=8):
+        transcript = StoredTranscript.from_snippets(
+            "dQw4w9WgXcQ", "en", snippets("the video")
+        )
+        with mock.patch.multiple(
+            views,
+            get_generation_flight=mock.Mock(return_value=self.flight),
+            get_cached_summary=mock.Mock(return_value=None),
+            load_video_transcript=mock.Mock(return_value=transcript),
+            prefetch_video_metadata=mock.Mock(return_value=done_future(None)),
+            get_llm_router=mock.Mock(
+                return_value=LLMRouter([FakeProvider("fake", blog_post=llm)])
+            ),
+            store_summary=mock.DEFAULT,
+            record_combined_usage=mock.DEFAULT,
+        ):
+            return run_concurrently(
+                lambda: views.generate_blog_content("dQw4w9WgXcQ"), count
+            )
+
+    def test_concurrent_generations_make_one_upstream_call(self):
+        llm = CountingFakeLLM()
+
+        results = self.generate_concurrently(llm)
+
+        self.assertEqual(llm.calls, 1)
+        self.assertEqual(results, [("Shared title", "Shared summary")] * 8)
+
+    def test_leader_error_reaches_every_waiter(self):
+        llm = CountingFakeLLM(error=GenerationError("Failed to generate blog content"))
+
+        def generate():
+            return self.flight.do("key", lambda: llm("the transcript"))
+
+        results = run_concurrently(generate, 6)
+
+        self.assertEqual(llm.calls, 1)
+        self.assertTrue(all(isinstance(r, GenerationError) for r in results))
+        # failures are not remembered, the next request tries again
+        with self.assertRaises(GenerationError):
+            generate()
+        self.assertEqual(llm.calls, 2)
+
+    def test_other_worker_result_is_picked_up_from_the_store(self):
+        # two SingleFlight instances stand in for two gunicorn workers
+        other_worker = SingleFlight(self.lock_dir, poll_interval=0.01)
+        store = {}
+        computing = threading.Event()
+        calls = []
+
+        def compute(name):
+            calls.append(name)
+            computing.set()
+            time.sleep(0.2)
+            store["key"] = f"summary by {name}"
+            return store["key"]
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            first = pool.submit(other_worker.do, "key", lambda: compute("first"))
+            computing.wait(1)
+            second = self.flight.do(
+                "key", lambda: compute("second"), lambda: store.get("key")
+            )
+
+        self.assertEqual(first.result(), "summary by first")
+        self.assertEqual(second, "summary by first")
+        self.assertEqual(calls, ["first"])
+
+    def test_waiter_computes_when_the_other_worker_failed(self):
+        other_worker = SingleFlight(self.lock_dir, poll_interval=0.01)
+        computing = threading.Event()
+
+        def failing():
+            computing.set()
+            time.sleep(0.1)
+            raise RuntimeError("LLM api down")
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            first = pool.submit(other_worker.do, "key", failing)
+            computing.wait(1)
+            second = self.flight.do("key", lambda: "fresh summary", lambda: None)
+
+        self.assertIsInstance(first.exception(), RuntimeError)
+        self.assertEqual(second, "fresh summary")
+
+
+@override_settings(
+    RATE_LIMIT_USER_PER_MINUTE=6,
+    RATE_LIMIT_USER_BURST=2,
+    RATE_LIMIT_GLOBAL_PER_MINUTE=600,
+    RATE_LIMIT_GLOBAL_BURST=100,
+    GENERATION_MAX_IN_FLIGHT=3,
+    GENERATION_RUN_IN_PROCESS=False,
+)
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        self.backend = InProcessBackend()
+        patcher = mock.patch.object(ratelimit, "get_backend", return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_as(self, username):
+        user, _ = User.objects.get_or_create(username=username)
+        self.client.force_login(user)
+        return self.client.post(
+            "/generate-blog",
+            data=json.dumps({"link": "https://www.youtube.com/watch?v=dQw4w9WgXcQ"}),
+            content_type="application/json",
+        )
+
+    def test_user_over_its_burst_gets_429_with_retry_after(self):
+        self.assertEqual(self.post_as("alice").status_code, 202)
+        self.assertEqual(self.post_as("alice").status_code, 202)
+
+        response = self.post_as("alice")
+        self.assertEqual(response.status_code, 429)
+        # one token every 10 seconds at 6 per minute
+        self.assertEqual(response["Retry-After"], "10")
+        # other users have their own bucket
+        self.assertEqual(self.post_as("bob").status_code, 202)
+
+    def test_generations_in_flight_are_capped_until_jobs_finish(self):
+        for username in ("alice", "bob", "carol"):
+            self.assertEqual(self.post_as(username).status_code, 202)
+
+        response = self.post_as("dave")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "10")
+
+        # a finished job gives its slot back
+        job = GenerationJob.objects.first()
+        process_job(job.id, mock.Mock(side_effect=GenerationError("nope")))
+        self.assertEqual(self.post_as("dave").status_code, 202)
+
+    def test_rejected_requests_take_no_tokens(self):
+        for username in ("alice", "bob", "carol"):
+            self.assertEqual(self.post_as(username).status_code, 202)
+
+        self.assertEqual(self.post_as("dave").status_code, 429)
+        dave = User.objects.get(username="dave")
+        tokens, _ = self.backend._state[f"user-{dave.pk}"]
+        self.assertEqual(tokens, 2)
+
+    def post_bulk_as(self, username, links):
+        user, _ = User.objects.get_or_create(username=username)
+        self.client.force_login(user)
+        return self.client.post(
+            "/generate-blog-bulk",
+            data=json.dumps({"links": links}),
+            content_type="application/json",
+        )
+
+    def test_bulk_requests_are_charged_per_video(self):
+        links = [canonical_url("dQw4w9WgXcQ"), canonical_url("9bZkp7q5g8E")]
+        response = self.post_bulk_as("alice", links)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(response.json()["jobs"]), 2)
+        self.assertEqual(self.post_as("alice").status_code, 429)
+
+        # bob has a token left after one video, not enough for two more
+        self.assertEqual(self.post_as("bob").status_code, 202)
+        links.append(canonical_url("kJQP7kiw5Fk"))
+        self.assertEqual(self.post_bulk_as("bob", links).status_code, 429)
+        self.assertFalse(
+            GenerationJob.objects.filter(user__username="bob", stage="bulk")
+        )
+        # the rejected bulk request gave its in-flight slot back
+        self.assertEqual(self.post_as("carol").status_code, 202)
+
+    def test_playlists_are_expanded_after_admission(self):
+        self.post_as("alice")
+        self.post_as("alice")
+
+        with mock.patch.object(bulk, "expand_playlist") as expand:
+            response = self.post_bulk_as(
+                "alice", ["https://www.youtube.com/playlist?list=PL123"]
+            )
+
+        self.assertEqual(response.status_code, 429)
+        expand.assert_not_called()
+
+
+class BulkRequestTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username="alice"))
+
+    def post(self, data):
+        return self.client.post(
+            "/generate-blog-bulk",
+            data=json.dumps(data),
+            content_type="application/json",
+        )
+
+    def test_malformed_links_are_rejected(self):
+        link = canonical_url("dQw4w9WgXcQ")
+        for data in (
+            {"links": link},
+            {"links": [link, 42]},
+            {"links": [link, None]},
+            {"links": {"a": link}},
+            {"playlist": ["https://www.youtube.com/playlist?list=PL123"]},
+            [link],
+            {},
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(self.post(data).status_code, 400)
+        self.assertFalse(GenerationJob.objects.exists())
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice")
+        self.client.force_login(self.user)
+
+    def create_posts(self, count, created_at=None):
+        posts = [
+            BlogPost.objects.create(
+                user=self.user,
+                youtube_title=f"Post {i}",
+                youtube_link=canonical_url("dQw4w9WgXcQ"),
+                generated_content="Content.",
+            )
+            for i in range(count)
+        ]
+        if created_at is not None:
+            BlogPost.objects.update(created_at=created_at)
+        return posts
+
+    def all_pages(self, page_size):
+        pages, cursor = [], None
+        while True:
+            posts, cursor = keyset_page(BlogPost.objects.all(), cursor, page_size)
+            pages.append([post.id for post in posts])
+            if cursor is None:
+                return pages
+
+    def test_posts_created_at_the_same_time_are_paged_by_id(self):
+        posts = self.create_posts(5, created_at=timezone.now())
+        self.create_posts(2)  # newer ones come first
+
+        pages = self.all_pages(page_size=2)
+
+        ids = [post_id for page in pages for post_id in page]
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(ids[2:], sorted((post.id for post in posts), reverse=True))
+
+    def test_last_page_has_no_cursor(self):
+        self.create_posts(4)
+
+        self.assertEqual([len(page) for page in self.all_pages(page_size=2)], [2, 2])
+        self.assertEqual([len(page) for page in self.all_pages(page_size=3)], [3, 1])
+        self.assertEqual(keyset_page(BlogPost.objects.none(), None, 2), ([], None))
+
+    def test_cursor_round_trips(self):
+        (post,) = self.create_posts(1)
+        self.assertEqual(decode_cursor(encode_cursor(post)), (post.created_at, post.id))
+
+    def test_malformed_cursors_are_rejected(self):
+        self.create_posts(3)
+        self.assertEqual(self.client.get("/blog-list").status_code, 200)
+
+        for cursor in ("not a cursor", "bm90IGEgY3Vyc29y", "MjAyNHxhYmM", "%%%"):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+                response = self.client.get("/blog-list", {"cursor": cursor})
+                self.assertEqual(response.status_code, 400)
+
+    def test_pages_link_to_the_next_one(self):
+        self.create_posts(3)
+        with override_settings(BLOG_LIST_PAGE_SIZE=2):
+            first = self.client.get("/blog-list").content.decode()
+            cursor = re.search(r"cursor=([\w-]+)", first).group(1)
+            last = self.client.get("/blog-list", {"cursor": cursor}).content.decode()
+
+        self.assertIn("Post 2", first)
+        self.assertNotIn("Post 0", first)
+        self.assertIn("Post 0", last)
+        self.assertNotIn("cursor=", last)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        caches["pages"].clear()
+        self.user = User.objects.create_user(username="alice")
+        self.client.force_login(self.user)
+        self.post = BlogPost.objects.create(
+            user=self.user,
+            youtube_title="First post",
+            youtube_link=canonical_url("dQw4w9WgXcQ"),
+            generated_content="The first summary.",
+        )
+        self.detail_url = f"/blog-details/{self.post.pk}"
+
+    def revalidate(self, url, response):
+        return self.client.get(url, headers={"if-none-match": response["ETag"]})
+
+    def test_unchanged_page_is_not_modified(self):
+        for url in ("/blog-list", self.detail_url):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first.status_code, 200)
+                self.assertEqual(first["Cache-Control"], "private, no-cache")
+
+                with mock.patch.object(views, "render_to_string") as render:
+                    again = self.revalidate(url, first)
+                render.assert_not_called()
+                self.assertEqual(again.status_code, 304)
+
+    def test_saving_a_post_invalidates_its_pages(self):
+        list_page = self.client.get("/blog-list")
+        detail_page = self.client.get(self.detail_url)
+
+        self.post.youtube_title = "Renamed post"
+        self.post.generated_content = "The new summary."
+        self.post.save()
+
+        for url, before in (("/blog-list", list_page), (self.detail_url, detail_page)):
+            with self.subTest(url=url):
+                after = self.revalidate(url, before)
+                self.assertEqual(after.status_code, 200)
+                self.assertNotEqual(after["ETag"], before["ETag"])
+                self.assertContains(after, "Renamed post")
+
+    def test_new_and_deleted_posts_invalidate_the_list(self):
+        before = self.client.get("/blog-list")
+        other = BlogPost.objects.create(
+            user=self.user,
+            youtube_title="Second post",
+            youtube_link=canonical_url("9bZkp7q5g8E"),
+            generated_content="The second summary.",
+        )
+        self.assertContains(self.revalidate("/blog-list", before), "Second post")
+
+        detail_page = self.client.get(self.detail_url)
+        self.post.delete()
+        self.assertRedirects(
+            self.client.get(self.detail_url), "/", fetch_redirect_response=False
+        )
+        self.assertRedirects(
+            self.revalidate(self.detail_url, detail_page),
+            "/",
+            fetch_redirect_response=False,
+        )
+        after = self.client.get("/blog-list")
+        self.assertNotContains(after, "First post")
+        self.assertContains(after, other.youtube_title)
+
+    def test_pages_are_cached_per_user(self):
+        self.client.get(self.detail_url)
+
+        self.client.force_login(User.objects.create_user(username="bob"))
+        self.assertRedirects(
+            self.client.get(self.detail_url), "/", fetch_redirect_response=False
+        )
+        self.assertNotContains(self.client.get("/blog-list"), "First post")
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice")
+        self.client.force_login(self.user)
+
+    def post(self, title, content, video_id="dQw4w9WgXcQ", user=None):
+        return BlogPost.objects.create(
+            user=user or self.user,
+            youtube_title=title,
+            youtube_link=canonical_url(video_id),
+            generated_content=content,
+        )
+
+    def search(self, query, **params):
+        return self.client.get("/search", {"q": query, **params})
+
+    def found(self, query):
+        return [result["id"] for result in search_posts(self.user, query)]
+
+    def test_saved_posts_are_indexed_until_deleted(self):
+        post = self.post("Sourdough basics", "How to feed a starter.")
+        self.assertEqual(self.found("sourdough"), [post.id])
+
+        post.youtube_title = "Rye bread basics"
+        post.save()
+        self.assertEqual(self.found("sourdough"), [])
+        self.assertEqual(self.found("rye"), [post.id])
+
+        post.delete()
+        self.assertEqual(self.found("rye"), [])
+
+    def test_transcript_of_the_video_is_indexed(self):
+        save_transcript("9bZkp7q5g8E", "en", False, snippets("gangnam style"))
+        post = self.post("A dance video", "Lots of dancing.", video_id="9bZkp7q5g8E")
+
+        self.assertEqual(self.found("gangnam"), [post.id])
+
+    def test_title_matches_rank_above_content_matches(self):
+        in_content = self.post("Kitchen tips", "Knead the dough for ten minutes.")
+        in_title = self.post("Dough hydration", "Water and flour ratios.")
+        # bm25 gives no weight to words found in most of the posts
+        for topic in ("Garden", "Guitar", "Camping", "Chess"):
+            self.post(f"{topic} tips", "Practice every day.")
+
+        results = search_posts(self.user, "dough")
+
+        self.assertEqual([r["id"] for r in results], [in_title.id, in_content.id])
+        self.assertGreater(results[0]["rank"], results[1]["rank"])
+
+    def test_matches_are_highlighted_in_escaped_html(self):
+        self.post("Bread <script>", "Knead the dough, then bake it at 250 <b>°C</b>.")
+
+        (result,) = search_posts(self.user, "bread")
+        self.assertEqual(result["title_highlight"], "<mark>Bread</mark> &lt;script&gt;")
+
+        # the snippet comes from the column that matched
+        (result,) = search_posts(self.user, "bake")
+        self.assertEqual(result["title_highlight"], "Bread &lt;script&gt;")
+        self.assertIn("then <mark>bake</mark> it at 250 &lt;b&gt;", result["snippet"])
+
+    def test_last_word_is_matched_as_a_prefix(self):
+        post = self.post("Sourdough basics", "How to feed a starter.")
+        self.assertEqual(self.found("sourd"), [post.id])
+        self.assertEqual(self.found("' OR \"*"), [])
+
+    def test_only_own_posts_are_found(self):
+        bob = User.objects.create_user(username="bob")
+        self.post("Sourdough basics", "How to feed a starter.", user=bob)
+
+        response = self.search("sourdough")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [])
+
+    def test_limit_is_clamped(self):
+        for i in range(3):
+            self.post(f"Sourdough part {i}", "How to feed a starter.")
+
+        self.assertEqual(len(self.search("sourdough", limit=0).json()["results"]), 1)
+        self.assertEqual(len(self.search("sourdough", limit=-5).json()["results"]), 1)
+        self.assertEqual(len(self.search("sourdough", limit=2).json()["results"]), 2)
+        self.assertEqual(self.search("sourdough", limit="many").status_code, 400)
+
+
+@override_settings(GENERATION_RUN_IN_PROCESS=False)
+class GenerationJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice")
+        self.client.force_login(self.user)
+        patcher = mock.patch.object(
+            ratelimit, "get_backend", return_value=InProcessBackend()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def submit(self):
+        response = self.client.post(
+            "/generate-blog",
+            data=json.dumps({"link": "https://www.youtube.com/watch?v=dQw4w9WgXcQ"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 202)
+        return response.json()["job_id"]
+
+    def test_job_is_polled_until_its_result_is_ready(self):
+        job_id = self.submit()
+
+        status = self.client.get(f"/job-status/{job_id}").json()
+        self.assertEqual((status["status"], status["stage"]), ("queued", "queued"))
+        self.assertEqual(self.client.get(f"/job-result/{job_id}").status_code, 202)
+
+        def runner(user, yt_link, progress):
+            progress("summarizing")
+            self.assertEqual(
+                self.client.get(f"/job-status/{job_id}").json()["stage"],
+                "summarizing",
+            )
+            return BlogPost.objects.create(
+                user=user,
+                youtube_title="A title",
+                youtube_link=yt_link,
+                generated_content="The summary.",
+            )
+
+        self.assertTrue(process_job(job_id, runner))
+
+        self.assertEqual(
+            self.client.get(f"/job-status/{job_id}").json()["status"], "done"
+        )
+        result = self.client.get(f"/job-result/{job_id}")
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.json(), {"title": "A title", "content": "The summary."})
+
+    def test_failed_job_returns_its_error(self):
+        job_id = self.submit()
+
+        process_job(job_id, mock.Mock(side_effect=GenerationError("No transcript")))
+
+        result = self.client.get(f"/job-result/{job_id}")
+        self.assertEqual(result.status_code, 500)
+        self.assertEqual(result.json()["content"], "No transcript")
+
+    def test_other_users_jobs_are_not_found(self):
+        job_id = self.submit()
+
+        self.client.force_login(User.objects.create_user(username="mallory"))
+        self.assertEqual(self.client.get(f"/job-status/{job_id}").status_code, 404)
+        self.assertEqual(self.client.get(f"/job-result/{job_id}").status_code, 404)
+
+    def test_jobs_of_a_dead_worker_are_queued_again(self):
+        stale = timezone.now() - timedelta(hours=1)
+        running = [
+            GenerationJob.objects.create(
+                user=self.user,
+                youtube_link="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                status=GenerationJob.RUNNING,
+                started_at=started_at,
+                attempts=attempts,
+            )
+            for started_at, attempts in [
+                (stale, 1),  # worker died
+                (stale, 3),  # died on every attempt
+                (timezone.now(), 1),  # still working on it
+            ]
+        ]
+
+        self.assertEqual(reclaim_stale_jobs(stale_after=600, max_attempts=3), (1, 1))
+
+        for job in running:
+            job.refresh_from_db()
+        self.assertEqual(
+            [job.status for job in running], ["queued", "failed", "running"]
+        )
+        self.assertTrue(process_job(running[0].id, mock.Mock(return_value=None)))
+        running[0].refresh_from_db()
+        self.assertEqual(running[0].attempts, 2)
+
+    def test_bulk_items_and_jobs_with_a_heartbeat_are_not_reclaimed(self):
+        long_ago = timezone.now() - timedelta(hours=2)
+        for stage, heartbeat_at in [
+            ("summarizing", timezone.now()),  # slow, but its worker is alive
+            ("bulk", None),  # reported by its bulk task
+        ]:
+            GenerationJob.objects.create(
+                user=self.user,
+                youtube_link="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                status=GenerationJob.RUNNING,
+                stage=stage,
+                started_at=long_ago,
+                heartbeat_at=heartbeat_at,
+                attempts=1,
+            )
+
+        self.assertEqual(reclaim_stale_jobs(stale_after=600), (0, 0))
+        self.assertEqual(
+            GenerationJob.objects.filter(status=GenerationJob.RUNNING).count(), 2
+        )
+
+
+@override_settings(GENERATION_RUN_IN_PROCESS=False)
+class JobHeartbeatTests(TransactionTestCase):
+    def test_job_running_longer_than_the_stale_time_is_not_reclaimed(self):
+        job = GenerationJob.objects.create(
+            user=User.objects.create_user(username="alice"),
+            youtube_link="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        )
+        reclaimed = []
+
+        def slow_runner(user, yt_link, progress):
+            # outlives stale_after, the heartbeat keeps it from being requeued
+            for _ in range(4):
+                time.sleep(0.1)
+                reclaimed.append(reclaim_stale_jobs(stale_after=0.15))
+            return None
+
+        with override_settings(GENERATION_JOB_HEARTBEAT_SECONDS=0.02), mock.patch(
+            "blog_generator_app.jobs.release_generation"
+        ):
+            self.assertTrue(process_job(job.id, slow_runner))
+
+        job.refresh_from_db()
+        self.assertEqual(reclaimed, [(0, 0)] * 4)
+        self.assertEqual((job.status, job.attempts), (GenerationJob.DONE, 1))
+
+
+class ClientRegistryTests(SimpleTestCase):
+    def test_clients_are_created_once_per_process(self):
+        registry = ClientRegistry()
+        first = registry.get("client", object)
+        self.assertIs(registry.get("client", object), first)
+        registry.stats_for("client").record_request()
+
+        # a forked worker must not reuse the sockets of its parent
+        with mock.patch("blog_generator_app.clients.os.getpid", return_value=-1):
+            second = registry.get("client", object)
+        self.assertIsNot(second, first)
+        self.assertEqual(registry.stats, {})
+
+    @skipUnless(hasattr(os, "fork"), "needs os.fork")
+    def test_fork_resets_the_shared_registry(self):
+        client = clients.registry.get("fork_test", object)
+        self.addCleanup(clients.registry._clients.pop, "fork_test", None)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # the child reports whether the inherited client is gone
+            dropped = clients.registry._clients.get("fork_test") is None
+            os.write(write_fd, b"1" if dropped else b"0")
+            os._exit(0)
+
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+        with os.fdopen(read_fd, "rb") as pipe:
+            self.assertEqual(pipe.read(), b"1")
+        self.assertIs(clients.registry.get("fork_test", object), client)
+
+
+class AdaptiveLimiterTests(SimpleTestCase):
+    def test_throttling_halves_the_limit_and_successes_grow_it_back(self):
+        limiter = AdaptiveLimiter(8)
+        limiter.throttled()
+        limiter.throttled()  # same burst, only counted once
+        self.assertEqual(limiter.as_dict()["limit"], 4)
+
+        for _ in range(40):
+            with limiter.slot():
+                pass
+        self.assertEqual(limiter.as_dict()["limit"], 8)
+
+    def test_calls_over_the_limit_wait_for_a_slot(self):
+        limiter = AdaptiveLimiter(2)
+        limiter.throttled()
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+        limiter.release(succeeded=True)
+        self.assertTrue(limiter.try_acquire())
+
+
+class AudioCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content, age=0):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def test_identical_audio_is_stored_once(self):
+        cache = AudioCache(self.directory, max_bytes=10_000)
+        first = self.write("aaaaaaaaaaa.webm", b"x" * 100)
+        cache.add(first)
+        second = self.write("bbbbbbbbbbb.webm", b"x" * 100)
+        cache.add(second)
+
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertEqual(cache.find("bbbbbbbbbbb"), second)
+
+    def test_least_recently_used_files_are_evicted_first(self):
+        cache = AudioCache(self.directory, max_bytes=300)
+        self.write("busy.webm", b"1" * 100, age=400)
+        self.write("used.webm", b"2" * 100, age=300)
+        self.write("old.webm", b"3" * 100, age=200)
+        cache.find("used")  # touched, now the most recent
+
+        with cache.using("busy"):
+            cache.add(self.write("new.webm", b"4" * 100))
+
+        self.assertIsNone(cache.find("old"))
+        self.assertIsNotNone(cache.find("busy"))
+        self.assertIsNotNone(cache.find("used"))
+        self.assertIsNotNone(cache.find("new"))
+
+    def test_growing_file_is_read_until_the_download_is_over(self):
+        path = os.path.join(self.directory, "video.webm")
+        download = mock.Mock(path=path, error=None)
+        download.started = threading.Event()
+        download.done = threading.Event()
+
+        def write_slowly():
+            download.started.set()
+            with open(path + ".part", "wb") as f:
+                for i in range(5):
+                    f.write(bytes([i]) * 10)
+                    f.flush()
+                    time.sleep(0.02)
+            os.replace(path + ".part", path)
+            download.done.set()
+
+        threading.Thread(target=write_slowly).start()
+        reader = GrowingFileReader(download, poll_interval=0.005)
+        data = b"".join(reader)
+        reader.close()
+
+        self.assertEqual(data, b"".join(bytes([i]) * 10 for i in range(5)))
+
+
+class LLMRouterTests(SimpleTestCase):
+    def test_failing_provider_fails_over_to_the_next(self):
+        broken = FakeProvider("broken", title=mock.Mock(side_effect=RuntimeError))
+        working = FakeProvider("working", title=slow_answer(0, "A title"))
+        router = LLMRouter([broken, working])
+
+        title, provider = router.call("title", "the summary")
+
+        self.assertEqual((title, provider), ("A title", working))
+        self.assertEqual(router.health[broken.name].error_rate(), 1.0)
+
+    def test_fastest_provider_is_picked_once_measured(self):
+        slow = FakeProvider("slow", title=slow_answer(0.05, "slow"))
+        fast = FakeProvider("fast", title=slow_answer(0.01, "fast"))
+        router = LLMRouter([slow, fast])
+        router.health[slow.name].record_success("title", 0.05)
+        router.health[fast.name].record_success("title", 0.01)
+
+        self.assertEqual(router.call("title", "the summary")[0], "fast")
+
+    def test_slow_call_is_hedged_to_the_next_provider(self):
+        stuck = FakeProvider("stuck", title=slow_answer(1, "late"))
+        spare = FakeProvider("spare", title=slow_answer(0, "early"))
+        router = LLMRouter([stuck, spare], hedge=True)
+        for _ in range(5):
+            router.health[stuck.name].record_success("title", 0.02)
+        router.health[spare.name].record_success("title", 0.5)
+
+        started = time.monotonic()
+        self.assertEqual(router.call("title", "the summary")[0], "early")
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_timeouts_count_as_failures(self):
+        stuck = FakeProvider("stuck", timeout=0.05, title=slow_answer(1, "late"))
+        router = LLMRouter([stuck])
+
+        with self.assertRaises(ProviderError):
+            router.call("title", "the summary")
+        self.assertEqual(router.health[stuck.name].error_rate(), 1.0)
+
+    def test_stream_fails_over_until_text_was_sent(self):
+        def breaks_after(sent):
+            def stream(prompt, max_tokens):
+                yield from sent
+                raise RuntimeError("connection reset")
+
+            return stream
+
+        working = FakeProvider("working", stream=fake_stream([]))
+        router = LLMRouter([FakeProvider("broken", stream=breaks_after([])), working])
+        texts = []
+
+        title, provider = router.stream("title", texts.append, "the summary")
+
+        self.assertEqual((title, provider), ("A short title", working))
+        self.assertEqual(texts, ["A ", "short ", "title"])
+
+        # half an answer was sent already, it can't be taken back
+        router = LLMRouter(
+            [FakeProvider("broken", stream=breaks_after(["A "])), working]
+        )
+        with self.assertRaises(ProviderError):
+            router.stream("title", texts.append, "the summary")
+
+    def test_timed_out_call_gives_back_its_upstream_slot(self):
+        limiter = AdaptiveLimiter(1)
+        answered = threading.Event()
+
+        def stuck_title(summary):
+            with limiter.slot():
+                time.sleep(0.3)
+            answered.set()
+            return "late"
+
+        stuck = FakeProvider("stuck", timeout=0.05, title=stuck_title)
+        with self.assertRaises(ProviderError):
+            LLMRouter([stuck]).call("title", "the summary")
+
+        # still running, but its slot is free for the calls we wait for
+        self.assertFalse(answered.is_set())
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertTrue(answered.wait(1))
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_call_abandoned_while_waiting_for_a_slot_never_goes_out(self):
+        limiter = AdaptiveLimiter(1)
+        limiter.acquire()
+        sent = []
+
+        def queued_title(summary):
+            with limiter.slot():
+                sent.append(summary)
+            return "late"
+
+        queued = FakeProvider("queued", timeout=0.05, title=queued_title)
+        with self.assertRaises(ProviderError):
+            LLMRouter([queued]).call("title", "the summary")
+        limiter.release(succeeded=True)
+
+        time.sleep(0.1)
+        self.assertEqual(sent, [])
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_async_call_fails_over_and_cancels_the_timed_out_call(self):
+        limiter = AdaptiveLimiter(1)
+        cancelled = []
+
+        async def stuck_title(summary):
+            async with limiter.aslot():
+                try:
+                    await asyncio.sleep(1)
+                except asyncio.CancelledError:
+                    cancelled.append(summary)
+                    raise
+            return "late"
+
+        async def working_title(summary):
+            async with limiter.aslot():
+                return "A title"
+
+        stuck = FakeProvider("stuck", timeout=0.05, atitle=stuck_title)
+        working = FakeProvider("working", atitle=working_title)
+        router = LLMRouter([stuck, working])
+
+        title, provider = async_to_sync(router.acall)("title", "the summary")
+
+        # the stuck call gave its slot back to the one that answered
+        self.assertEqual((title, provider), ("A title", working))
+        self.assertEqual(cancelled, ["the summary"])
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(router.health[stuck.name].error_rate(), 1.0)
+
+    def test_async_slow_call_is_hedged_to_the_next_provider(self):
+        async def late(summary):
+            await asyncio.sleep(1)
+            return "late"
+
+        async def early(summary):
+            return "early"
+
+        stuck = FakeProvider("stuck", atitle=late)
+        spare = FakeProvider("spare", atitle=early)
+        router = LLMRouter([stuck, spare], hedge=True)
+        for _ in range(5):
+            router.health[stuck.name].record_success("title", 0.02)
+        router.health[spare.name].record_success("title", 0.5)
+
+        started = time.monotonic()
+        self.assertEqual(
+            async_to_sync(router.acall)("title", "the summary")[0], "early"
+        )
+        self.assertLess(time.monotonic() - started, 0.5)
+
+
+@override_settings(COMBINED_GENERATION=True)
+class AsyncGenerationTests(TransactionTestCase):
+    link = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", password="secret")
+        self.client.force_login(self.user)
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir)
+        mock.patch.object(
+            ratelimit, "get_backend", return_value=InProcessBackend()
+        ).start()
+        mock.patch.object(
+            views, "prefetch_video_metadata", return_value=done_future(None)
+        ).start()
+        mock.patch.object(
+            views,
+            "load_video_transcript",
+            return_value=StoredTranscript.from_snippets(
+                "dQw4w9WgXcQ", "en", snippets("the transcript")
+            ),
+        ).start()
+        self.llm = CountingFakeLLM(delay=0)
+        broken = FakeProvider("broken", blog_post=mock.Mock(side_effect=RuntimeError))
+        mock.patch.object(
+            views,
+            "get_llm_router",
+            return_value=LLMRouter(
+                [broken, FakeProvider("working", blog_post=self.llm)]
+            ),
+        ).start()
+        mock.patch.object(
+            views, "get_generation_flight", return_value=SingleFlight(lock_dir)
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_async_view_fails_over_and_shares_the_cache_of_the_job_path(self):
+        response = self.client.post(
+            "/generate-blog-async",
+            data=json.dumps({"link": self.link}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"title": "Shared title", "content": "Shared summary"}
+        )
+        self.assertEqual(GenerationUsage.objects.get().model, "working")
+
+        post = views.run_blog_generation(self.user, self.link)
+
+        self.assertEqual(post.youtube_title, "Shared title")
+        self.assertEqual(self.llm.calls, 1)
+        self.assertEqual(SummaryCacheEntry.objects.count(), 1)
+
+    def test_concurrent_async_generations_share_one_llm_call(self):
+        self.llm.delay = 0.2
+
+        async def generate_twice():
+            return await asyncio.gather(
+                views.arun_blog_generation(self.user, self.link),
+                views.arun_blog_generation(self.user, self.link),
+            )
+
+        posts = async_to_sync(generate_twice)()
+
+        self.assertEqual([post.youtube_title for post in posts], ["Shared title"] * 2)
+        self.assertEqual(self.llm.calls, 1)
+
+    def test_async_two_call_path_summarizes_on_the_event_loop(self):
+        async def summary(transcript):
+            return "Async summary"
+
+        async def title(summary):
+            return "Async title"
+
+        router = LLMRouter([FakeProvider("async", asummary=summary, atitle=title)])
+        with override_settings(COMBINED_GENERATION=False), mock.patch.object(
+            views, "get_llm_router", return_value=router
+        ):
+            post = async_to_sync(views.arun_blog_generation)(self.user, self.link)
+
+        self.assertEqual(
+            (post.youtube_title, post.generated_content),
+            ("Async title", "Async summary"),
+        )
+        self.assertEqual(GenerationUsage.objects.get().mode, GenerationUsage.TWO_CALL)
+
+
+class VideoMetadataTests(TestCase):
+    def setUp(self):
+        self.resolver = mock.Mock()
+        mock.patch.object(
+            views, "get_transcript_resolver", return_value=self.resolver
+        ).start()
+        mock.patch.object(
+            ratelimit, "get_backend", return_value=InProcessBackend()
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_miss_of_every_source_is_cached(self):
+        self.resolver.resolve_with_outcome.return_value = (None, True)
+
+        self.assertIsNone(views.load_video_transcript("dQw4w9WgXcQ"))
+        self.assertIsNone(views.load_video_transcript("dQw4w9WgXcQ"))
+
+        self.assertEqual(self.resolver.resolve_with_outcome.call_count, 1)
+        metadata = VideoMetadata.objects.get(video_id="dQw4w9WgXcQ")
+        self.assertGreater(metadata.no_transcript_until, timezone.now())
+
+    def test_source_errors_are_not_cached(self):
+        self.resolver.resolve_with_outcome.return_value = (None, False)
+
+        views.load_video_transcript("dQw4w9WgXcQ")
+        views.load_video_transcript("dQw4w9WgXcQ")
+
+        self.assertEqual(self.resolver.resolve_with_outcome.call_count, 2)
+        self.assertFalse(VideoMetadata.objects.exists())
+
+    def test_caption_sources_are_skipped_without_captions(self):
+        VideoMetadata.objects.create(
+            video_id="dQw4w9WgXcQ",
+            title="No captions",
+            caption_languages=["fr"],
+            checked_at=timezone.now(),
+        )
+        self.resolver.resolve_with_outcome.return_value = (
+            TranscriptResult("assemblyai", "en", False, snippets("speech")),
+            False,
+        )
+
+        transcript = views.load_video_transcript("dQw4w9WgXcQ")
+
+        self.assertEqual(transcript.snippet_texts(), ["speech says hi"])
+        self.resolver.resolve_with_outcome.assert_called_once_with(
+            "dQw4w9WgXcQ", views.CAPTION_SOURCES
+        )
+
+    def test_known_missing_transcript_is_rejected_before_admission(self):
+        VideoMetadata.objects.create(
+            video_id="dQw4w9WgXcQ",
+            no_transcript_until=timezone.now() + timedelta(hours=1),
+            checked_at=timezone.now(),
+        )
+        self.client.force_login(User.objects.create_user(username="tester"))
+
+        with mock.patch.object(views, "admit_generation") as admit:
+            response = self.client.post(
+                "/generate-blog",
+                data=json.dumps({"link": "https://youtu.be/dQw4w9WgXcQ"}),
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, 422)
+        admit.assert_not_called()
+
+
+ID_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-"
+
+
+def random_video_link(rng, video_id):
+    """One of the many links youtube and its users write for a video"""
+    scheme = rng.choice(["https://", "http://", "//", ""])
+    host = rng.choice(["www.", "m.", "music.", ""]) + "youtube.com"
+    params = rng.sample(["feature=share", "t=42s", "list=PLx", "si=AbC", "pp=yg"], 2)
+    query = "&".join(params[: rng.randrange(3)])
+    link = rng.choice(
+        [
+            f"{scheme}{host}/watch?v={video_id}&{query}",
+            f"{scheme}{host}/watch?{query}&v={video_id}",
+            f"{scheme}{host}/shorts/{video_id}?{query}",
+            f"{scheme}{host}/live/{video_id}?{query}",
+            f"{scheme}{host}/embed/{video_id}?{query}",
+            f"{scheme}www.youtube-nocookie.com/embed/{video_id}?{query}",
+            f"{scheme}youtu.be/{video_id}?{query}",
+            f"{scheme}{host}/watch?v={video_id}#t=1m2s",
+        ]
+    )
+    return rng.choice([link, link.rstrip("?&"), f"  {link}  "])
+
+
+class VideoUrlTests(SimpleTestCase):
+    def setUp(self):
+        self.rng = random.Random(0)
+
+    def random_id(self, length=11):
+        return "".join(self.rng.choice(ID_CHARS) for _ in range(length))
+
+    def test_every_link_form_gives_the_id(self):
+        for _ in range(2000):
+            video_id = self.random_id()
+            link = random_video_link(self.rng, video_id)
+
+            self.assertEqual(extract_video_id(link), video_id, link)
+            self.assertEqual(normalize_url(link), canonical_url(video_id))
+
+    def test_canonical_url_round_trips(self):
+        for _ in range(200):
+            video_id = self.random_id()
+            self.assertEqual(extract_video_id(canonical_url(video_id)), video_id)
+            self.assertEqual(extract_video_id(video_id), video_id)
+
+    def test_ids_of_the_wrong_length_are_rejected(self):
+        for _ in range(500):
+            video_id = self.random_id(self.rng.choice([1, 10, 12, 20]))
+            link = random_video_link(self.rng, video_id)
+
+            self.assertIsNone(extract_video_id(link), link)
+
+    def test_other_links_are_rejected(self):
+        for link in [
+            "",
+            "https://vimeo.com/watch?v=dQw4w9WgXcQ",
+            "https://www.youtube.com/playlist?list=PLrAXtmErZgOei",
+            "https://www.youtube.com/channel/UC38IQsAvIsxxjztdMZQtwHA",
+            "https://www.youtube.com/watch?xv=dQw4w9WgXcQ",
+            "https://notyoutube.com/watch?v=dQw4w9WgXcQ",
+            "dQw4w9WgXcQ and more",
+        ]:
+            self.assertIsNone(extract_video_id(link), link)
+
+
+class DerivationTests(TestCase):
+    def setUp(self):
+        self.prompts = []
+        self.summary = "The summary of the video."
+
+        def complete(prompt, max_tokens):
+            self.prompts.append(prompt)
+            return f"output {len(self.prompts)}"
+
+        self.router = LLMRouter([FakeProvider("fake", complete=complete)])
+        self.transcript = StoredTranscript.from_snippets(
+            "dQw4w9WgXcQ",
+            "en",
+            [
+                Snippet(text="welcome to the show", start=0.0, duration=2.0),
+                Snippet(text="[Music]", start=30.0, duration=2.0),
+                Snippet(text="now the second topic", start=75.0, duration=2.0),
+            ],
+        )
+
+    def derive(self, names):
+        return derive_formats(
+            "dQw4w9WgXcQ",
+            names,
+            lambda video_id: ("A title", self.summary),
+            lambda video_id: self.transcript,
+            self.router,
+        )
+
+    def test_outputs_are_derived_once_from_the_summary(self):
+        contents, regenerated = self.derive(["title", "tldr", "notes"])
+
+        self.assertEqual(regenerated, ["tldr", "notes"])
+        self.assertEqual(contents["title"], "A title")
+        self.assertTrue(all(self.summary in prompt for prompt in self.prompts))
+
+        again, regenerated = self.derive(["tldr", "notes"])
+        self.assertEqual(regenerated, [])
+        self.assertEqual(again, {"tldr": contents["tldr"], "notes": contents["notes"]})
+        self.assertEqual(len(self.prompts), 2)
+
+    def test_prompt_version_bump_only_redoes_that_format(self):
+        self.derive(["tldr", "notes"])
+
+        bumped = derivations.FORMATS["tldr"]._replace(version=2)
+        with mock.patch.dict(derivations.FORMATS, {"tldr": bumped}):
+            _, regenerated = self.derive(["tldr", "notes"])
+
+        self.assertEqual(regenerated, ["tldr"])
+
+    def test_new_summary_makes_outputs_stale(self):
+        self.derive(["tldr"])
+        self.summary = "A better summary."
+
+        contents, regenerated = self.derive(["tldr"])
+
+        self.assertEqual(regenerated, ["tldr"])
+        self.assertEqual(contents["tldr"], "output 2")
+
+    def test_chapters_are_derived_from_the_timed_transcript(self):
+        contents, _ = self.derive(["chapters"])
+
+        # too short for more than one chapter, annotations are left out
+        self.assertEqual(len(self.prompts), 1)
+        self.assertIn("welcome to the show now the second topic", self.prompts[0])
+        self.assertEqual(
+            contents["chapters"],
+            "[00:00](https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=0s) **output 1**",
+        )
+
+
+def topic_transcript(topics, seconds_per_topic, pause_at=None, seed=0):
+    """
+    Transcript talking about each word list in turn for seconds_per_topic,
+    with a silence of 10 seconds before pause_at. Returns it and the
+    times the topic changes.
+    """
+    rng = random.Random(seed)
+    filler = "so then we also just need to see how this goes".split()
+    snippets, changes = [], []
+    start = 0.0
+    for index, words in enumerate(topics):
+        if index:
+            changes.append(start)
+        topic_end = start + seconds_per_topic
+        while start < topic_end:
+            if pause_at is not None and start <= pause_at < start + 3:
+                start += 10
+            text = " ".join(
+                rng.choice(words) if rng.random() < 0.35 else rng.choice(filler)
+                for _ in range(8)
+            )
+            snippets.append(Snippet(text=text, start=start, duration=3.0))
+            start += 3.0 + rng.uniform(0, 0.3)
+    return StoredTranscript.from_snippets("dQw4w9WgXcQ", "en", snippets), changes
+
+
+TOPICS = [
+    "python function variable loop list dictionary class module".split(),
+    "garden tomato soil water seeds plant compost sunlight".split(),
+    "guitar chord string melody rhythm strum tuning song".split(),
+    "bread flour yeast oven dough knead crust bake".split(),
+]
+
+
+class ChapterTests(SimpleTestCase):
+    def test_chapters_start_where_the_topic_changes(self):
+        transcript, changes = topic_transcript(TOPICS, 300)
+
+        chapters = segment_transcript(transcript)
+
+        self.assertEqual(len(chapters), len(TOPICS))
+        for chapter, change in zip(chapters[1:], changes):
+            self.assertAlmostEqual(chapter.start, change, delta=30)
+        self.assertEqual(chapters[0].first, 0)
+        self.assertEqual(chapters[-1].stop, len(transcript.starts))
+        for before, after in zip(chapters, chapters[1:]):
+            self.assertEqual(before.stop, after.first)
+            self.assertEqual(before.end, after.start)
+
+    def test_long_pause_starts_a_chapter(self):
+        transcript, _ = topic_transcript(TOPICS[:1], 600, pause_at=300)
+
+        chapters = segment_transcript(transcript)
+
+        self.assertEqual(len(chapters), 2)
+        self.assertAlmostEqual(chapters[1].start, 310, delta=5)
+
+    def test_short_transcript_is_one_chapter(self):
+        transcript, _ = topic_transcript(TOPICS[:2], 60)
+
+        self.assertEqual(len(segment_transcript(transcript)), 1)
+
+    @override_settings(CHAPTER_MIN_SECONDS=400)
+    def test_chapters_are_at_least_the_minimum_length(self):
+        transcript, _ = topic_transcript(TOPICS, 300)
+
+        chapters = segment_transcript(transcript)
+
+        self.assertLess(len(chapters), len(TOPICS))
+        self.assertTrue(
+            all(
+                after.start - before.start >= 400
+                for before, after in zip(chapters, chapters[1:])
+            )
+        )
+
+    def test_chapters_are_summarized_with_timestamps(self):
+        transcript, _ = topic_transcript(TOPICS[:2], 300)
+        prompts = []
+
+        def complete(prompt):
+            prompts.append(prompt)
+            topic = "Gardening" if "tomato" in prompt else "Python"
+            return f"## {topic}\nAll about {topic.lower()}."
+
+        chapters = summarize_chapters(transcript, complete)
+        rendered = render_chapters(transcript, chapters)
+
+        self.assertEqual(len(prompts), 2)
+        self.assertEqual([item.title for item in chapters], ["Python", "Gardening"])
+        start = int(chapters[1].chapter.start)
+        self.assertEqual(
+            rendered,
+            "[00:00](https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=0s) **Python**\n"
+            "All about python.\n\n"
+            f"[{start // 60:02d}:{start % 60:02d}]"
+            f"(https://www.youtube.com/watch?v=dQw4w9WgXcQ&t={start}s) **Gardening**\n"
+            "All about gardening.",
+        )
+
+    def test_chapter_answers_are_parsed(self):
+        self.assertEqual(
+            parse_chapter("**Title:** Setup\n\nFirst line.\nSecond line."),
+            ("Setup", "First line. Second line."),
+        )
+        self.assertEqual(format_timestamp(3725.9), "1:02:05")
+        with self.assertRaises(ValueError):
+            parse_chapter("  \n")
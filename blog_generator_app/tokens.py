@@ -0,0 +1,37 @@
+import math
+
+try:
+    import tiktoken
+except ImportError:  # in requirements.txt, only missing in stripped down setups
+    tiktoken = None
+
+
+# rough average for english text with the gpt/claude tokenizers, the token
+# budgets (SUMMARY_CHUNK_TOKENS, TRANSCRIPT_TOKEN_BUDGET) are only this
+# estimate when tiktoken isn't installed
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+
+
+def _get_encoding():
+    # the first call loads the encoding file, from TIKTOKEN_CACHE_DIR if set
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    return _encoding
+
+
+def count_tokens(text):
+    """
+    Count tokens with tiktoken (o200k_base), or estimate them as
+    len(text) / CHARS_PER_TOKEN when it isn't installed.
+
+    The counts are exact for the OpenAI models and an approximation for
+    claude, the budgets stay well under both context windows.
+    """
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_get_encoding().encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
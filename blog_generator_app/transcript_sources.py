@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# what every source returns, same attributes as youtube_transcript_api snippets
+Snippet = namedtuple("Snippet", ["text", "start", "duration"])
+TranscriptResult = namedtuple(
+    "TranscriptResult", ["source", "language", "is_generated", "snippets"]
+)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a source after repeated failures.
+
+    After failure_threshold consecutive errors or timeouts the breaker
+    opens and the source is skipped. Once reset_timeout seconds have
+    passed a single trial call is let through (half-open), its outcome
+    closes or re-opens the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=60.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if self.clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+
+
+class TranscriptSource:
+    """
+    One way of getting a transcript.
+
+    fetch(video_id) returns a list of Snippet-like objects, None when the
+    video has no transcript in this source, or raises when the source
+    itself is failing. Only errors and timeouts count against the breaker.
+    """
+
+    def __init__(self, name, fetch, timeout, language="en", breaker=None):
+        self.name = name
+        self.fetch = fetch
+        self.timeout = timeout
+        self.language = language
+        self.breaker = breaker or CircuitBreaker()
+
+    def __call__(self, video_id):
+        result = self.fetch(video_id)
+        if result is None:
+            return None
+        if isinstance(result, TranscriptResult):
+            return result
+        return TranscriptResult(self.name, self.language, False, list(result))
+
+
+class TranscriptResolver:
+    """
+    Tries transcript sources in order until one returns something.
+
+    Every source runs in a worker thread with its own timeout. With
+    hedge_after set, the next source is started when the current one has
+    been running that long without answering, and whichever returns a
+    transcript first wins.
+    """
+
+    def __init__(self, sources, hedge_after=None, max_workers=8):
+        self.sources = sources
+        self.hedge_after = hedge_after
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="transcript"
+        )
+
+    def resolve(self, video_id, skip=()):
+        return self.resolve_with_outcome(video_id, skip)[0]
+
+    def resolve_with_outcome(self, video_id, skip=()):
+        """
+        Like resolve(), returns (result, missing). missing is True when
+        every source that was asked answered that it has nothing, so no
+        transcript exists, rather than failing or being skipped by its
+        breaker. Sources named in skip are left out.
+        """
+        queue = [source for source in self.sources if source.name not in skip]
+        pending = {}  # future -> (source, started_at)
+        inconclusive = False
+
+        def start_next():
+            nonlocal inconclusive
+            # sources with an open breaker are skipped without being called
+            while queue:
+                source = queue.pop(0)
+                if source.breaker.allow():
+                    future = self._executor.submit(source, video_id)
+                    pending[future] = (source, time.monotonic())
+                    return True
+                inconclusive = True
+            return False
+
+        if not start_next():
+            return None, False
+
+        while pending:
+            now = time.monotonic()
+            deadlines = [
+                started + source.timeout for source, started in pending.values()
+            ]
+            if self.hedge_after is not None and queue:
+                last_started = max(started for _, started in pending.values())
+                deadlines.append(last_started + self.hedge_after)
+
+            done, _ = wait(
+                list(pending),
+                timeout=max(min(deadlines) - now, 0),
+                return_when=FIRST_COMPLETED,
+            )
+
+            for future in done:
+                source, _ = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception:
+                    logger.exception("Transcript source %s failed", source.name)
+                    source.breaker.record_failure()
+                    inconclusive = True
+                    result = None
+                else:
+                    source.breaker.record_success()
+
+                if result is not None and result.snippets:
+                    # losing hedged requests finish in the background, ignored
+                    return result, False
+
+            now = time.monotonic()
+            for future, (source, started) in list(pending.items()):
+                if now - started >= source.timeout:
+                    logger.warning("Transcript source %s timed out", source.name)
+                    source.breaker.record_failure()
+                    inconclusive = True
+                    future.cancel()
+                    del pending[future]
+
+            if queue and not pending:
+                # previous source failed or had nothing, move down the chain
+                start_next()
+            elif queue and self.hedge_after is not None:
+                last_started = max(started for _, started in pending.values())
+                if now - last_started >= self.hedge_after:
+                    start_next()
+
+        return None, not inconclusive
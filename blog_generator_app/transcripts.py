@@ -0,0 +1,180 @@
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Transcript
+
+# magic, format version, flags, number of segments
+HEADER = struct.Struct("<4sBBI")
+MAGIC = b"YTSG"
+FORMAT_VERSION = 1
+FLAG_COMPRESSED = 1
+
+
+def _to_bytes(values):
+    # stored little endian whatever the machine is
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def pack_segments(starts, durations, offsets, compress=True):
+    """
+    Serialize segment timings as three arrays over one shared text buffer.
+
+    Starts and durations are float32 seconds, offsets are uint32 positions
+    of each snippet in the transcript text. That's 12 bytes per snippet
+    before compression instead of a json object per snippet.
+    """
+    body = _to_bytes(starts) + _to_bytes(durations) + _to_bytes(offsets)
+    flags = 0
+    if compress:
+        body = zlib.compress(body)
+        flags |= FLAG_COMPRESSED
+    return HEADER.pack(MAGIC, FORMAT_VERSION, flags, len(offsets)) + body
+
+
+def unpack_segments(blob):
+    """Inverse of pack_segments, returns (starts, durations, offsets)"""
+    blob = bytes(blob)
+    magic, version, flags, count = HEADER.unpack_from(blob)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Unknown transcript segment format")
+
+    body = blob[HEADER.size :]
+    if flags & FLAG_COMPRESSED:
+        body = zlib.decompress(body)
+
+    size = count * 4
+    starts = _from_bytes("f", body[:size])
+    durations = _from_bytes("f", body[size : 2 * size])
+    offsets = _from_bytes("I", body[2 * size : 3 * size])
+    return starts, durations, offsets
+
+
+class StoredTranscript:
+    """Snippets of a transcript as offsets into one text buffer"""
+
+    def __init__(
+        self, video_id, language, text, starts, durations, offsets, is_generated=False
+    ):
+        self.video_id = video_id
+        self.language = language
+        self.text = text
+        self.starts = starts
+        self.durations = durations
+        self.offsets = offsets
+        # youtube auto-captions, see compact_transcript()
+        self.is_generated = is_generated
+
+    @classmethod
+    def from_snippets(cls, video_id, language, snippets, is_generated=False):
+        """Build from objects with text, start and duration (FetchedTranscriptSnippet)"""
+        snippets = list(snippets)
+        texts = [snippet.text for snippet in snippets]
+        starts = array("f", [snippet.start for snippet in snippets])
+        durations = array("f", [snippet.duration for snippet in snippets])
+        # each snippet starts right after the previous one and its joining space
+        offsets = array("I")
+        if texts:
+            offsets.extend(
+                accumulate((len(text) + 1 for text in texts[:-1]), initial=0)
+            )
+
+        # a single join instead of growing a string snippet by snippet
+        return cls(
+            video_id,
+            language,
+            " ".join(texts),
+            starts,
+            durations,
+            offsets,
+            is_generated,
+        )
+
+    @classmethod
+    def from_model(cls, transcript):
+        starts, durations, offsets = unpack_segments(transcript.segments)
+        return cls(
+            transcript.video_id,
+            transcript.language,
+            transcript.text,
+            starts,
+            durations,
+            offsets,
+            transcript.is_generated,
+        )
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def snippet_text(self, index):
+        start = self.offsets[index]
+        if index + 1 < len(self.offsets):
+            return self.text[start : self.offsets[index + 1] - 1]
+        return self.text[start:]
+
+    def snippet_texts(self):
+        return [self.snippet_text(i) for i in range(len(self))]
+
+    def segment_at(self, seconds):
+        """Index of the snippet being spoken at the given time"""
+        return max(bisect_right(self.starts, seconds) - 1, 0)
+
+    def timestamp_url(self, seconds):
+        """Link that opens the video at the given time"""
+        return f"https://www.youtube.com/watch?v={self.video_id}&t={int(seconds)}s"
+
+
+def get_stored_transcript(video_id, languages):
+    """Stored transcript in the first available preferred language, or None"""
+    stored = {
+        transcript.language: transcript
+        for transcript in Transcript.objects.filter(
+            video_id=video_id, language__in=languages
+        )
+    }
+    for language in languages:
+        if language in stored:
+            return StoredTranscript.from_model(stored[language])
+    return None
+
+
+def save_transcript(video_id, language, is_generated, snippets):
+    """Persist a fetched transcript, keeping the first copy if one already exists"""
+    transcript = StoredTranscript.from_snippets(
+        video_id, language, snippets, is_generated
+    )
+    try:
+        with transaction.atomic():
+            Transcript.objects.create(
+                video_id=video_id,
+                language=language,
+                is_generated=is_generated,
+                text=transcript.text,
+                segments=pack_segments(
+                    transcript.starts,
+                    transcript.durations,
+                    transcript.offsets,
+                    compress=getattr(settings, "TRANSCRIPT_COMPRESS_SEGMENTS", True),
+                ),
+            )
+    except IntegrityError:
+        # another request stored the same transcript in the meantime
+        pass
+    return transcript
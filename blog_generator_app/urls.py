@@ -7,6 +7,15 @@ urlpatterns = [
     path("signup", views.user_signup, name="signup"),
     path("logout", views.user_logout, name="logout"),
     path("generate-blog", views.generate_blog, name="generate-blog"),
+    path("generate-blog-bulk", views.generate_blog_bulk, name="generate-blog-bulk"),
+    path("generate-blog-async", views.generate_blog_async, name="generate-blog-async"),
+    path("generate-formats", views.generate_formats, name="generate-formats"),
+    path("job-status/<uuid:job_id>", views.job_status, name="job-status"),
+    path("job-result/<uuid:job_id>", views.job_result, name="job-result"),
+    path("client-stats", views.client_stats, name="client-stats"),
+    path("latency-stats", views.latency_stats, name="latency-stats"),
+    path("metrics", views.metrics, name="metrics"),
     path("blog-list", views.blog_list, name="blog-list"),
+    path("search", views.search_blogs, name="search"),
     path("blog-details/<int:pk>", views.blog_details, name="blog-details"),
 ]
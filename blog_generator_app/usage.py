@@ -0,0 +1,87 @@
+from django.db.models import Avg
+
+from .llm import TITLE_PROMPT
+from .models import GenerationUsage
+from .tokens import count_tokens
+
+# how many recent two-call generations the title latency estimate looks at
+TITLE_LATENCY_WINDOW = 100
+
+
+def average_title_latency_ms():
+    """Average latency of the separate title call over recent generations"""
+    recent_ids = (
+        GenerationUsage.objects.filter(title_latency_ms__isnull=False)
+        .order_by("-created_at")
+        .values_list("pk", flat=True)[:TITLE_LATENCY_WINDOW]
+    )
+    average = GenerationUsage.objects.filter(pk__in=list(recent_ids)).aggregate(
+        avg=Avg("title_latency_ms")
+    )["avg"]
+    return round(average) if average is not None else None
+
+
+def record_combined_usage(
+    video_id, provider, model, summary, input_tokens, output_tokens, latency_ms
+):
+    """Store usage of a combined call with what the title round-trip would have cost"""
+    # the two-call path sends the whole summary back as input for the title
+    saved_tokens = count_tokens(TITLE_PROMPT.format(summary=summary))
+    return GenerationUsage.objects.create(
+        video_id=video_id,
+        provider=provider,
+        model=model,
+        mode=GenerationUsage.COMBINED,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        latency_ms=latency_ms,
+        saved_tokens=saved_tokens,
+        saved_ms=average_title_latency_ms(),
+    )
+
+
+def record_two_call_usage(
+    video_id, provider, model, mode, transcript, summary, title, latency_ms, title_ms
+):
+    """
+    Store usage of the summary + title path, tokens are estimated locally.
+
+    title_ms is None when the video title was known and no title call was
+    made, what that call would have cost is then recorded as saved.
+    """
+    title_tokens = count_tokens(TITLE_PROMPT.format(summary=summary))
+    if title_ms is None:
+        return GenerationUsage.objects.create(
+            video_id=video_id,
+            provider=provider,
+            model=model,
+            mode=mode,
+            input_tokens=count_tokens(transcript),
+            output_tokens=count_tokens(summary),
+            latency_ms=latency_ms,
+            saved_tokens=title_tokens,
+            saved_ms=average_title_latency_ms(),
+        )
+    return GenerationUsage.objects.create(
+        video_id=video_id,
+        provider=provider,
+        model=model,
+        mode=mode,
+        input_tokens=count_tokens(transcript) + title_tokens,
+        output_tokens=count_tokens(summary) + count_tokens(title),
+        latency_ms=latency_ms,
+        title_latency_ms=title_ms,
+    )
+
+
+def record_derived_usage(video_id, provider, model, prompt, output, latency_ms):
+    """Store usage of a call deriving a format, tokens are estimated locally"""
+    return GenerationUsage.objects.create(
+        video_id=video_id,
+        provider=provider,
+        model=model,
+        mode=GenerationUsage.DERIVED,
+        input_tokens=count_tokens(prompt),
+        output_tokens=count_tokens(output),
+        latency_ms=latency_ms,
+    )
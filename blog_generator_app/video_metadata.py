@@ -0,0 +1,150 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import yt_dlp
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .models import VideoMetadata
+from .video_urls import canonical_url
+
+logger = logging.getLogger(__name__)
+
+
+def _ttl():
+    return timedelta(
+        seconds=getattr(settings, "VIDEO_METADATA_TTL_SECONDS", 7 * 24 * 3600)
+    )
+
+
+def _no_transcript_ttl():
+    return timedelta(
+        seconds=getattr(settings, "VIDEO_NO_TRANSCRIPT_TTL_SECONDS", 24 * 3600)
+    )
+
+
+def get_cached_metadata(video_id):
+    """Stored metadata of a video, None when it was never looked up"""
+    return VideoMetadata.objects.filter(video_id=video_id).first()
+
+
+def is_stale(metadata):
+    return metadata.checked_at < timezone.now() - _ttl()
+
+
+def save_metadata_from_info(video_id, info):
+    """Store what a yt-dlp info dict says about a video"""
+    metadata, _ = VideoMetadata.objects.update_or_create(
+        video_id=video_id,
+        defaults={
+            "title": (info.get("title") or "")[:300],
+            "duration_seconds": info.get("duration") or None,
+            "available": True,
+            "caption_languages": sorted(info.get("subtitles") or {}),
+            "automatic_caption_languages": sorted(info.get("automatic_captions") or {}),
+            "checked_at": timezone.now(),
+        },
+    )
+    return metadata
+
+
+def refresh_metadata(video_id):
+    """
+    Look the video up with yt-dlp and store the result.
+
+    Private or removed videos are stored as unavailable. When yt-dlp fails
+    for another reason, the metadata we had (or None) is returned as is.
+    """
+    ydl_opts = {"quiet": True, "no_warnings": True, "skip_download": True}
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore
+            # process=False skips the format selection, we only want the fields
+            info = ydl.extract_info(
+                canonical_url(video_id), download=False, process=False
+            )
+    except yt_dlp.utils.DownloadError as e:
+        cause = e.exc_info[1] if e.exc_info else None
+        if getattr(cause, "expected", False):
+            metadata, _ = VideoMetadata.objects.update_or_create(
+                video_id=video_id,
+                defaults={"available": False, "checked_at": timezone.now()},
+            )
+            return metadata
+        logger.warning("Error getting the metadata of %s: %s", video_id, e)
+        return get_cached_metadata(video_id)
+    except Exception:
+        logger.exception("Error getting the metadata of %s", video_id)
+        return get_cached_metadata(video_id)
+    return save_metadata_from_info(video_id, info)
+
+
+def get_video_metadata(video_id):
+    """Metadata of a video, looked up again when older than the ttl"""
+    metadata = get_cached_metadata(video_id)
+    if metadata is None or is_stale(metadata):
+        metadata = refresh_metadata(video_id)
+    return metadata
+
+
+def record_no_transcript(video_id):
+    """Remember that no source had a transcript for the video"""
+    until = timezone.now() + _no_transcript_ttl()
+    updated = VideoMetadata.objects.filter(video_id=video_id).update(
+        no_transcript_until=until
+    )
+    if not updated:
+        # stale on purpose, the other fields were never looked up
+        VideoMetadata.objects.get_or_create(
+            video_id=video_id,
+            defaults={
+                "no_transcript_until": until,
+                "checked_at": timezone.now() - _ttl() - timedelta(seconds=1),
+            },
+        )
+
+
+def transcript_known_missing(metadata):
+    """True when getting a transcript is known to fail, so not worth trying"""
+    if metadata is None:
+        return False
+    if metadata.no_transcript_until and metadata.no_transcript_until > timezone.now():
+        return True
+    return not metadata.available and not is_stale(metadata)
+
+
+def captions_missing(metadata, languages):
+    """True when fresh metadata shows no captions in any of the languages"""
+    if metadata is None or is_stale(metadata) or not metadata.available:
+        return False
+    known = set(metadata.caption_languages) | set(metadata.automatic_caption_languages)
+    return not any(language in known for language in languages)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _load_metadata(video_id):
+    try:
+        return get_video_metadata(video_id)
+    finally:
+        connections.close_all()
+
+
+def prefetch_video_metadata(video_id):
+    """
+    get_video_metadata() on a background thread, returns its future.
+
+    Started before the transcript is loaded so the yt-dlp lookup overlaps it.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "VIDEO_METADATA_WORKERS", 4),
+                thread_name_prefix="video-metadata",
+            )
+    return _executor.submit(_load_metadata, video_id)
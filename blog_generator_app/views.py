@@ -1,15 +1,20 @@
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
 
 # importing user model from django
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
+from django.db import connections
+from asgiref.sync import sync_to_async
+import asyncio
 import json
-from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api.proxies import WebshareProxyConfig
+import logging
+import math
 from youtube_transcript_api.formatters import TextFormatter
 from youtube_transcript_api._errors import (
     TranscriptsDisabled,
@@ -19,16 +24,73 @@ from youtube_transcript_api._errors import (
 import yt_dlp
 import urllib.request
 import re
-import os
-import traceback
+import queue
+import threading
+import time
 from dotenv import load_dotenv
 import assemblyai as aai
-import anthropic
-from openai import OpenAI
-from .models import BlogPost
+from .models import BlogPost, GenerationJob, GenerationUsage
+from .clients import connection_stats, get_transcript_api
+from .audio import submit_transcription
+from .bulk import collect_videos, run_bulk_generation
+from .compaction import compact_transcript
+from .derivations import BASE_FORMATS, FORMATS, derive_formats
+from .jobs import GenerationError, enqueue_bulk_generation, enqueue_generation
+from .llm import TITLE_PROMPT, parse_blog_post
+from .metrics import current_span, span, trace
+from .metrics import registry as metrics_registry
+from .page_cache import cached_page, detail_page_key, list_page_key
+from .pagination import decode_cursor, keyset_page
+from .providers import ProviderError, get_llm_router
+from .ratelimit import (
+    Rejected,
+    admit_generation,
+    charge_generations,
+    release_generation,
+)
+from .search import search_posts
+from .singleflight import get_generation_flight
+from .summarization import amap_reduce_summary, chunk_budget, map_reduce_summary
+from .summary_cache import (
+    aget_cached_summary,
+    astore_summary,
+    get_cached_summary,
+    make_cache_key,
+    store_summary,
+)
+from .tokens import count_tokens
+from .transcript_sources import (
+    CircuitBreaker,
+    Snippet,
+    TranscriptResolver,
+    TranscriptResult,
+    TranscriptSource,
+)
+from .transcripts import get_stored_transcript, save_transcript
+from .usage import record_combined_usage, record_two_call_usage
+from .video_metadata import (
+    captions_missing,
+    get_cached_metadata,
+    get_video_metadata,
+    prefetch_video_metadata,
+    record_no_transcript,
+    transcript_known_missing,
+)
+from .video_urls import canonical_url, extract_video_id
 
 load_dotenv()  # Load environment variables from .env file
 
+logger = logging.getLogger(__name__)
+
+# generation settings, they are part of the summary cache key
+TRANSCRIPT_LANGUAGES = ["en", "es"]
+# bump this whenever the prompts change so old cached summaries are not reused
+PROMPT_VERSION = 3
+# AssemblyAI returns timed words, this many make one transcript snippet
+ASSEMBLYAI_WORDS_PER_SNIPPET = 15
+# sources that only return the captions youtube lists for the video
+CAPTION_SOURCES = ("youtube_api", "yt_dlp")
+
 
 # Create your views here.
 
@@ -36,7 +98,11 @@ load_dotenv()  # Load environment variables from .env file
 # only logged in users can access the index view
 @login_required
 def index(request):
-    return render(request, "blog_generator_app/index.html")
+    return render(
+        request,
+        "blog_generator_app/index.html",
+        {"streaming": getattr(settings, "GENERATION_STREAMING", False)},
+    )
 
 
 #! functionality views
@@ -46,140 +112,1123 @@ def generate_blog(request):
         try:
             data = json.loads(request.body)
             yt_link = data["link"]
-            yt_id = extract_video_id(yt_link)
 
         except (KeyError, json.JSONDecodeError):
             return JsonResponse({"error": "Invalid data sent"}, status=400)
 
-        # get yt transcript
-        transcript = extract_yt_transcript(yt_id)
-        if transcript in ("No transcription available", None, ""):
-            return JsonResponse(
-                {
-                    "title": "Error",
-                    "content": "No transcription available for this video",
-                },
-                status=500,
+        if not isinstance(yt_link, str) or extract_video_id(yt_link) is None:
+            return JsonResponse({"error": "Not a YouTube video link"}, status=400)
+
+        # the blog post is saved for the user, so we need one
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Authentication required"}, status=401)
+
+        # a summary we already have costs no rate limit token, slot or job
+        new_post = cached_blog_post(request.user, yt_link)
+        if new_post is not None:
+            return blog_post_response(new_post)
+
+        # videos we already know we can't summarize don't take a slot
+        rejection = rejected_by_metadata(yt_link)
+        if rejection is not None:
+            return rejection
+
+        # rate limits and a cap on generations in flight, see ratelimit.py
+        try:
+            slot = admit_generation(request.user)
+        except Rejected as e:
+            return too_many_requests(e)
+
+        # streaming mode sends the summary to the browser while it's generated,
+        # it holds the request open so it's only on when GENERATION_STREAMING is
+        if data.get("stream") and getattr(settings, "GENERATION_STREAMING", False):
+            response = StreamingHttpResponse(
+                stream_blog_generation(request.user, yt_link, slot),
+                content_type="text/event-stream",
             )
+            response["Cache-Control"] = "no-cache"
+            response["X-Accel-Buffering"] = "no"  # don't let proxies buffer events
+            return response
+
+        # the work runs in the background, the page polls job-status/<id>
+        # the job releases the slot when it's done, so it gets the slot's id
+        job = enqueue_generation(
+            request.user, yt_link, run_blog_generation, job_id=slot
+        )
+        return JsonResponse({"job_id": str(job.id), "status": job.status}, status=202)
 
-        # generate summary and title content using openai
-        blog_content = generate_summary_content_openai(transcript)
-        title = generate_tittle_content_openai(blog_content)
+    else:
+        # there
+        return JsonResponse({"error": "Invalid request method"}, status=405)
 
-        # generate summary an title content using claude
-        # blog_content = generate_summary_content_claude(transcript)
-        # title = generate_title_content_claude(blog_content)
 
-        # troubleshooting blog content
-        if not blog_content:
-            return JsonResponse(
-                {
-                    "title": "Error",
-                    "content": "Failed to generate blog content from LLM api",
-                },
-                status=500,
+def cached_blog_post(user, yt_link):
+    """Blog post saved from the summary cache, None when the video isn't in it"""
+    cached = get_cached_summary(
+        generation_cache_key(extract_video_id(yt_link), get_llm_router())
+    )
+    if cached is None:
+        return None
+    return BlogPost.objects.create(
+        user=user,
+        youtube_title=cached.title,
+        youtube_link=yt_link,
+        generated_content=cached.summary,
+    )
+
+
+async def acached_blog_post(user, yt_link):
+    """cached_blog_post() for the async view"""
+    cached = await aget_cached_summary(
+        generation_cache_key(extract_video_id(yt_link), get_llm_router())
+    )
+    if cached is None:
+        return None
+    return await BlogPost.objects.acreate(
+        user=user,
+        youtube_title=cached.title,
+        youtube_link=yt_link,
+        generated_content=cached.summary,
+    )
+
+
+def blog_post_response(blog_post):
+    """Title and content the page shows, the same for every generation path"""
+    return JsonResponse(
+        {"title": blog_post.youtube_title, "content": blog_post.generated_content},
+        status=200,
+    )
+
+
+def rejected_by_metadata(yt_link):
+    """Error response for a video known to have no transcript, else None"""
+    metadata = get_cached_metadata(extract_video_id(yt_link))
+    if not transcript_known_missing(metadata):
+        return None
+    if not metadata.available:
+        return JsonResponse(
+            {"error": "This video is private or no longer available"}, status=400
+        )
+    return JsonResponse(
+        {"error": "No transcription available for this video"}, status=422
+    )
+
+
+def too_many_requests(rejected):
+    response = JsonResponse({"error": rejected.reason}, status=429)
+    response["Retry-After"] = str(max(math.ceil(rejected.retry_after), 1))
+    return response
+
+
+#! many videos (links and/or a playlist) in one request
+@csrf_exempt
+def generate_blog_bulk(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        links = data.get("links") or []
+        playlist = data.get("playlist")
+
+    except (AttributeError, json.JSONDecodeError):
+        return JsonResponse({"error": "Invalid data sent"}, status=400)
+
+    if not isinstance(links, list) or not all(isinstance(link, str) for link in links):
+        return JsonResponse({"error": "links must be a list of links"}, status=400)
+    if playlist:
+        if not isinstance(playlist, str):
+            return JsonResponse({"error": "playlist must be a link"}, status=400)
+        links = [*links, playlist]
+
+    if not links:
+        return JsonResponse({"error": "No links sent"}, status=400)
+
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+
+    # admitted before the playlists are expanded, that's a yt-dlp call too.
+    # The whole request holds one in-flight slot, its pools are bounded already
+    try:
+        slot = admit_generation(request.user)
+    except Rejected as e:
+        return too_many_requests(e)
+
+    max_videos = getattr(settings, "BULK_MAX_VIDEOS", 50)
+    try:
+        # links to the same video only get generated once
+        items, duplicates = collect_videos(links, extract_video_id)
+        if not items:
+            raise ValueError("No links sent")
+        if len(items) > max_videos:
+            raise ValueError(f"At most {max_videos} videos per request")
+        # every video is charged, the admission paid for the first one
+        charge_generations(request.user, len(items) - 1)
+    except yt_dlp.utils.DownloadError:
+        release_generation(slot)
+        return JsonResponse({"error": "Could not read the playlist"}, status=400)
+    except ValueError as e:
+        release_generation(slot)
+        return JsonResponse({"error": str(e)}, status=400)
+    except Rejected as e:
+        release_generation(slot)
+        return too_many_requests(e)
+
+    # every video gets a job the page can poll with job-status/<id>
+    enqueue_bulk_generation(request.user, items, run_bulk_blog_generation, slot)
+    return JsonResponse(
+        {"jobs": [item.as_dict() for item in items], "duplicates": duplicates},
+        status=202,
+    )
+
+
+#! async version of generate_blog, for deployments running under ASGI
+@csrf_exempt
+async def generate_blog_async(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        yt_link = data["link"]
+
+    except (KeyError, json.JSONDecodeError):
+        return JsonResponse({"error": "Invalid data sent"}, status=400)
+
+    if not isinstance(yt_link, str) or extract_video_id(yt_link) is None:
+        return JsonResponse({"error": "Not a YouTube video link"}, status=400)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+
+    new_post = await acached_blog_post(user, yt_link)
+    if new_post is not None:
+        return blog_post_response(new_post)
+
+    rejection = await sync_to_async(rejected_by_metadata, thread_sensitive=False)(
+        yt_link
+    )
+    if rejection is not None:
+        return rejection
+
+    try:
+        slot = await sync_to_async(admit_generation, thread_sensitive=False)(user)
+    except Rejected as e:
+        return too_many_requests(e)
+
+    try:
+        new_post = await arun_blog_generation(user, yt_link)
+    except GenerationError as e:
+        return JsonResponse({"title": "Error", "content": str(e)}, status=500)
+    finally:
+        await sync_to_async(release_generation, thread_sensitive=False)(slot)
+
+    return blog_post_response(new_post)
+
+
+#! Other formats (tl;dr, notes, chapters) of a video, derived from its summary
+@csrf_exempt
+def generate_formats(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        yt_link = data["link"]
+        names = data.get("formats") or ["tldr"]
+        if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+            raise TypeError
+
+    except (KeyError, TypeError, json.JSONDecodeError):
+        return JsonResponse({"error": "Invalid data sent"}, status=400)
+
+    unknown = [
+        name for name in names if name not in FORMATS and name not in BASE_FORMATS
+    ]
+    if unknown:
+        return JsonResponse(
+            {"error": f"Unknown formats: {', '.join(unknown)}"}, status=400
+        )
+
+    if not isinstance(yt_link, str) or extract_video_id(yt_link) is None:
+        return JsonResponse({"error": "Not a YouTube video link"}, status=400)
+
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+
+    rejection = rejected_by_metadata(yt_link)
+    if rejection is not None:
+        return rejection
+
+    try:
+        slot = admit_generation(request.user)
+    except Rejected as e:
+        return too_many_requests(e)
+
+    try:
+        with trace("generate_formats", link=yt_link, formats=names) as total:
+            # a video generated before only costs the calls of the new formats
+            contents, regenerated = derive_formats(
+                extract_video_id(yt_link),
+                names,
+                generate_blog_content,
+                load_video_transcript,
+                get_llm_router(),
+            )
+            total.set(regenerated=regenerated)
+    except GenerationError as e:
+        return JsonResponse({"error": str(e)}, status=500)
+    finally:
+        release_generation(slot)
+
+    return JsonResponse(
+        {
+            "video_id": extract_video_id(yt_link),
+            "formats": contents,
+            "regenerated": regenerated,
+        },
+        status=200,
+    )
+
+
+#! Background job progress
+def job_status(request, job_id):
+    job = GenerationJob.objects.filter(id=job_id, user_id=request.user.id).first()
+    if job is None:
+        return JsonResponse({"error": "Job not found"}, status=404)
+
+    return JsonResponse(
+        {
+            "job_id": str(job.id),
+            "status": job.status,
+            "stage": job.stage,
+            "error": job.error,
+        },
+        status=200,
+    )
+
+
+def job_result(request, job_id):
+    job = (
+        GenerationJob.objects.select_related("blog_post")
+        .filter(id=job_id, user_id=request.user.id)
+        .first()
+    )
+    if job is None:
+        return JsonResponse({"error": "Job not found"}, status=404)
+
+    if job.status == GenerationJob.FAILED:
+        return JsonResponse({"title": "Error", "content": job.error}, status=500)
+
+    if job.status != GenerationJob.DONE or job.blog_post is None:
+        # still working on it
+        return JsonResponse({"status": job.status, "stage": job.stage}, status=202)
+
+    return blog_post_response(job.blog_post)
+
+
+async def arun_blog_generation(user, yt_link):
+    """
+    run_blog_generation() on the event loop, for the async view.
+
+    The LLM calls go through LLMRouter.acall() on the async clients and the
+    summary cache through the async ORM, so a generation only takes a
+    thread for the transcript lookup and the usage records. It uses the
+    cache entries, the single flight and the metrics of the job path.
+    """
+    with trace("generate_blog", link=yt_link) as total:
+        with span("extract_id"):
+            yt_id = extract_video_id(yt_link)
+        total.set(video_id=yt_id)
+
+        title, blog_content = await agenerate_blog_content(yt_id)
+
+        with span("db_write"):
+            new_post = await BlogPost.objects.acreate(
+                user=user,
+                youtube_title=title,
+                youtube_link=yt_link,
+                generated_content=blog_content,
+            )
+
+    return new_post
+
+
+def sse_event(event, payload):
+    """Format a server-sent event with a json payload"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def stream_blog_generation(user, yt_link, slot):
+    """
+    run_blog_generation() with its output sent as SSE events while the LLM
+    generates it, for the streaming mode of generate-blog.
+
+    The generation runs on its own thread, so it has the summary cache,
+    the single flight, the router and the metrics of the job path, and it
+    still finishes and saves the post when the browser goes away. The
+    thread gives back the admission slot when it's done.
+    """
+    events = queue.Queue()
+    streamed = set()
+
+    def on_text(event, text):
+        streamed.add(event)
+        events.put(sse_event(event, {"text": text}))
+
+    def run():
+        try:
+            post = run_blog_generation(user, yt_link, on_text=on_text)
+        except GenerationError as e:
+            events.put(sse_event("error", {"error": str(e)}))
+        except Exception:
+            logger.exception("Error streaming blog content")
+            events.put(
+                sse_event(
+                    "error", {"error": "Failed to generate blog content from LLM api"}
+                )
             )
+        else:
+            # cached and coalesced generations have nothing to stream
+            for event, text in (
+                ("summary", post.generated_content),
+                ("title", post.youtube_title),
+            ):
+                if event not in streamed:
+                    events.put(sse_event(event, {"text": text}))
+            events.put(
+                sse_event(
+                    "done",
+                    {
+                        "id": post.id,
+                        "title": post.youtube_title,
+                        "content": post.generated_content,
+                    },
+                )
+            )
+        finally:
+            events.put(None)
+            release_generation(slot)
+            connections.close_all()
+
+    threading.Thread(target=run, name="generation-stream", daemon=True).start()
+
+    # an async iterator, Django's ASGI handler reads a sync one to the end
+    # before sending any of it
+    async def read_events():
+        get = sync_to_async(events.get, thread_sensitive=False)
+        while (event := await get()) is not None:
+            yield event
+
+    return read_events()
+
+
+#! Connection reuse of the pooled upstream clients
+@staff_member_required
+def client_stats(request):
+    return JsonResponse(connection_stats(), status=200)
+
+
+#! p50/p95/p99 of every generation stage over the recent window
+@staff_member_required
+def latency_stats(request):
+    return JsonResponse(
+        {
+            "window_seconds": metrics_registry.window_seconds,
+            "stages": metrics_registry.percentiles(),
+            "providers": get_llm_router().stats(),
+        },
+        status=200,
+    )
+
+
+#! Prometheus scrape endpoint, for staff or with the METRICS_TOKEN bearer token
+def metrics(request):
+    token = getattr(settings, "METRICS_TOKEN", "")
+    authorized = request.user.is_staff or (
+        token and request.headers.get("Authorization") == f"Bearer {token}"
+    )
+    if not authorized:
+        return HttpResponse("Forbidden", status=403)
+
+    return HttpResponse(
+        metrics_registry.prometheus(), content_type="text/plain; version=0.0.4"
+    )
+
+
+def run_blog_generation(user, yt_link, progress=None, on_text=None):
+    """
+    Fetch the transcript, generate summary and title and save the blog post.
+
+    on_text(event, text), when given, gets the summary and title text as
+    the LLM generates it, see generate_uncached_content().
+    """
+    if progress is None:
+
+        def progress(stage):
+            pass
+
+    # every stage is timed, the whole generation is logged as one json line
+    with trace("generate_blog", link=yt_link) as total:
+        with span("extract_id"):
+            yt_id = extract_video_id(yt_link)
+        total.set(video_id=yt_id)
+
+        title, blog_content = generate_blog_content(yt_id, progress, on_text)
 
         # save blog post to db
-        new_post = BlogPost.objects.create(
-            user=request.user,
-            youtube_title=title,
-            youtube_link=yt_link,
-            generated_content=blog_content,
+        progress("saving")
+        with span("db_write"):
+            new_post = BlogPost.objects.create(
+                user=user,
+                youtube_title=title,
+                youtube_link=yt_link,
+                generated_content=blog_content,
+            )
+
+    return new_post
+
+
+def run_bulk_blog_generation(user, items, on_item_done=None, **workers):
+    """run_blog_generation for many videos, see bulk.run_bulk_generation"""
+    return run_bulk_generation(
+        user,
+        items,
+        load_video_transcript,
+        generate_blog_content,
+        on_item_done=on_item_done,
+        **workers,
+    )
+
+
+def generate_blog_content(yt_id, progress=None, on_text=None):
+    """Title and summary of a video, from the summary cache or the LLM"""
+    if progress is None:
+
+        def progress(stage):
+            pass
+
+    # reuse a previous generation of the same video when we have one
+    language = ",".join(TRANSCRIPT_LANGUAGES)
+    # whichever provider answers, see LLM_PROVIDERS in settings
+    router = get_llm_router()
+    cache_key = generation_cache_key(yt_id, router)
+    with span("cache_lookup") as lookup:
+        cached = get_cached_summary(cache_key)
+        lookup.set(cache_hit=cached is not None)
+    if cached is not None:
+        return cached.title, cached.summary
+
+    def cached_content():
+        cached = get_cached_summary(cache_key)
+        return (cached.title, cached.summary) if cached is not None else None
+
+    # concurrent submissions of the same video share a single generation
+    return get_generation_flight().do(
+        cache_key,
+        lambda: generate_uncached_content(
+            yt_id, cache_key, language, router, progress, on_text
+        ),
+        cached_content,
+    )
+
+
+def generation_cache_key(yt_id, router):
+    """Summary cache key of a video, the same for every generation path"""
+    language = ",".join(TRANSCRIPT_LANGUAGES)
+    return make_cache_key(yt_id, language, "router", router.key, PROMPT_VERSION)
+
+
+def load_generation_transcript(yt_id):
+    """Compacted transcript of a video for the LLM, GenerationError without one"""
+    with span("transcript") as fetch:
+        stored_transcript = load_video_transcript(yt_id)
+        if stored_transcript is None or not stored_transcript.text.strip():
+            raise GenerationError("No transcription available for this video")
+        fetch.set(input_chars=len(stored_transcript.text))
+    compacted = compact_video_transcript(stored_transcript)
+    if not compacted.text:
+        raise GenerationError("No transcription available for this video")
+    return compacted
+
+
+def use_combined_call(transcript, known_title, streaming=False):
+    """
+    Whether one structured call can return summary and title, it can't be
+    streamed and isn't needed when the title is known
+    """
+    return (
+        getattr(settings, "COMBINED_GENERATION", True)
+        and not streaming
+        and not known_title
+        and count_tokens(transcript) <= chunk_budget()
+    )
+
+
+def generate_uncached_content(
+    yt_id, cache_key, language, router, progress, on_text=None
+):
+    """
+    Transcript + LLM part of generate_blog_content, stores the summary cache.
+
+    With on_text(event, text) the call giving the final summary ("summary"
+    event) and the title call ("title") are streamed, the combined call
+    can't be so it isn't used.
+    """
+    # the video title is looked up while the transcript loads
+    metadata_future = prefetch_video_metadata(yt_id)
+
+    # get yt transcript
+    progress("fetching_transcript")
+    compacted = load_generation_transcript(yt_id)
+    snippets, transcript = compacted.snippets, compacted.text
+
+    with span("metadata") as metadata_span:
+        known_title = known_video_title(metadata_future)
+        metadata_span.set(known_title=bool(known_title))
+
+    # generate summary and title content on the fastest healthy provider
+    progress("summarizing")
+    title, blog_content = None, None
+    # with the real title known, only the summary is left to generate
+    mode = GenerationUsage.KNOWN_TITLE if known_title else GenerationUsage.TWO_CALL
+    if use_combined_call(transcript, known_title, streaming=on_text is not None):
+        # one structured call returns both, no second round-trip for the title
+        with span("summary", mode=GenerationUsage.COMBINED):
+            combined = generate_combined_content(yt_id, router, transcript)
+        if combined is not None:
+            title, blog_content, provider = combined
+        else:
+            mode = GenerationUsage.FALLBACK
+
+    if blog_content is None:
+        answered = []  # providers of the summary calls
+
+        def call(operation):
+            def run(*args):
+                result, provider = router.call(operation, *args)
+                answered.append(provider)
+                return result
+
+            return run
+
+        def stream(operation, event):
+            def run(*args):
+                result, provider = router.stream(
+                    operation, lambda text: on_text(event, text), *args
+                )
+                answered.append(provider)
+                return result
+
+            return run if on_text is not None else None
+
+        # long transcripts are summarized in chunks and merged
+        started = time.perf_counter()
+        title_ms = None
+        try:
+            with span("summary", mode=mode) as summary_span:
+                blog_content = map_reduce_summary(
+                    snippets,
+                    call("summary"),
+                    call("merge"),
+                    final_summarize=stream("summary", "summary"),
+                    final_merge=stream("merge", "summary"),
+                )
+                # estimated locally, like record_two_call_usage does
+                summary_span.set(
+                    input_tokens=count_tokens(transcript),
+                    output_tokens=count_tokens(blog_content or ""),
+                )
+            if known_title:
+                title, provider = known_title, answered[-1]
+            else:
+                progress("titling")
+                title_started = time.perf_counter()
+                with span("title") as title_span:
+                    if on_text is not None:
+                        title, provider = router.stream(
+                            "title", lambda text: on_text("title", text), blog_content
+                        )
+                    else:
+                        title, provider = router.call("title", blog_content)
+                    title_span.set(
+                        input_tokens=count_tokens(
+                            TITLE_PROMPT.format(summary=blog_content)
+                        ),
+                        output_tokens=count_tokens(title or ""),
+                    )
+                title_ms = round((time.perf_counter() - title_started) * 1000)
+        except ProviderError:
+            logger.exception("Error generating blog content")
+            raise GenerationError("Failed to generate blog content from LLM api")
+
+        # troubleshooting blog content
+        if not blog_content:
+            raise GenerationError("Failed to generate blog content from LLM api")
+
+        record_two_call_usage(
+            yt_id,
+            provider.provider,
+            provider.model,
+            mode,
+            transcript,
+            blog_content,
+            title or "",
+            round((time.perf_counter() - started) * 1000),
+            title_ms,
         )
 
-        new_post.save()
+    store_summary(
+        cache_key,
+        yt_id,
+        language,
+        provider.provider,
+        provider.model,
+        PROMPT_VERSION,
+        transcript,
+        blog_content,
+        title,
+    )
 
-        # return blog article as a response
-        return JsonResponse({"title": title, "content": blog_content}, status=200)
+    return title, blog_content
 
-    else:
-        # there
-        return JsonResponse({"error": "Invalid request method"}, status=405)
+
+def known_video_title(metadata_future):
+    """Title from a prefetch_video_metadata() future, "" when not known in time"""
+    try:
+        metadata = metadata_future.result(
+            timeout=getattr(settings, "VIDEO_METADATA_WAIT_SECONDS", 5)
+        )
+    except Exception as e:
+        logger.warning("Video metadata not available: %s", e)
+        return ""
+    if metadata is None or not metadata.available:
+        return ""
+    return metadata.title
+
+
+async def aknown_video_title(metadata_future):
+    """known_video_title() awaiting the future instead of blocking on it"""
+    try:
+        metadata = await asyncio.wait_for(
+            asyncio.wrap_future(metadata_future),
+            timeout=getattr(settings, "VIDEO_METADATA_WAIT_SECONDS", 5),
+        )
+    except Exception as e:
+        logger.warning("Video metadata not available: %s", e)
+        return ""
+    if metadata is None or not metadata.available:
+        return ""
+    return metadata.title
+
+
+def generate_combined_content(yt_id, router, transcript):
+    """
+    Run a combined summary + title call, returns (title, summary, provider)
+    or None when its output can't be used.
+    """
+    started = time.perf_counter()
+    try:
+        (raw, input_tokens, output_tokens), provider = router.call(
+            "blog_post", transcript
+        )
+        title, summary = parse_blog_post(raw)
+    except Exception:
+        # any api or validation problem sends us back to the two-call path
+        logger.exception("Combined generation failed, falling back to two calls")
+        current_span().set(fallback=True)
+        return None
+
+    current_span().set(input_tokens=input_tokens, output_tokens=output_tokens)
+
+    record_combined_usage(
+        yt_id,
+        provider.provider,
+        provider.model,
+        summary,
+        input_tokens,
+        output_tokens,
+        round((time.perf_counter() - started) * 1000),
+    )
+    return title, summary, provider
+
+
+async def agenerate_blog_content(yt_id):
+    """generate_blog_content() for arun_blog_generation(), same summary cache"""
+    language = ",".join(TRANSCRIPT_LANGUAGES)
+    router = get_llm_router()
+    cache_key = generation_cache_key(yt_id, router)
+    with span("cache_lookup") as lookup:
+        cached = await aget_cached_summary(cache_key)
+        lookup.set(cache_hit=cached is not None)
+    if cached is not None:
+        return cached.title, cached.summary
+
+    async def cached_content():
+        cached = await aget_cached_summary(cache_key)
+        return (cached.title, cached.summary) if cached is not None else None
+
+    # shares the generation with the sync paths through the flight's lease
+    return await get_generation_flight().ado(
+        cache_key,
+        lambda: agenerate_uncached_content(yt_id, cache_key, language, router),
+        cached_content,
+    )
+
+
+async def agenerate_uncached_content(yt_id, cache_key, language, router):
+    """generate_uncached_content() with the LLM calls awaited, never streamed"""
+    metadata_future = prefetch_video_metadata(yt_id)
+
+    # the transcript sources and the transcript store are sync
+    compacted = await sync_to_async(load_generation_transcript)(yt_id)
+    snippets, transcript = compacted.snippets, compacted.text
+
+    with span("metadata") as metadata_span:
+        known_title = await aknown_video_title(metadata_future)
+        metadata_span.set(known_title=bool(known_title))
+
+    title, blog_content = None, None
+    mode = GenerationUsage.KNOWN_TITLE if known_title else GenerationUsage.TWO_CALL
+    if use_combined_call(transcript, known_title):
+        with span("summary", mode=GenerationUsage.COMBINED):
+            combined = await agenerate_combined_content(yt_id, router, transcript)
+        if combined is not None:
+            title, blog_content, provider = combined
+        else:
+            mode = GenerationUsage.FALLBACK
+
+    if blog_content is None:
+        answered = []  # providers of the summary calls
+
+        def call(operation):
+            async def run(*args):
+                result, provider = await router.acall(operation, *args)
+                answered.append(provider)
+                return result
+
+            return run
+
+        started = time.perf_counter()
+        title_ms = None
+        try:
+            with span("summary", mode=mode) as summary_span:
+                blog_content = await amap_reduce_summary(
+                    snippets, call("summary"), call("merge")
+                )
+                summary_span.set(
+                    input_tokens=count_tokens(transcript),
+                    output_tokens=count_tokens(blog_content or ""),
+                )
+            if known_title:
+                title, provider = known_title, answered[-1]
+            else:
+                title_started = time.perf_counter()
+                with span("title") as title_span:
+                    title, provider = await router.acall("title", blog_content)
+                    title_span.set(
+                        input_tokens=count_tokens(
+                            TITLE_PROMPT.format(summary=blog_content)
+                        ),
+                        output_tokens=count_tokens(title or ""),
+                    )
+                title_ms = round((time.perf_counter() - title_started) * 1000)
+        except ProviderError:
+            logger.exception("Error generating blog content")
+            raise GenerationError("Failed to generate blog content from LLM api")
+
+        if not blog_content:
+            raise GenerationError("Failed to generate blog content from LLM api")
+
+        await sync_to_async(record_two_call_usage)(
+            yt_id,
+            provider.provider,
+            provider.model,
+            mode,
+            transcript,
+            blog_content,
+            title or "",
+            round((time.perf_counter() - started) * 1000),
+            title_ms,
+        )
+
+    await astore_summary(
+        cache_key,
+        yt_id,
+        language,
+        provider.provider,
+        provider.model,
+        PROMPT_VERSION,
+        transcript,
+        blog_content,
+        title,
+    )
+
+    return title, blog_content
+
+
+async def agenerate_combined_content(yt_id, router, transcript):
+    """generate_combined_content() with the call awaited"""
+    started = time.perf_counter()
+    try:
+        (raw, input_tokens, output_tokens), provider = await router.acall(
+            "blog_post", transcript
+        )
+        title, summary = parse_blog_post(raw)
+    except Exception:
+        logger.exception("Combined generation failed, falling back to two calls")
+        current_span().set(fallback=True)
+        return None
+
+    current_span().set(input_tokens=input_tokens, output_tokens=output_tokens)
+
+    await sync_to_async(record_combined_usage)(
+        yt_id,
+        provider.provider,
+        provider.model,
+        summary,
+        input_tokens,
+        output_tokens,
+        round((time.perf_counter() - started) * 1000),
+    )
+    return title, summary, provider
 
 
 #! Retrieve user's blog posts
+@login_required
 def blog_list(request):
-    blog_articles = BlogPost.objects.filter(user=request.user).order_by("-created_at")
-    return render(
-        request, "blog_generator_app/all-blogs.html", {"blog_articles": blog_articles}
-    )
+    cursor = request.GET.get("cursor")
+    if cursor and decode_cursor(cursor) is None:
+        return HttpResponse("Invalid page cursor", status=400)
+
+    def build():
+        # the list only shows the excerpt, never load generated_content here
+        blog_articles = BlogPost.objects.filter(user=request.user).only(
+            "id", "user_id", "youtube_title", "excerpt", "created_at"
+        )
+        blog_articles, next_cursor = keyset_page(
+            blog_articles,
+            cursor,
+            getattr(settings, "BLOG_LIST_PAGE_SIZE", 20),
+        )
+        return render_to_string(
+            "blog_generator_app/all-blogs.html",
+            {
+                "blog_articles": blog_articles,
+                "next_cursor": next_cursor,
+                "is_first_page": not cursor,
+            },
+            request,
+        )
+
+    # pages are cached per user and dropped whenever one of their posts changes
+    return cached_page(request, list_page_key(request.user.id, cursor), build)
+
+
+#! Full-text search over the user's blog posts
+def search_blogs(request):
+    if request.method != "GET":
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return JsonResponse({"error": "Missing search query"}, status=400)
+
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 20)), 50))
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit"}, status=400)
+
+    results = search_posts(request.user, query, limit)
+    return JsonResponse({"query": query, "results": results}, status=200)
 
 
 #! View for blog details
+@login_required
 def blog_details(request, pk):
-    blog_article_details = BlogPost.objects.get(id=pk)
+    def build():
+        blog_article_details = BlogPost.objects.filter(id=pk).first()
+
+        # verifying whether the connected user is the owner of the blog post
+        # article, comparing ids doesn't need to load the related user
+        if (
+            blog_article_details is None
+            or blog_article_details.user_id != request.user.id
+        ):
+            return redirect("/")
 
-    # verifying whether the connected user is the owner of the blog post article
-    if blog_article_details.user == request.user:
-        return render(
-            request,
+        return render_to_string(
             "blog_generator_app/blog-details.html",
             {"blog_article_details": blog_article_details},
+            request,
         )
-    else:
-        return redirect("/")
 
-
-#!Aux views
+    # the key has the user id, someone else's post is never served from it
+    return cached_page(request, detail_page_key(request.user.id, pk), build)
 
 
-def extract_video_id(url):
-    """ "Extract the id from a youtube video link"""
-    if "v=" in url:
-        return url.split("v=")[-1].split("&")[0]
-    elif "youtu.be/" in url:
-        return url.split("youtu.be/")[-1].split("?")[0]
-    return url
+#!Aux views
 
 
-def extract_yt_transcript(video_id):
+def fetch_transcript_youtube_api(video_id):
+    """Transcript source: youtube_transcript_api through the webshare proxy"""
     try:
         # NEW API - instantiate and use fetch()
-        # Using webshare residential proxy api
-        proxy_username = os.environ.get("WEBSHARE_PROXY_USERNAME")
-        proxy_password = os.environ.get("WEBSHARE_PROXY_PASSWORD")
-
-        ytt_api = YouTubeTranscriptApi(
-            proxy_config=WebshareProxyConfig(
-                proxy_username=proxy_username,  # type: ignore
-                proxy_password=proxy_password,  # type: ignore
+        # Using webshare residential proxy api, the instance and its
+        # connection pool are reused across requests (see clients.py)
+        ytt_api = get_transcript_api()
+        transcript = ytt_api.fetch(video_id, languages=TRANSCRIPT_LANGUAGES)
+
+    except (NoTranscriptFound, TranscriptsDisabled, VideoUnavailable):
+        # the video has nothing for us, the source itself is fine
+        return None
+
+    # The new API returns a FetchedTranscript object, the snippets keep
+    # their timings in the store so we can link to a point in the video
+    return TranscriptResult(
+        "youtube_api",
+        transcript.language_code,
+        transcript.is_generated,
+        transcript.snippets,
+    )
+
+
+def fetch_transcript_yt_dlp(video_id):
+    """Transcript source: subtitles listed by yt-dlp"""
+    return yt_subtitles(canonical_url(video_id))
+
+
+def fetch_transcript_assemblyai(video_id):
+    """Transcript source: AssemblyAI speech to text on the downloaded audio"""
+    transcription = transcribe_youtube_audio(canonical_url(video_id))
+    if transcription.status == aai.TranscriptStatus.error:
+        raise RuntimeError(f"AssemblyAI transcription failed: {transcription.error}")
+    if not transcription.words:
+        return None
+
+    # group the timed words into caption sized snippets
+    snippets = []
+    for i in range(0, len(transcription.words), ASSEMBLYAI_WORDS_PER_SNIPPET):
+        words = transcription.words[i : i + ASSEMBLYAI_WORDS_PER_SNIPPET]
+        snippets.append(
+            Snippet(
+                text=" ".join(word.text for word in words),
+                start=words[0].start / 1000,
+                duration=(words[-1].end - words[0].start) / 1000,
             )
         )
-        transcript = ytt_api.fetch(video_id, languages=["en", "es"])
+    return snippets
+
+
+TRANSCRIPT_SOURCE_FUNCTIONS = {
+    "youtube_api": fetch_transcript_youtube_api,
+    "yt_dlp": fetch_transcript_yt_dlp,
+    "assemblyai": fetch_transcript_assemblyai,
+}
+
+_transcript_resolver = None
+_transcript_resolver_lock = threading.Lock()
+
+
+def get_transcript_resolver():
+    """Process-wide resolver, the circuit breakers must outlive a request"""
+    global _transcript_resolver
+    with _transcript_resolver_lock:
+        if _transcript_resolver is None:
+            timeouts = settings.TRANSCRIPT_SOURCE_TIMEOUTS
+            sources = [
+                TranscriptSource(
+                    name,
+                    TRANSCRIPT_SOURCE_FUNCTIONS[name],
+                    timeout=timeouts.get(name, 30),
+                    breaker=CircuitBreaker(
+                        failure_threshold=settings.TRANSCRIPT_BREAKER_THRESHOLD,
+                        reset_timeout=settings.TRANSCRIPT_BREAKER_RESET,
+                    ),
+                )
+                for name in settings.TRANSCRIPT_SOURCES
+            ]
+            _transcript_resolver = TranscriptResolver(
+                sources, hedge_after=settings.TRANSCRIPT_HEDGE_AFTER
+            )
+    return _transcript_resolver
 
-        # The new API returns a FetchedTranscript object
-        # We need to extract the text from snippets
-        transcript_text = ""
-        for snippet in transcript.snippets:
-            transcript_text += snippet.text + " "
 
-        return transcript_text.strip()
+def load_video_transcript(video_id):
+    """Stored transcript of a video, resolved from the sources and saved the first time"""
+    transcript = get_stored_transcript(video_id, TRANSCRIPT_LANGUAGES)
+    if transcript is not None:
+        return transcript
 
-    except NoTranscriptFound:
-        return "No transcription available"
+    # the cached metadata tells which sources are worth asking, if any
+    metadata = get_cached_metadata(video_id)
+    if transcript_known_missing(metadata):
+        return None
+    skip = CAPTION_SOURCES if captions_missing(metadata, TRANSCRIPT_LANGUAGES) else ()
 
-    except Exception as e:
-        print(f"Error extracting transcript: {str(e)}")
-        traceback.print_exc()  # type: ignore
+    result, missing = get_transcript_resolver().resolve_with_outcome(video_id, skip)
+    if result is None:
+        # errors and timeouts may go away, only remember real misses
+        if missing:
+            record_no_transcript(video_id)
+        return None
+
+    return save_transcript(
+        video_id, result.language, result.is_generated, result.snippets
+    )
+
+
+def compact_video_transcript(stored_transcript):
+    """
+    Transcript as sent to the LLM, without caption noise and within budget.
+
+    Used by every generation path, whatever the provider.
+    """
+    with span("compaction") as compaction:
+        compacted = compact_transcript(
+            stored_transcript.snippet_texts(),
+            rolling=stored_transcript.is_generated,
+        )
+        compaction.set(
+            tokens_before=compacted.tokens_before,
+            tokens_after=compacted.tokens_after,
+            snippets=len(compacted.snippets),
+        )
+    return compacted
+
+
+def extract_yt_transcript(video_id):
+    transcript = load_video_transcript(video_id)
+    if transcript is None or not transcript.text.strip():
         return "No transcription available"
+    return compact_video_transcript(transcript).text or "No transcription available"
 
 
 def yt_title_dlp(link):
-    """Fetch YouTube video title"""
-    ydl_opts = {
-        "quiet": True,
-        "no_warnings": True,
-    }
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore
-        info = ydl.extract_info(link, download=False)
-        title = info.get("title", None)  # type: ignore
-        return title if title else "Unknown Title"
+    """Fetch YouTube video title, from the video metadata cache"""
+    metadata = get_video_metadata(extract_video_id(link))
+    if metadata is None or not metadata.title:
+        return "Unknown Title"
+    return metadata.title
 
 
 def yt_transcript_dlp(link):
     """Fetch YouTube video transcript"""
+    subtitles = yt_subtitles(link)
+    if subtitles is None:
+        return "No transcription available"
+    return " ".join(snippet.text for snippet in subtitles.snippets).strip()
+
+
+def yt_subtitles(link):
+    """
+    Fetch YouTube subtitles as a TranscriptResult of timed snippets, None
+    when there are none. Auto-captions are only used without subtitles.
+    """
     ydl_opts = {
         "quiet": True,
         "no_warnings": True,
@@ -197,11 +1246,16 @@ def yt_transcript_dlp(link):
 
         # Try to get English subtitles first
         if "en" in subtitles:
-            subtitle_url = subtitles["en"][0]["url"]
+            formats, is_generated = subtitles["en"], False
         elif "en" in automatic_captions:
-            subtitle_url = automatic_captions["en"][0]["url"]
+            formats, is_generated = automatic_captions["en"], True
         else:
-            return "No transcription available"
+            return None
+
+        # json3 keeps the timings, prefer it over the other formats
+        subtitle_url = next(
+            (f["url"] for f in formats if f.get("ext") == "json3"), formats[0]["url"]
+        )
 
         # Fetch the subtitle content
         response = urllib.request.urlopen(subtitle_url)
@@ -213,17 +1267,25 @@ def yt_transcript_dlp(link):
             # Parse the JSON3 data
             subtitle_data = json.loads(subtitle_content)
 
-            # Extract text from events
-            transcript_text = ""
-
-            if "events" in subtitle_data:
-                for event in subtitle_data["events"]:
-                    if "segs" in event:  # segments contain the actual text
-                        for seg in event["segs"]:
-                            if "utf8" in seg:
-                                transcript_text += seg["utf8"]
-
-            return transcript_text.strip()
+            # Extract text and timings from events
+            snippets = []
+
+            for event in subtitle_data.get("events", []):
+                if "segs" in event:  # segments contain the actual text
+                    text = "".join(seg.get("utf8", "") for seg in event["segs"])
+                    text = text.strip()
+                    if text:
+                        snippets.append(
+                            Snippet(
+                                text=text,
+                                start=event.get("tStartMs", 0) / 1000,
+                                duration=event.get("dDurationMs", 0) / 1000,
+                            )
+                        )
+
+            if not snippets:
+                return None
+            return TranscriptResult("yt_dlp", "en", is_generated, snippets)
 
         except json.JSONDecodeError:
             # If it's not JSON, treat as regular subtitle format
@@ -232,117 +1294,27 @@ def yt_transcript_dlp(link):
             clean_text = re.sub(
                 r"\d+:\d+:\d+\.\d+ --> \d+:\d+:\d+\.\d+", "", clean_text
             )
-            clean_text = re.sub(r"\n+", " ", clean_text)
-            return clean_text.strip()
-
-
-def download_youtube_audio(yt_link):
-    """Download audio from YouTube video and return the file path"""
-    try:
-        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-
-        final_file = None
-
-        def hook(d):
-            nonlocal final_file
-            if d["status"] == "finished":
-                final_file = d["filename"]
-
-        ydl_opts = {
-            "format": "bestaudio/best",
-            "outtmpl": f"{settings.MEDIA_ROOT}/%(title)s.%(ext)s",
-            "quiet": True,
-            "no_warnings": True,
-            "progress_hooks": [hook],
-        }
+            clean_text = re.sub(r"\n+", " ", clean_text).strip()
+            if not clean_text:
+                return None
+            return TranscriptResult(
+                "yt_dlp",
+                "en",
+                is_generated,
+                [Snippet(text=clean_text, start=0.0, duration=0.0)],
+            )
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore
-            ydl.download([yt_link])
 
-            return final_file
-
-    except Exception as e:
-        print(f"Error downloading audio: {e}")
-        return None
+def transcribe_youtube_audio(link):
+    """AssemblyAI transcript of a video's audio, see audio.py"""
+    return submit_transcription(extract_video_id(link)).result()
 
 
 def alternative_transcript(link):
-    audio_file = download_youtube_audio(link)
-    aai_api = os.environ.get("AAI")
-    aai.settings.api_key = aai_api
-
-    transcriber = aai.Transcriber()
-    transcription = transcriber.transcribe(audio_file)  # type: ignore
-
+    transcription = transcribe_youtube_audio(link)
     return transcription.text
 
 
-def generate_summary_content_claude(transcript):
-    #! Anthropic setup
-    api_key = os.environ.get("CLAUDE_API_KEY")
-    client = anthropic.Anthropic(api_key=api_key)
-    prompt = f"""
-        Based on the following transcript from a YouTube video, generate a summary.
-        Make sure the summary is well-structured, engaging, and informative:
-        \n\n{transcript}\n\n
-    """
-    response = client.messages.create(
-        model="claude-3-5-sonnet-20241022",
-        max_tokens=1000,
-        messages=[{"role": "user", "content": prompt}],
-    )
-    return response.content[0].text  # type: ignore
-
-
-def generate_title_content_claude(summary):
-    #! Anthropic setup
-    api_key = os.environ.get("CLAUDE_API_KEY")
-    client = anthropic.Anthropic(api_key=api_key)
-    prompt = f"""
-        Based on this summary, create a clear, concise video title (max 10 words):
-        \n\n{summary}\n\n
-    """
-    response = client.messages.create(
-        model="claude-3-5-sonnet-20241022",
-        max_tokens=1000,
-        messages=[{"role": "user", "content": prompt}],
-    )
-    return response.content[0].text  # type: ignore
-
-
-def generate_summary_content_openai(transcript):
-    #! OpenAI setup
-    api_key = os.environ.get("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
-    prompt = f"""
-        Based on the following transcript from a YouTube video, generate a summary.
-        Make sure the summary is well-structured, engaging, and informative:
-        \n\n{transcript}\n\n
-    """
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        max_tokens=1000,
-        messages=[{"role": "user", "content": prompt}],
-    )
-    return response.choices[0].message.content
-
-
-def generate_tittle_content_openai(summary):
-    #! OpenAI setup
-    api_key = os.environ.get("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
-    prompt = f"""
-        Based on this summary, create a clear, concise video title (max 10 words):
-        \n\n{summary}\n\n
-    """
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        max_tokens=1000,
-        messages=[{"role": "user", "content": prompt}],
-    )
-    return response.choices[0].message.content
-
-
 #! Authentication views
 def user_login(request):
     if request.method == "POST":